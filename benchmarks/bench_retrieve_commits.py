@@ -0,0 +1,49 @@
+import argparse
+import git
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+from smartsquash import helpers
+from benchmarks.repo_generator import generate_repo, TARGET_BRANCH
+
+
+def retrieve_commits_full_scan(repo: git.Repo, target_branch: str) -> List[git.Commit]:
+    """the previous implementation, which walked the whole target history"""
+    target_commits_sha: List[str] = [
+        commit.hexsha
+        for commit in repo.iter_commits(rev=target_branch)
+        if len(commit.parents) < 2
+    ]
+    return [
+        commit
+        for commit in repo.iter_commits(rev=repo.active_branch)
+        if commit.hexsha not in target_commits_sha and len(commit.parents) < 2
+    ]
+
+
+def measure(func: Callable, repo: git.Repo) -> float:
+    start: float = time.perf_counter()
+    func(repo, TARGET_BRANCH)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=5000)
+    parser.add_argument("--branch-length", type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = git.Repo(
+            generate_repo(Path(tmp) / "repo", args.depth, args.branch_length)
+        )
+        full_scan: float = measure(retrieve_commits_full_scan, repo)
+        range_walk: float = measure(helpers.retrieve_commits, repo)
+        repo.close()
+    print(f"target depth: {args.depth}, branch length: {args.branch_length}")
+    print(f"full history scan: {full_scan:.3f}s")
+    print(f"range walk:        {range_walk:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import collections
+import random
+import time
+import unittest.mock
+from typing import Callable, Dict, List, Set, Tuple
+from smartsquash import helpers, squash
+
+FakeCommit = collections.namedtuple("FakeCommit", ["hexsha"])
+
+
+def generate_branch(
+    length: int, file_count: int, seed: int = 0
+) -> Tuple[List[FakeCommit], Dict[str, Set[str]]]:
+    rand = random.Random(seed)
+    files: List[str] = [f"file-{i}.txt" for i in range(file_count)]
+    commits: List[FakeCommit] = [FakeCommit(f"{i:040x}") for i in range(length)]
+    commit_changed_files: Dict[str, Set[str]] = {
+        commit.hexsha: set(rand.sample(files, rand.randint(1, 2))) for commit in commits
+    }
+    return commits, commit_changed_files
+
+
+def measure(
+    func: Callable, commits: List[FakeCommit], changed: Dict[str, Set[str]]
+) -> float:
+    start: float = time.perf_counter()
+    func(commits, changed)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[100, 250, 500, 1000])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument(
+        "--pairwise-limit",
+        type=int,
+        default=500,
+        help="Skip the pairwise reference engine for longer branches",
+    )
+    args = parser.parse_args()
+    # only the analysis is measured, not git
+    with unittest.mock.patch.object(
+        squash, "commit_diff_empty", return_value=False
+    ), unittest.mock.patch.object(helpers, "get_commits_tree_ids", return_value={}):
+        for length in args.lengths:
+            commits, changed = generate_branch(length, args.files)
+            indexed: float = measure(squash.get_squash_combinations, commits, changed)
+            pairwise: str = "skipped"
+            if length <= args.pairwise_limit:
+                reference: Callable = squash.get_squash_combinations_pairwise
+                pairwise = f"{measure(reference, commits, changed):.3f}s"
+            print(f"{length} commits: indexed {indexed:.3f}s, pairwise {pairwise}")
+
+
+if __name__ == "__main__":
+    main()
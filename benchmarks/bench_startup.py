@@ -0,0 +1,66 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from benchmarks.repo_generator import generate_repo
+
+COMMANDS: Dict[str, List[str]] = {
+    "python": [sys.executable, "-c", "pass"],
+    "help": [sys.executable, "-m", "smartsquash", "--help"],
+    "clean tree": [sys.executable, "-m", "smartsquash"],
+    "clean tree, full path": [sys.executable, "-m", "smartsquash", "--profile"],
+}
+
+
+def measure(command: List[str], cwd: Path, runs: int) -> List[float]:
+    # the commands run in the generated repository, which has to find the
+    # package of this checkout, even if it isn't installed
+    python_path: List[str] = [str(Path(__file__).parent.parent)]
+    if os.environ.get("PYTHONPATH"):
+        python_path.append(os.environ["PYTHONPATH"])
+    env: Dict[str, str] = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(python_path),
+        "SMARTSQUASH_NO_DAEMON": "1",
+    }
+    times: List[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        subprocess.run(
+            command,
+            cwd=cwd,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    """
+    times 'python -m smartsquash' on a clean worktree, where there is nothing
+    to do. '--profile' skips the clean worktree check, which shows the cost
+    of importing and validating the repository
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path: Path = generate_repo(Path(tmp) / "repo", 100, 20)
+        for name, command in COMMANDS.items():
+            times: List[float] = measure(command, path, args.runs)
+            print(
+                f"{name:<22} median {statistics.median(times) * 1000:6.1f}ms, "
+                f"min {min(times) * 1000:6.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
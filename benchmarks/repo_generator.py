@@ -0,0 +1,86 @@
+import random
+import subprocess
+from pathlib import Path
+from typing import IO, List, Optional
+
+TARGET_BRANCH = "master"
+FEATURE_BRANCH = "feature-branch"
+
+
+def _write_commit(
+    stream: IO[bytes], branch: str, mark: int, parent: int, files: List[str]
+):
+    message: bytes = f"commit {mark}\n".encode()
+    stream.write(f"commit refs/heads/{branch}\nmark :{mark}\n".encode())
+    stream.write(f"committer Bench <bench@example.com> {mark} +0000\n".encode())
+    stream.write(b"data %d\n%s" % (len(message), message))
+    if parent:
+        stream.write(f"from :{parent}\n".encode())
+    for file in files:
+        content: bytes = f"{file} changed by {mark}\n".encode()
+        stream.write(f"M 100644 inline {file}\n".encode())
+        stream.write(b"data %d\n%s\n" % (len(content), content))
+
+
+def generate_repo(
+    path: Path,
+    target_depth: int,
+    branch_length: int,
+    files_per_commit: int = 1,
+    overlap: float = 0.0,
+    file_count: Optional[int] = None,
+    seed: int = 0,
+) -> Path:
+    """
+    creates a repository with 'target_depth' commits on the target branch
+    and 'branch_length' commits on a feature branch, which is checked out.
+    - file_count: number of files in the repository, added by the first
+      commit. By default every commit changes its own files
+    - overlap: probability, that a branch commit changes exactly the same
+      files as an earlier branch commit, which makes it a squash candidate
+    Uses 'git fast-import', which makes deep histories cheap to generate
+    """
+    rand = random.Random(seed)
+    files: List[str] = [f"src/{i // 1000}/file-{i}" for i in range(file_count or 0)]
+
+    def pick_files(prefix: str, i: int) -> List[str]:
+        if files:
+            return rand.sample(files, min(files_per_commit, len(files)))
+        return [f"{prefix}/{i}-{j}" for j in range(files_per_commit)]
+
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    fast_import = subprocess.Popen(
+        ["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE
+    )
+    mark: int = 0
+    if files:
+        mark += 1
+        _write_commit(fast_import.stdin, TARGET_BRANCH, mark, 0, files)
+    for i in range(target_depth):
+        mark += 1
+        _write_commit(
+            fast_import.stdin,
+            TARGET_BRANCH,
+            mark,
+            mark - 1,
+            # keep the tree small for deep histories
+            pick_files("target", i % 100),
+        )
+    branch_point: int = mark
+    branch_files: List[List[str]] = []
+    for i in range(branch_length):
+        mark += 1
+        parent: int = branch_point if i == 0 else mark - 1
+        if branch_files and rand.random() < overlap:
+            commit_files: List[str] = rand.choice(branch_files)
+        else:
+            commit_files = pick_files("feature", i)
+        branch_files.append(commit_files)
+        _write_commit(fast_import.stdin, FEATURE_BRANCH, mark, parent, commit_files)
+    fast_import.stdin.close()
+    if fast_import.wait():
+        raise RuntimeError("git fast-import failed")
+    subprocess.run(
+        ["git", "checkout", "-q", "-f", FEATURE_BRANCH], cwd=path, check=True
+    )
+    return path
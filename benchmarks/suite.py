@@ -0,0 +1,151 @@
+import argparse
+import git
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from loguru import logger
+from smartsquash import cache, helpers, plumbing, profiling, squash, sq
+from benchmarks.repo_generator import generate_repo, TARGET_BRANCH
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "small": dict(target_depth=100, branch_length=20, files_per_commit=2),
+    "deep": dict(target_depth=20_000, branch_length=50, files_per_commit=2),
+    "long-branch": dict(
+        target_depth=1000, branch_length=1000, files_per_commit=3, overlap=0.3
+    ),
+    "wide-commits": dict(
+        target_depth=1000,
+        branch_length=100,
+        files_per_commit=500,
+        overlap=0.3,
+        file_count=20_000,
+    ),
+    "monorepo": dict(
+        target_depth=5000,
+        branch_length=200,
+        files_per_commit=50,
+        overlap=0.2,
+        file_count=200_000,
+    ),
+}
+
+
+def measure(func: Callable, *args, **kwargs) -> Dict[str, Any]:
+    """runs func with profiling enabled and returns wall time and phases"""
+    profiling.enable()
+    start: float = time.perf_counter()
+    try:
+        func(*args, **kwargs)
+    except SystemExit:
+        pass
+    finally:
+        seconds: float = time.perf_counter() - start
+        profile: profiling.Profile = profiling.disable()
+    data: Dict[str, Any] = profile.to_dict()
+    data.pop("total_seconds")
+    return {"seconds": round(seconds, 6), **data}
+
+
+def make_dirty(repo: git.Repo):
+    """changes a file of the newest branch commit, so there is something to fixup"""
+    files: List[str] = helpers.files_changed_by_commit(
+        repo.working_dir, repo.head.commit.hexsha
+    )
+    with open(Path(repo.working_dir) / files[0], "a") as f:
+        f.write("fixup\n")
+
+
+def run_scenario(name: str, parameters: Dict[str, Any], tmp: Path) -> Dict[str, Any]:
+    start: float = time.perf_counter()
+    repo = git.Repo(generate_repo(tmp / name, **parameters))
+    generated: float = time.perf_counter() - start
+    commits: List[git.Commit] = helpers.retrieve_commits(repo, TARGET_BRANCH)
+    commit_changed_files = helpers.get_commits_changed_files(commits)
+    results: Dict[str, Any] = {
+        "parameters": parameters,
+        "generate_seconds": round(generated, 6),
+        "retrieve_commits": measure(helpers.retrieve_commits, repo, TARGET_BRANCH),
+        "get_squash_combinations": measure(
+            squash.get_squash_combinations, commits, commit_changed_files
+        ),
+    }
+    make_dirty(repo)
+    results["fixup"] = measure(sq.fixup, TARGET_BRANCH, repo, True)
+    results["squash"] = measure(sq.squash, TARGET_BRANCH, repo)
+    plumbing.close_all()
+    repo.close()
+    return results
+
+
+def get_environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "git": subprocess.check_output(["git", "--version"]).decode().strip(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=["small", "deep", "long-branch"],
+    )
+    parser.add_argument("--target-depth", type=int, help="Override all scenarios")
+    parser.add_argument("--branch-length", type=int, help="Override all scenarios")
+    parser.add_argument("--files-per-commit", type=int, help="Override all scenarios")
+    parser.add_argument("--overlap", type=float, help="Override all scenarios")
+    parser.add_argument("--file-count", type=int, help="Override all scenarios")
+    parser.add_argument(
+        "--warm", action="store_true", help="Keep the persistent cache enabled"
+    )
+    parser.add_argument("--output", type=str, help="Write the results to this file")
+    args = vars(parser.parse_args())
+    logger.remove()
+    if not args["warm"]:
+        os.environ[cache.DISABLE_ENV] = "1"
+    overrides: Dict[str, Any] = {
+        key: args[key]
+        for key in (
+            "target_depth",
+            "branch_length",
+            "files_per_commit",
+            "overlap",
+            "file_count",
+        )
+        if args[key] is not None
+    }
+    results: Dict[str, Any] = {"environment": get_environment(), "scenarios": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args["scenarios"]:
+            parameters: Dict[str, Any] = {**SCENARIOS[name], **overrides}
+            results["scenarios"][name] = run_scenario(name, parameters, Path(tmp))
+            print(
+                f"{name}: "
+                + ", ".join(
+                    f"{step} {results['scenarios'][name][step]['seconds']:.3f}s"
+                    for step in (
+                        "retrieve_commits",
+                        "get_squash_combinations",
+                        "fixup",
+                        "squash",
+                    )
+                )
+            )
+    output: str = json.dumps(results, indent=2)
+    if args["output"]:
+        Path(args["output"]).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
 import argparse
-import git
+import contextlib
+import io
+import os
 import sys
 from pathlib import Path
-from smartsquash import sq, helpers
-from typing import Dict, Any
-from loguru import logger
+from smartsquash import daemon, precheck
+from typing import Callable, Dict, Any, Optional, TextIO, TYPE_CHECKING
+
+# GitPython, loguru and the analysis modules are imported where they are
+# needed, so that '--help' and runs with nothing to do start fast
+
+NOTHING_TO_FIXUP = "Repository is not dirty. No files to fixup."
+if TYPE_CHECKING:
+    from smartsquash import profiling
 
 
 def get_args() -> dict:
@@ -34,6 +42,29 @@ def get_args() -> dict:
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "--multi-fixup",
+        help="Fixup each modified file into the last commit that changed it",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--in-memory",
+        help="Rewrite the history without checking out each commit. "
+        "Falls back to an interactive rebase on conflicts",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Print time spent per phase and git calls to stderr. Default is 'table'",
+        required=False,
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+    )
     parser.add_argument(
         "--no-add",
         help="Don't add modified files to staging area",
@@ -41,24 +72,212 @@ def get_args() -> dict:
         default=False,
         action="store_true",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        required=False,
+        help="Number of git processes reading commits in parallel. "
+        "Default is the number of CPUs, up to 8",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        required=False,
+        choices=["cli", "pygit2"],
+        help="Git backend reading commits and writing the rewritten history. "
+        "Default is $SMARTSQUASH_BACKEND or 'cli'. 'pygit2' requires pygit2",
+    )
+    parser.add_argument(
+        "--daemon",
+        help="Serve the repo from a background process, which keeps its state "
+        "warm. Other sq invocations in the repo are forwarded to it",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stop-daemon",
+        help="Stop the daemon of the repo",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--write-commit-graph",
+        help="Write or refresh the commit-graph of the repo with changed-path "
+        "Bloom filters, which speeds up finding the commits of the branch",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--install-hooks",
+        help="Install post-commit and post-rewrite hooks, which record the "
+        "files changed by new commits in the cache while committing",
+        required=False,
+        default=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--record-hook",
+        required=False,
+        choices=["post-commit", "post-rewrite"],
+        help=argparse.SUPPRESS,
+    )
+    parser.add_argument("--record-commit", required=False, help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--repos-from",
+        type=str,
+        required=False,
+        help="Run for each repo listed in this file, one path per line, "
+        "and print a JSON summary",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        required=False,
+        default=os.cpu_count(),
+        help="Number of repos processed in parallel with --repos-from. "
+        "Default is the number of CPUs",
+    )
     return vars(parser.parse_args())
 
 
-def setup_logger():
+def setup_logger(sink: TextIO = sys.stdout, colorize: bool = True):
+    from loguru import logger
+
     logger.remove()
-    logger.add(sys.stdout, colorize=True, format="<level>{message}</level>")
-    logger.level("DRY", no=38, color="<yellow>", icon="Stuff")
+    logger.add(sink, colorize=colorize, format="<level>{message}</level>")
+    try:
+        logger.level("DRY")
+    except ValueError:
+        logger.level("DRY", no=38, color="<yellow>", icon="Stuff")
 
 
 def main():
-    setup_logger()
     args: Dict[str, Any] = get_args()
+    args["repo"] = str(Path(args["repo"]).absolute())
+    if args.get("daemon"):
+        from loguru import logger
+
+        setup_logger()
+        server: daemon.DaemonServer = daemon.make_server(args["repo"], run_captured)
+        logger.info(f"Listening on {server.server_address}")
+        daemon.serve(server)
+        return
+    if args.get("stop_daemon"):
+        if not daemon.stop(args["repo"]):
+            print("No daemon is running")
+        return
+    if args.get("install_hooks"):
+        from smartsquash import hooks
+
+        for hook, installed in hooks.install_hooks(args["repo"]).items():
+            if installed:
+                print(f"Installed {hook} hook")
+            else:
+                print(f"Skipped {hook}: a hook not installed by smartsquash exists")
+        return
+    if args.get("record_hook"):
+        from smartsquash import hooks
+
+        sys.exit(
+            hooks.record_hook(
+                args["repo"], args["record_hook"], commit=args.get("record_commit")
+            )
+        )
+    if args.get("write_commit_graph"):
+        from smartsquash import commit_graph
+
+        sys.exit(commit_graph.write_commit_graph(args["repo"]).returncode)
+    if args.get("repos_from"):
+        from smartsquash import batch
+
+        sys.exit(batch.main(args))
+    if has_nothing_to_do(args):
+        print(NOTHING_TO_FIXUP)
+        return
+    exit_code: Optional[int] = daemon.forward(args)
+    if exit_code is not None:
+        if exit_code:
+            sys.exit(exit_code)
+        return
+    setup_logger()
+    run(args)
+
+
+def has_nothing_to_do(args: Dict[str, Any]) -> bool:
+    return (
+        not args.get("squash")
+        and not args.get("profile")
+        and precheck.has_nothing_to_fixup(args["repo"], args["target_branch"])
+    )
+
+
+def run_captured(
+    args: Dict[str, Any], get_repo: Optional[Callable] = None, colorize: bool = True
+) -> Dict[str, Any]:
+    """
+    runs the command like the CLI would and returns its output and exit code.
+    Exiting, e.g. because the repository is invalid, only ends the command
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code: int = 0
+    setup_logger(stdout, colorize)
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            run(args, get_repo)
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code, file=stderr)
+                exit_code = 1
+            else:
+                exit_code = e.code or 0
+        except Exception as e:
+            print(f"Error: {e!r}", file=stderr)
+            exit_code = 1
+    setup_logger(sys.stdout, colorize)
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "exit_code": exit_code,
+    }
+
+
+def run(args: Dict[str, Any], get_repo: Optional[Callable] = None):
+    from smartsquash import backend, helpers, plumbing, profiling, sq
+
+    plumbing.set_concurrency(args.get("concurrency"))
+    try:
+        backend.set_backend(args.get("backend"))
+    except backend.BackendError as e:
+        sys.exit(str(e))
     repo_path: str = args.get("repo")
     target_branch: str = args.get("target_branch")
     dry: bool = args.get("dry")
     no_add: bool = args.get("no_add")
+    in_memory: bool = args.get("in_memory")
+    multi_fixup: bool = args.get("multi_fixup")
+    profile_format: Optional[str] = args.get("profile")
+
+    if profile_format:
+        profiling.enable()
+    try:
+        repo = (get_repo or helpers.get_repo)(repo_path, target_branch)
+        sq.fixup(target_branch, repo, not no_add, dry, in_memory, multi_fixup)
+        if args.get("squash"):
+            sq.squash(target_branch, repo, dry, in_memory)
+    finally:
+        if profile_format:
+            print_profile(profiling.disable(), profile_format)
+
+
+def print_profile(profile: "profiling.Profile", profile_format: str):
+    if profile_format == "json":
+        print(profile.to_json(), file=sys.stderr)
+    else:
+        print(profile.to_table(), file=sys.stderr)
+
 
-    repo: git.Repo = helpers.get_repo(repo_path, target_branch)
-    sq.fixup(target_branch, repo, not no_add, dry)
-    if args.get("squash"):
-        sq.squash(target_branch, repo, dry)
+if __name__ == "__main__":
+    main()
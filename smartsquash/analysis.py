@@ -0,0 +1,258 @@
+import collections
+import json
+import zlib
+import git
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from smartsquash import backend, cache, squash
+from smartsquash.decorators import profile_phase
+from smartsquash.paths import PathTable
+from smartsquash.records import CommitRecord, FileSetTable, retrieve_commit_records
+from loguru import logger
+
+CACHE_KIND = "squash-analysis-2"
+
+
+class AnalysisState:
+    """
+    result of the squash analysis of a branch, which can be extended by
+    commits added on top of the branch later on
+    - commits are ordered from oldest to newest, as in the rebase plan
+    - signatures holds the distinct sets of changed files, referenced by
+      'signature_ids', the position of the commits
+    - pairs holds the positions of the commits, which are squashed
+    """
+
+    def __init__(
+        self,
+        target_tip: str,
+        merge_base: str,
+        branch_tip: str,
+        commits: List[CommitRecord],
+        signatures: List[List[str]],
+        signature_ids: List[int],
+        pairs: List[Tuple[int, int]],
+    ):
+        self.target_tip = target_tip
+        self.merge_base = merge_base
+        self.branch_tip = branch_tip
+        self.commits = commits
+        self.signatures = signatures
+        self.signature_ids = signature_ids
+        self.pairs = pairs
+
+    @classmethod
+    def from_records(
+        cls,
+        refs: Tuple[str, str, str],
+        records: List[CommitRecord],
+        file_sets: FileSetTable,
+        repo_path: str,
+    ) -> "AnalysisState":
+        """analyses all commits of the branch with squash.get_squash_combinations"""
+        squash_combinations = squash.get_squash_combinations(
+            records,
+            file_sets.changed_files(records),
+            {record.hexsha: record.tree_sha for record in records},
+            repo_path,
+        )
+        positions: Dict[str, int] = {
+            record.hexsha: position for position, record in enumerate(records)
+        }
+        ids: Dict[int, int] = {}
+        for record in records:
+            ids.setdefault(record.file_set_id, len(ids))
+        return cls(
+            *refs,
+            records,
+            [sorted(file_sets.file_sets[file_set_id]) for file_set_id in ids],
+            [ids[record.file_set_id] for record in records],
+            [
+                (positions[commit_sha], positions[to_squash.hexsha])
+                for commit_sha, squashed in squash_combinations.items()
+                for to_squash in squashed
+            ],
+        )
+
+    def extend(self, records: List[CommitRecord], file_sets: FileSetTable):
+        """
+        appends the commits, comparing each new commit only with the
+        existing commits changing exactly the same files. A pair is squashed
+        unless a commit in between changes some, but not all of its files,
+        like in squash.get_squash_candidates
+        """
+        table = PathTable()
+        bits: List[int] = [table.bits(files) for files in self.signatures]
+        ids: Dict[FrozenSet[str], int] = {
+            frozenset(files): signature_id
+            for signature_id, files in enumerate(self.signatures)
+        }
+        groups: Dict[int, List[int]] = collections.defaultdict(list)
+        for position, signature_id in enumerate(self.signature_ids):
+            groups[signature_id].append(position)
+
+        for record in records:
+            files: FrozenSet[str] = file_sets.files(record)
+            signature_id: int = ids.setdefault(files, len(self.signatures))
+            if signature_id == len(self.signatures):
+                self.signatures.append(sorted(files))
+                bits.append(table.bits(files))
+            position: int = len(self.commits)
+            signature: int = bits[signature_id]
+            last_blocking: int = max(
+                (
+                    members[-1]
+                    for other_id, members in groups.items()
+                    if other_id != signature_id and bits[other_id] & signature
+                ),
+                default=-1,
+            )
+            for member in groups[signature_id]:
+                # squash.commit_diff_empty on the tree ids
+                if (
+                    member > last_blocking
+                    and self.commits[member].tree_sha != record.tree_sha
+                ):
+                    self.pairs.append((member, position))
+            groups[signature_id].append(position)
+            self.commits.append(record)
+            self.signature_ids.append(signature_id)
+
+    def get_rebase_plan(self) -> List[Tuple[str, CommitRecord]]:
+        squash_combinations: Dict[str, List[CommitRecord]] = {}
+        for position_a, position_b in sorted(self.pairs):
+            squash_combinations.setdefault(self.commits[position_a].hexsha, []).append(
+                self.commits[position_b]
+            )
+        return squash.build_rebase_plan(self.commits, squash_combinations)
+
+    def to_bytes(self) -> bytes:
+        data: Dict = {
+            "refs": [self.target_tip, self.merge_base, self.branch_tip],
+            "commits": [
+                [
+                    commit.hexsha,
+                    commit.tree_sha,
+                    commit.parent_count,
+                    commit.subject,
+                    commit.parent,
+                ]
+                for commit in self.commits
+            ],
+            "signatures": self.signatures,
+            "signature_ids": self.signature_ids,
+            "pairs": self.pairs,
+        }
+        return zlib.compress(json.dumps(data).encode())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "AnalysisState":
+        loaded: Dict = json.loads(zlib.decompress(data))
+        return cls(
+            *loaded["refs"],
+            [
+                CommitRecord(hexsha, tree_sha, parent_count, subject, parent=parent)
+                for hexsha, tree_sha, parent_count, subject, parent in loaded["commits"]
+            ],
+            loaded["signatures"],
+            loaded["signature_ids"],
+            [tuple(pair) for pair in loaded["pairs"]],
+        )
+
+
+def get_refs(repo: git.Repo, target_branch: str) -> Optional[Tuple[str, str, str]]:
+    """returns target tip, merge-base and branch tip, None without merge-base"""
+    git_backend: backend.Backend = backend.get_backend(repo.working_dir)
+    branch: str = repo.active_branch.path
+    tips: Dict[str, str] = git_backend.resolve([target_branch, branch])
+    if target_branch not in tips or branch not in tips:
+        return None
+    merge_base: Optional[str] = git_backend.merge_base(
+        tips[target_branch], tips[branch]
+    )
+    if merge_base is None:
+        return None
+    return tips[target_branch], merge_base, tips[branch]
+
+
+def extends(repo: git.Repo, state: AnalysisState, refs: Tuple[str, str, str]) -> bool:
+    """
+    whether the branch only got new commits on top since the state was saved.
+    A rebase or force-push replaces the saved tip, which is then no
+    ancestor of the new one anymore
+    """
+    _, merge_base, branch_tip = refs
+    if state.merge_base != merge_base:
+        return False
+    # the saved tip is an ancestor, if it's the merge-base with the new one
+    return (
+        backend.get_backend(repo.working_dir).merge_base(state.branch_tip, branch_tip)
+        == state.branch_tip
+    )
+
+
+def is_first_parent_chain(
+    base: str, records: List[CommitRecord], branch_tip: str
+) -> bool:
+    """
+    whether the records, ordered from oldest to newest, lead from base to
+    branch_tip through their first parents. Merges bring in commits, which
+    are older than the ones analysed before, so they aren't simply
+    appended to the analysis
+    """
+    parent: str = base
+    for record in records:
+        if record.parent != parent:
+            return False
+        parent = record.hexsha
+    return parent == branch_tip
+
+
+@profile_phase
+def get_rebase_plan(
+    repo: git.Repo, target_branch: str
+) -> List[Tuple[str, CommitRecord]]:
+    """
+    like squash.get_rebase_plan for the branch, but reuses the analysis of
+    the last run, which is kept in the cache for each branch and target:
+    - the cached plan is returned as is, if no ref moved
+    - only new commits are analysed, if the branch got a chain of new
+      commits on top
+    - everything is analysed again otherwise, e.g. after a rebase
+    """
+    store: Optional[cache.Cache] = cache.open_cache(Path(repo.git_dir))
+    refs: Optional[Tuple[str, str, str]] = (
+        get_refs(repo, target_branch) if store else None
+    )
+    key: str = f"{repo.active_branch.path}\0{target_branch}"
+    data: Optional[bytes] = store.get_blob(CACHE_KIND, key) if refs else None
+    state: Optional[AnalysisState] = AnalysisState.from_bytes(data) if data else None
+    file_sets = FileSetTable()
+    if state and (state.target_tip, state.merge_base, state.branch_tip) == refs:
+        logger.info("Branch didn't change, using the last analysis")
+        return state.get_rebase_plan()
+    if state and not extends(repo, state, refs):
+        state = None
+    records: List[CommitRecord] = (
+        retrieve_commit_records(repo, state.branch_tip, file_sets) if state else []
+    )
+    if state and not is_first_parent_chain(state.branch_tip, records, refs[2]):
+        logger.info("Branch got merges since the last analysis")
+        state = None
+    if state:
+        logger.info(f"Comparing {len(records)} new commits with the last analysis")
+        state.target_tip, state.branch_tip = refs[0], refs[2]
+        state.extend(records, file_sets)
+    else:
+        records = retrieve_commit_records(repo, target_branch, file_sets)
+        if refs is None:
+            return squash.get_rebase_plan(
+                records,
+                file_sets.changed_files(records),
+                {record.hexsha: record.tree_sha for record in records},
+                repo.working_dir,
+            )
+        logger.info(f"Comparing {len(records)} commits with each other...")
+        state = AnalysisState.from_records(refs, records, file_sets, repo.working_dir)
+    store.put_blob(CACHE_KIND, key, state.to_bytes())
+    return state.get_rebase_plan()
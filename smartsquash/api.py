@@ -0,0 +1,271 @@
+import time
+import git
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from smartsquash import (
+    analysis,
+    backend,
+    cache,
+    commit_graph,
+    helpers,
+    plumbing,
+    rewrite,
+)
+from smartsquash.backend import BackendError
+from smartsquash.decorators import profile_phase
+from smartsquash.file_index import FileIndex, get_file_index
+from smartsquash.fixup import (
+    FixupError,
+    amend_commit,
+    create_fixup_commit,
+    get_closest_change_commit_from_filters,
+    get_files_changed_in_staging,
+    get_files_changed_in_worktree,
+    get_fixup_groups,
+    get_fixup_upstream,
+    has_pending_autosquash,
+    rewrite_fixup,
+    write_fixup_commits,
+)
+from smartsquash.helpers import (
+    ErrorMessage,
+    InvalidRepositoryError,
+    RebaseError,
+    SmartsquashError,
+    open_repo,
+)
+from smartsquash.path_filter import get_changed_path_filters
+from smartsquash.records import CommitRecord, FileSetTable, retrieve_commit_records
+from smartsquash.squash import format_rebase_plan
+from loguru import logger
+
+# library API, which returns results and raises SmartsquashError instead of
+# exiting. The CLI in sq.py is built on top of it
+
+__all__ = [
+    "BackendError",
+    "ErrorMessage",
+    "FixupError",
+    "FixupResult",
+    "InvalidRepositoryError",
+    "RebaseError",
+    "SmartsquashError",
+    "SquashResult",
+    "close",
+    "fixup",
+    "open_repo",
+    "squash",
+]
+
+EXECUTED_REWRITE = "in-memory"
+EXECUTED_REBASE = "rebase"
+EXECUTED_AMEND = "amend"
+
+
+class SquashResult:
+    """
+    - plan: action, sha and subject of each commit, in rebase todo order
+    - todo: the plan in the format of the 'git rebase -i' todo list
+    - executed: EXECUTED_REWRITE or EXECUTED_REBASE,
+      None if nothing was rewritten
+    """
+
+    def __init__(
+        self,
+        plan: List[Tuple[str, str, str]],
+        todo: str,
+        executed: Optional[str],
+        old_head: str,
+        new_head: str,
+        seconds: float,
+    ):
+        self.plan = plan
+        self.todo = todo
+        self.executed = executed
+        self.old_head = old_head
+        self.new_head = new_head
+        self.seconds = seconds
+
+    @property
+    def has_rebase(self) -> bool:
+        return any(action == "fixup" for action, _, _ in self.plan)
+
+
+class FixupResult:
+    """
+    - dirty: whether there was anything to fixup at all
+    - files: the changed files, which were considered
+    - targets: the files to fixup by the sha of their target commit
+    - unmatched: files, no commit of the branch changed
+    - fixup_commits: the created fixup commits by their target commit,
+      empty if HEAD was amended
+    - executed: EXECUTED_REWRITE, EXECUTED_REBASE or EXECUTED_AMEND,
+      None if nothing was rewritten
+    """
+
+    def __init__(
+        self,
+        dirty: bool,
+        files: Set[str],
+        targets: Dict[str, Set[str]],
+        unmatched: Set[str],
+        fixup_commits: Dict[str, str],
+        executed: Optional[str],
+        old_head: str,
+        new_head: str,
+        seconds: float,
+    ):
+        self.dirty = dirty
+        self.files = files
+        self.targets = targets
+        self.unmatched = unmatched
+        self.fixup_commits = fixup_commits
+        self.executed = executed
+        self.old_head = old_head
+        self.new_head = new_head
+        self.seconds = seconds
+
+
+def get_sequence_editor(todo: str) -> str:
+    """sequence editor, which replaces the todo list of 'git rebase -i'"""
+    todo = todo.replace("'", "", -1)
+    return f"echo '{todo}' >"
+
+
+@profile_phase
+def squash(
+    repo: git.Repo, target_branch: str, dry: bool = False, in_memory: bool = False
+) -> SquashResult:
+    """
+    squashes similar commits of the active branch
+    - raises RebaseError if the rebase failed and was aborted
+      and BackendError if the git backend failed
+    """
+    start: float = time.perf_counter()
+    old_head: str = repo.head.commit.hexsha
+    plan: List[Tuple[str, CommitRecord]] = analysis.get_rebase_plan(repo, target_branch)
+    has_rebase, todo = format_rebase_plan(plan)
+    executed: Optional[str] = None
+    if has_rebase and not dry:
+        if in_memory and rewrite.try_rewrite_branch(repo, target_branch, plan):
+            executed = EXECUTED_REWRITE
+        else:
+            helpers.rebase(
+                repo, target_branch, get_sequence_editor(todo), autosquash=False
+            )
+            executed = EXECUTED_REBASE
+    return SquashResult(
+        [(action, commit.hexsha, commit.subject) for action, commit in plan],
+        todo,
+        executed,
+        old_head,
+        repo.head.commit.hexsha,
+        time.perf_counter() - start,
+    )
+
+
+@profile_phase
+def fixup(
+    repo: git.Repo,
+    target_branch: str,
+    add: bool = False,
+    dry: bool = False,
+    in_memory: bool = False,
+    multi: bool = False,
+) -> FixupResult:
+    """
+    fixups the staged files into the closest commit, which changed all of them
+    - add: commits all modified files
+    - multi: fixups each file into the last commit, which changed it
+    - HEAD is amended, if it's the target and no other commit is marked for
+      autosquash. Otherwise the rebase starts at the target, if the commits
+      after it don't change the same files
+    - raises FixupError if the fixup commits couldn't be created
+      and RebaseError if the rebase failed and was aborted,
+      BackendError if the git backend failed
+    """
+    start: float = time.perf_counter()
+    old_head: str = repo.head.commit.hexsha
+    if not repo.is_dirty():
+        return FixupResult(False, set(), {}, set(), {}, None, old_head, old_head, 0.0)
+    files_changed: Set[str] = get_files_changed_in_staging(repo)
+    if multi:
+        file_sets = FileSetTable()
+        logger.info("Fetching files changed by commits...")
+        records: List[CommitRecord] = retrieve_commit_records(
+            repo, target_branch, file_sets, reverse=False
+        )
+        commit_changed_files: Dict[str, Set[str]] = file_sets.changed_files(records)
+        index: FileIndex = get_file_index(Path(repo.git_dir), commit_changed_files)
+        if add:
+            files_changed = get_files_changed_in_worktree(repo)
+        targets: Dict[str, Set[str]] = dict(
+            get_fixup_groups(files_changed, commit_changed_files, index)
+        )
+    else:
+        closest: Optional[str] = get_closest_change_commit_from_filters(
+            repo, target_branch, files_changed, get_changed_path_filters(repo)
+        )
+        targets = {closest: set(files_changed)} if closest else {}
+    unmatched: Set[str] = files_changed.difference(*targets.values())
+
+    fixup_commits: Dict[str, str] = {}
+    executed: Optional[str] = None
+    if targets and not dry:
+        target_sha: str = next(iter(targets))
+        if (
+            not multi
+            and target_sha == old_head
+            and not has_pending_autosquash(repo, target_branch)
+        ):
+            if not files_changed and not add:
+                raise FixupError("Error, while trying to fixup files: nothing staged")
+            amend_commit(repo, add)
+            executed = EXECUTED_AMEND
+        else:
+            if multi:
+                fixup_commits = write_fixup_commits(repo, targets, add)
+            else:
+                fixup_commits = {target_sha: create_fixup_commit(repo, target_sha, add)}
+            if in_memory and rewrite_fixup(repo, target_branch, fixup_commits):
+                executed = EXECUTED_REWRITE
+            else:
+                upstream: str = (
+                    target_branch
+                    if multi
+                    else get_fixup_upstream(
+                        repo, target_branch, target_sha, fixup_commits[target_sha]
+                    )
+                )
+                helpers.rebase(
+                    repo,
+                    upstream,
+                    "true",
+                    autosquash=True,
+                    autostash=multi and repo.is_dirty(),
+                )
+                executed = EXECUTED_REBASE
+    return FixupResult(
+        True,
+        files_changed,
+        targets,
+        unmatched,
+        fixup_commits,
+        executed,
+        old_head,
+        repo.head.commit.hexsha,
+        time.perf_counter() - start,
+    )
+
+
+def close(repo: git.Repo):
+    """
+    releases the git processes, the backend, the cache and the commit-graph
+    held for the repository. They are reopened on demand, so the repository
+    can still be used afterwards
+    """
+    backend.close(repo.working_dir)
+    plumbing.close(repo.working_dir)
+    cache.close_cache(Path(repo.git_dir))
+    commit_graph.close_commit_graph(Path(repo.git_dir))
+    repo.close()
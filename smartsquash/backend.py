@@ -0,0 +1,499 @@
+import os
+import subprocess
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from smartsquash import commit_graph, plumbing
+from smartsquash.errors import SmartsquashError
+from smartsquash.gitdir import find_git_dir
+
+# the git operations the analysis and the in-memory rewrite depend on.
+# The CLI backend runs git through the long-lived plumbing processes,
+# the pygit2 backend reads the object database in-process with libgit2
+
+BACKEND_ENV = "SMARTSQUASH_BACKEND"
+DEFAULT_BACKEND = "cli"
+
+# hexsha, tree, parents and message of a commit
+CommitEntry = Tuple[str, str, List[str], str]
+# name, email and date in git's internal format, e.g. '1600000000 +0200'
+Signature = Tuple[str, str, str]
+# two commits
+CommitPair = Tuple[str, str]
+
+_backends: Dict[Tuple[str, str], "Backend"] = {}
+_backend_name: Optional[str] = None
+
+
+class BackendError(SmartsquashError):
+    """a git operation of the backend failed, or the backend is unavailable"""
+
+
+class Backend:
+    """
+    interface of the git backends
+    - revision ranges are given as target branch and branch, like
+      'target_branch..branch', merge commits are skipped
+    - commits and trees are hex shas
+    """
+
+    name = ""
+
+    def __init__(self, working_dir: str):
+        self.working_dir = working_dir
+
+    def list_commits(self, target_branch: str, branch: str) -> List[str]:
+        """shas of the commits of the range, newest first"""
+        return [entry[0] for entry in self.iter_commits(target_branch, branch)]
+
+    def iter_commits(self, target_branch: str, branch: str) -> Iterator[CommitEntry]:
+        """the commits of the range, newest first"""
+        raise NotImplementedError
+
+    def changed_files(self, commits: List[str]) -> Dict[str, List[str]]:
+        """
+        the files changed by each commit compared to its parent, like
+        'git diff-tree --name-only -r'. Root and merge commits change no files
+        """
+        raise NotImplementedError
+
+    def tree_ids(self, commits: List[str]) -> Dict[str, str]:
+        """the tree of each commit, unknown commits are left out"""
+        raise NotImplementedError
+
+    def resolve(self, revisions: List[str]) -> Dict[str, str]:
+        """
+        the commit each revision, like a branch, points to.
+        Unknown revisions are left out
+        """
+        raise NotImplementedError
+
+    def merge_base(self, commit_a: str, commit_b: str) -> Optional[str]:
+        """a best common ancestor of both commits like 'git merge-base'"""
+        raise NotImplementedError
+
+    def merge_bases(self, pairs: List[CommitPair]) -> Dict[CommitPair, str]:
+        """
+        merge_base of each pair of commits, pairs without one are left out.
+        Looked up one pair at a time, unless the backend does it in bulk
+        """
+        merge_bases: Dict[CommitPair, str] = {}
+        for pair in pairs:
+            merge_base: Optional[str] = self.merge_base(*pair)
+            if merge_base:
+                merge_bases[pair] = merge_base
+        return merge_bases
+
+    def staged_files(self) -> List[str]:
+        """the files staged in the index, like 'git diff --cached --name-only'"""
+        raise NotImplementedError
+
+    def create_commit(
+        self,
+        tree: str,
+        parents: List[str],
+        message: str,
+        author: Optional[Signature] = None,
+    ) -> str:
+        """
+        writes a commit without updating any ref and returns its sha.
+        The committer is taken from the git config
+        """
+        raise NotImplementedError
+
+    def update_ref(self, ref: str, new: str, old: str, message: str):
+        """
+        points the ref, or the branch a symbolic ref points to, to 'new'.
+        Fails if it doesn't point to 'old' anymore
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """releases the resources held for the repository"""
+
+
+class CliBackend(Backend):
+    name = "cli"
+
+    @property
+    def plumbing(self) -> plumbing.Plumbing:
+        # looked up each time, as plumbing.close_all drops the processes
+        return plumbing.get_plumbing(self.working_dir)
+
+    def _output(
+        self,
+        *args: str,
+        input: Optional[bytes] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> str:
+        result: subprocess.CompletedProcess = subprocess.run(
+            ["git", *args],
+            cwd=self.working_dir,
+            input=input,
+            env={**os.environ, **env} if env else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if result.returncode:
+            raise BackendError(
+                f"'git {' '.join(args)}' failed: {result.stderr.decode().strip()}"
+            )
+        return result.stdout.decode().strip()
+
+    def get_commit_graph(self) -> Optional[commit_graph.CommitGraph]:
+        git_dir = find_git_dir(self.working_dir)
+        return commit_graph.load_commit_graph(git_dir) if git_dir else None
+
+    def _graph_range(self, target_branch: str, branch: str) -> Optional[List[str]]:
+        """
+        the commits of the range walked in the commit-graph, None without it
+        or if the range has merges, which 'git rev-list' orders by date
+        """
+        graph: Optional[commit_graph.CommitGraph] = self.get_commit_graph()
+        if graph is None:
+            return None
+        revisions: List[str] = [f"{target_branch}^{{commit}}", f"{branch}^{{commit}}"]
+        tips: Dict[str, str] = self.plumbing.object_ids(revisions)
+        if len(tips) != len(set(revisions)):
+            return None
+        try:
+            return commit_graph.get_range(
+                graph, tips[revisions[0]], tips[revisions[1]], self._read_parents
+            )
+        except (KeyError, commit_graph.CommitGraphError):
+            return None
+
+    def _read_parents(self, commit: str) -> List[str]:
+        return self.plumbing.read_commits([commit])[commit][1]
+
+    def list_commits(self, target_branch: str, branch: str) -> List[str]:
+        commits: Optional[List[str]] = self._graph_range(target_branch, branch)
+        if commits is not None:
+            return commits
+        return list(
+            self.plumbing.stream(
+                "rev-list", "--no-merges", f"{target_branch}..{branch}", delimiter=b"\n"
+            )
+        )
+
+    def iter_commits(self, target_branch: str, branch: str) -> Iterator[CommitEntry]:
+        commits: Optional[List[str]] = self._graph_range(target_branch, branch)
+        if commits is not None:
+            read: Dict[str, Tuple[str, List[str], str]] = self.plumbing.read_commits(
+                commits
+            )
+            return ((commit, *read[commit]) for commit in commits if commit in read)
+        return parse_log_entries(
+            self.plumbing.stream(
+                "log",
+                "-z",
+                "--no-merges",
+                "--format=%H %T %P%x00%B",
+                f"{target_branch}..{branch}",
+            )
+        )
+
+    def changed_files(self, commits: List[str]) -> Dict[str, List[str]]:
+        return self.plumbing.changed_files(commits)
+
+    def tree_ids(self, commits: List[str]) -> Dict[str, str]:
+        return self.plumbing.tree_ids(commits)
+
+    def resolve(self, revisions: List[str]) -> Dict[str, str]:
+        peeled: Dict[str, str] = {
+            f"{revision}^{{commit}}": revision for revision in revisions
+        }
+        return {
+            peeled[revision]: commit
+            for revision, commit in self.plumbing.object_ids(list(peeled)).items()
+        }
+
+    def merge_base(self, commit_a: str, commit_b: str) -> Optional[str]:
+        try:
+            return self.plumbing.run("merge-base", commit_a, commit_b).strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def merge_bases(self, pairs: List[CommitPair]) -> Dict[CommitPair, str]:
+        """
+        looks up the merge-base of all commits and lists the history from
+        there to the commits once, instead of running git for each pair.
+        The merge-base of a pair is its newest common ancestor in there
+        """
+        if len(pairs) < 2:
+            return super().merge_bases(pairs)
+        commits: List[str] = sorted({commit for pair in pairs for commit in pair})
+        try:
+            base: str = self.plumbing.run("merge-base", "--octopus", *commits).strip()
+        except subprocess.CalledProcessError:
+            # the commits have no common ancestor, but pairs of them may have
+            return super().merge_bases(pairs)
+        # parents come before their children, so each commit is the newest
+        # of its ancestors
+        order: List[str] = [base]
+        ancestors: Dict[str, int] = {base: 1}
+        for line in self.plumbing.stream(
+            "rev-list",
+            "--parents",
+            "--topo-order",
+            "--reverse",
+            *commits,
+            f"^{base}",
+            delimiter=b"\n",
+        ):
+            commit, *parents = line.split()
+            bits: int = 1 << len(order)
+            for parent in parents:
+                # ancestors of the base can't be the newest common ancestor
+                bits |= ancestors.get(parent, 0)
+            ancestors[commit] = bits
+            order.append(commit)
+        return {
+            pair: order[(ancestors[pair[0]] & ancestors[pair[1]]).bit_length() - 1]
+            for pair in pairs
+        }
+
+    def staged_files(self) -> List[str]:
+        return [
+            file
+            for file in self.plumbing.stream(
+                "diff", "--name-only", "--cached", "-r", "-z"
+            )
+            if file
+        ]
+
+    def create_commit(
+        self,
+        tree: str,
+        parents: List[str],
+        message: str,
+        author: Optional[Signature] = None,
+    ) -> str:
+        env: Dict[str, str] = {}
+        if author:
+            name, email, date = author
+            env = {
+                "GIT_AUTHOR_NAME": name,
+                "GIT_AUTHOR_EMAIL": email,
+                "GIT_AUTHOR_DATE": date,
+            }
+        parent_args: List[str] = [arg for parent in parents for arg in ("-p", parent)]
+        return self._output(
+            "commit-tree", tree, *parent_args, input=message.encode(), env=env
+        )
+
+    def update_ref(self, ref: str, new: str, old: str, message: str):
+        self._output("update-ref", "-m", message, ref, new, old)
+
+    def close(self):
+        plumbing.close(self.working_dir)
+
+
+class Pygit2Backend(Backend):
+    """
+    works in-process on the object database with libgit2,
+    pygit2 is an optional dependency
+    """
+
+    name = "pygit2"
+
+    def __init__(self, working_dir: str):
+        super().__init__(working_dir)
+        self.pygit2 = import_pygit2()
+        self.repo = self.pygit2.Repository(working_dir)
+
+    def _commit(self, sha: str):
+        try:
+            commit = self.repo.revparse_single(sha)
+        except (KeyError, ValueError):
+            return None
+        return commit if isinstance(commit, self.pygit2.Commit) else None
+
+    def iter_commits(self, target_branch: str, branch: str) -> Iterator[CommitEntry]:
+        try:
+            tip = self.repo.revparse_single(branch).peel(self.pygit2.Commit)
+            target = self.repo.revparse_single(target_branch).peel(self.pygit2.Commit)
+        except (KeyError, ValueError) as e:
+            raise BackendError(f"Can't resolve '{target_branch}..{branch}': {e}")
+        # ordered by commit time, like 'git rev-list'. Commits of the same
+        # second still come before their parents
+        sort_mode = self.pygit2.enums.SortMode
+        walker = self.repo.walk(tip.id, sort_mode.TOPOLOGICAL | sort_mode.TIME)
+        walker.hide(target.id)
+        for commit in walker:
+            if len(commit.parent_ids) > 1:
+                continue
+            yield (
+                str(commit.id),
+                str(commit.tree_id),
+                [str(parent) for parent in commit.parent_ids],
+                commit.message,
+            )
+
+    def changed_files(self, commits: List[str]) -> Dict[str, List[str]]:
+        changed: Dict[str, List[str]] = {}
+        for sha in commits:
+            commit = self._commit(sha)
+            if commit is None:
+                continue
+            if len(commit.parents) != 1:
+                changed[sha] = []
+                continue
+            changed[sha] = self._diff(commit.parents[0].tree, commit.tree)
+        return changed
+
+    def tree_ids(self, commits: List[str]) -> Dict[str, str]:
+        tree_ids: Dict[str, str] = {}
+        for sha in commits:
+            commit = self._commit(sha)
+            if commit is not None:
+                tree_ids[sha] = str(commit.tree_id)
+        return tree_ids
+
+    def _diff(self, old_tree, new_tree) -> List[str]:
+        return [delta.new_file.path for delta in old_tree.diff_to_tree(new_tree).deltas]
+
+    def create_commit(
+        self,
+        tree: str,
+        parents: List[str],
+        message: str,
+        author: Optional[Signature] = None,
+    ) -> str:
+        try:
+            committer = self.repo.default_signature
+            signature = committer
+            if author:
+                name, email, date = author
+                time, offset = parse_date(date)
+                signature = self.pygit2.Signature(name, email, time, offset)
+            return str(
+                self.repo.create_commit(
+                    None, signature, committer, message, tree, parents
+                )
+            )
+        except (KeyError, ValueError, self.pygit2.GitError) as e:
+            raise BackendError(f"Can't create commit: {e}")
+
+    def resolve(self, revisions: List[str]) -> Dict[str, str]:
+        resolved: Dict[str, str] = {}
+        for revision in revisions:
+            try:
+                commit = self.repo.revparse_single(revision).peel(self.pygit2.Commit)
+            except (KeyError, ValueError, self.pygit2.GitError):
+                continue
+            resolved[revision] = str(commit.id)
+        return resolved
+
+    def merge_base(self, commit_a: str, commit_b: str) -> Optional[str]:
+        try:
+            merge_base = self.repo.merge_base(commit_a, commit_b)
+        except (KeyError, ValueError, self.pygit2.GitError):
+            return None
+        return str(merge_base) if merge_base else None
+
+    def staged_files(self) -> List[str]:
+        index = self.repo.index
+        # the repository is kept open, so the index may have changed on disk
+        index.read(False)
+        diff = index.diff_to_tree(self.repo.head.peel(self.pygit2.Tree))
+        # detects renames like 'git diff' with the default 'diff.renames'
+        diff.find_similar()
+        return [delta.new_file.path for delta in diff.deltas]
+
+    def update_ref(self, ref: str, new: str, old: str, message: str):
+        """
+        the ref is locked while it's compared with 'old' and updated, so that
+        no other process moves it in between
+        - without reference transactions in older pygit2 versions, another
+          process could still move the ref between the check and the update
+        """
+        try:
+            name: str = self.repo.lookup_reference(ref).resolve().name
+            if not hasattr(self.repo, "transaction"):
+                self._check_ref(name, old)
+                self.repo.lookup_reference(name).set_target(new, message)
+                return
+            with self.repo.transaction() as transaction:
+                transaction.lock_ref(name)
+                self._check_ref(name, old)
+                transaction.set_target(name, new, message=message)
+        except (KeyError, ValueError, self.pygit2.GitError) as e:
+            raise BackendError(f"Can't update {ref}: {e}")
+
+    def _check_ref(self, name: str, old: str):
+        if str(self.repo.lookup_reference(name).target) != old:
+            raise BackendError(f"{name} doesn't point to {old} anymore")
+
+    def close(self):
+        self.repo.free()
+
+
+BACKENDS: Dict[str, type] = {
+    CliBackend.name: CliBackend,
+    Pygit2Backend.name: Pygit2Backend,
+}
+
+
+def import_pygit2():
+    try:
+        import pygit2
+    except ImportError:
+        raise BackendError(
+            "The pygit2 backend requires pygit2, install it with 'pip install pygit2'"
+        )
+    return pygit2
+
+
+def parse_log_entries(entries: Iterable[str]) -> Iterator[CommitEntry]:
+    """
+    parses the entries of 'git log -z --format=%H %T %P%x00%B',
+    where each commit consists of a header and a message entry
+    """
+    fields: Iterator[str] = iter(entries)
+    for header, message in zip(fields, fields):
+        hexsha, tree_sha, *parents = header.split(" ")
+        yield hexsha, tree_sha, [parent for parent in parents if parent], message
+
+
+def parse_date(date: str) -> Tuple[int, int]:
+    """timestamp and offset in minutes of a date like '1600000000 +0200'"""
+    timestamp, timezone = date.split(" ")
+    offset: int = int(timezone[1:3]) * 60 + int(timezone[3:5])
+    return int(timestamp), -offset if timezone.startswith("-") else offset
+
+
+def get_backend_name() -> str:
+    """set_backend, or SMARTSQUASH_BACKEND, or the CLI backend"""
+    return _backend_name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+
+
+def get_backend_class(name: str) -> type:
+    if name not in BACKENDS:
+        raise BackendError(
+            f"Unknown backend '{name}', choose one of {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[name]
+
+
+def set_backend(name: Optional[str]):
+    """
+    selects the backend for all repositories,
+    raises BackendError if it's unknown or not available
+    """
+    global _backend_name
+    _backend_name = name or None
+    if get_backend_class(get_backend_name()) is Pygit2Backend:
+        import_pygit2()
+
+
+def get_backend(working_dir: str) -> Backend:
+    name: str = get_backend_name()
+    key: Tuple[str, str] = (name, working_dir)
+    if key not in _backends:
+        _backends[key] = get_backend_class(name)(working_dir)
+    return _backends[key]
+
+
+def close(working_dir: str):
+    """closes the backends of the repository, they are reopened on demand"""
+    for key in [key for key in _backends if key[1] == working_dir]:
+        _backends.pop(key).close()
@@ -0,0 +1,89 @@
+import concurrent.futures
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+def read_repos(path: str) -> List[str]:
+    """one repo path per line, empty lines and lines starting with '#' are skipped"""
+    repos: List[str] = []
+    for line in Path(path).read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            repos.append(str(Path(line).absolute()))
+    return repos
+
+
+def run_repo(args: Dict[str, Any]) -> Dict[str, Any]:
+    """runs the command for a single repo in a worker process"""
+    from smartsquash import api, helpers
+    from smartsquash.__main__ import NOTHING_TO_FIXUP, has_nothing_to_do, run_captured
+
+    start: float = time.perf_counter()
+    if has_nothing_to_do(args):
+        result: Dict[str, Any] = {
+            "stdout": NOTHING_TO_FIXUP + "\n",
+            "stderr": "",
+            "exit_code": 0,
+        }
+    else:
+        repos: List[Any] = []
+
+        def get_repo(repo_path: str, target_branch: str):
+            repos.append(helpers.get_repo(repo_path, target_branch))
+            return repos[-1]
+
+        result = run_captured(args, get_repo, colorize=False)
+        # worker processes are reused for other repos
+        # and don't run atexit handlers
+        for repo in repos:
+            api.close(repo)
+    return {
+        "repo": args["repo"],
+        **result,
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+
+
+def run_batch(args: Dict[str, Any], repos: List[str], jobs: int) -> Dict[str, Any]:
+    """
+    runs the command for each of the repos in a pool of 'jobs' processes.
+    A failing repo doesn't stop the others, errors of the pool itself are
+    reported as failures of the affected repos
+    """
+    start: float = time.perf_counter()
+    results: List[Dict[str, Any]] = [{} for _ in repos]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        futures: Dict[concurrent.futures.Future, int] = {
+            pool.submit(run_repo, {**args, "repo": repo}): position
+            for position, repo in enumerate(repos)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            position: int = futures[future]
+            try:
+                results[position] = future.result()
+            except Exception as e:
+                results[position] = {
+                    "repo": repos[position],
+                    "stdout": "",
+                    "stderr": f"Error: {e!r}\n",
+                    "exit_code": 1,
+                    "seconds": None,
+                }
+    failed: int = sum(1 for result in results if result["exit_code"])
+    return {
+        "jobs": jobs,
+        "seconds": round(time.perf_counter() - start, 6),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "repos": results,
+    }
+
+
+def main(args: Dict[str, Any]) -> int:
+    """prints the JSON summary, exits with 1 if any repo failed"""
+    repos: List[str] = read_repos(args["repos_from"])
+    summary: Dict[str, Any] = run_batch(args, repos, args["jobs"])
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
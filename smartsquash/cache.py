@@ -0,0 +1,217 @@
+import functools
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from loguru import logger
+
+SCHEMA_VERSION = 3
+MAX_ENTRIES = 100_000
+MAX_BLOBS = 64
+CACHE_DIR = "smartsquash"
+CACHE_FILE = "cache.sqlite3"
+DISABLE_ENV = "SMARTSQUASH_NO_CACHE"
+# seconds to wait for a database locked by another process, e.g. a hook
+BUSY_TIMEOUT = 1.0
+
+_caches: Dict[str, Optional["Cache"]] = {}
+
+
+def fallback(default: Callable[[], Any]) -> Callable:
+    """
+    the cache is only an optimization, so sqlite errors, e.g. a database
+    locked by another process, must not fail the command:
+    - the error is logged once and the cache is disabled for this run
+    - reads return the default, writes are skipped
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(self: "Cache", *args, **kwargs):
+            if self.failed:
+                return default()
+            try:
+                return function(self, *args, **kwargs)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache unavailable, continuing without: {e}")
+                self.failed = True
+                return default()
+
+        return wrapper
+
+    return decorator
+
+
+class Cache:
+    """
+    persistent cache of the files changed by a commit, stored in
+    '.git/smartsquash/'. Commit SHAs are immutable, so entries never
+    become stale. The number of entries is bounded; the least recently
+    used ones are evicted first, the same goes for the Bloom filters of the
+    files changed by a commit.
+    Derived data, like indexes over a range of commits, is stored as blobs
+    of a given kind, keyed by the data it was derived from
+    """
+
+    def __init__(self, path: Path, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.failed = False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT)
+        self._migrate()
+
+    def _migrate(self):
+        version: int = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        with self.connection:
+            self.connection.execute("DROP TABLE IF EXISTS changed_files")
+            self.connection.execute("DROP TABLE IF EXISTS blobs")
+            self.connection.execute("DROP TABLE IF EXISTS path_filters")
+            self.connection.execute(
+                "CREATE TABLE changed_files ("
+                "sha TEXT PRIMARY KEY, files BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX changed_files_last_used ON changed_files(last_used)"
+            )
+            self.connection.execute(
+                "CREATE TABLE path_filters ("
+                "sha TEXT PRIMARY KEY, filter BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX path_filters_last_used ON path_filters(last_used)"
+            )
+            self.connection.execute(
+                "CREATE TABLE blobs (kind TEXT NOT NULL, key TEXT NOT NULL, "
+                "data BLOB NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get_many(self, commits: Iterable[str]) -> Dict[str, List[str]]:
+        return {
+            sha: [file for file in files.decode().split("\0") if file]
+            for sha, files in self._select("changed_files", "files", commits).items()
+        }
+
+    @fallback(dict)
+    def _select(self, table: str, column: str, commits: Iterable[str]) -> Dict:
+        found: Dict[str, bytes] = {}
+        commits = list(commits)
+        # stay below sqlite's limit of host parameters per statement
+        for start in range(0, len(commits), 500):
+            chunk: List[str] = commits[start : start + 500]
+            rows = self.connection.execute(
+                f"SELECT sha, {column} FROM {table} "
+                f"WHERE sha IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update(rows)
+        if found:
+            now: float = time.time()
+            with self.connection:
+                self.connection.executemany(
+                    f"UPDATE {table} SET last_used = ? WHERE sha = ?",
+                    [(now, sha) for sha in found],
+                )
+        return found
+
+    def get(self, commit: str) -> Optional[List[str]]:
+        return self.get_many([commit]).get(commit)
+
+    def put_many(self, changed: Dict[str, List[str]]):
+        self._insert(
+            "changed_files",
+            {sha: "\0".join(files).encode() for sha, files in changed.items()},
+        )
+
+    def put(self, commit: str, files: List[str]):
+        self.put_many({commit: files})
+
+    def get_filters(self, commits: Iterable[str]) -> Dict[str, bytes]:
+        """the Bloom filters of the files changed by the commits"""
+        return self._select("path_filters", "filter", commits)
+
+    def put_filters(self, filters: Dict[str, bytes]):
+        self._insert("path_filters", filters)
+
+    @fallback(lambda: None)
+    def _insert(self, table: str, rows: Dict[str, bytes]):
+        if not rows:
+            return
+        now: float = time.time()
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)",
+                [(sha, data, now) for sha, data in rows.items()],
+            )
+            self._evict(table)
+
+    def _evict(self, table: str):
+        count: int = self.connection.execute(
+            f"SELECT COUNT(*) FROM {table}"
+        ).fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self.connection.execute(
+            f"DELETE FROM {table} WHERE sha IN ("
+            f"SELECT sha FROM {table} ORDER BY last_used LIMIT ?)",
+            (count - self.max_entries,),
+        )
+
+    @fallback(lambda: None)
+    def get_blob(self, kind: str, key: str) -> Optional[bytes]:
+        row = self.connection.execute(
+            "SELECT data FROM blobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.connection:
+            self.connection.execute(
+                "UPDATE blobs SET last_used = ? WHERE kind = ? AND key = ?",
+                (time.time(), kind, key),
+            )
+        return row[0]
+
+    @fallback(lambda: None)
+    def put_blob(self, kind: str, key: str, data: bytes, max_blobs: int = MAX_BLOBS):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)",
+                (kind, key, data, time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM blobs WHERE kind = ? AND key NOT IN ("
+                "SELECT key FROM blobs WHERE kind = ? "
+                "ORDER BY last_used DESC LIMIT ?)",
+                (kind, kind, max_blobs),
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def close_cache(git_dir: Optional[Path]):
+    """closes the cache of the git directory, it's reopened on demand"""
+    store: Optional[Cache] = _caches.pop(str(git_dir), None)
+    if store is not None:
+        store.close()
+
+
+def open_cache(git_dir: Optional[Path]) -> Optional[Cache]:
+    """
+    returns the cache of the given git directory,
+    or None if caching is disabled or not possible
+    """
+    if git_dir is None or os.environ.get(DISABLE_ENV):
+        return None
+    key: str = str(git_dir)
+    if key not in _caches:
+        try:
+            _caches[key] = Cache(Path(git_dir) / CACHE_DIR / CACHE_FILE)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug(f"Can't open cache, continuing without: {e}")
+            _caches[key] = None
+    return _caches[key]
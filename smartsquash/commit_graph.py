@@ -0,0 +1,452 @@
+import heapq
+import mmap
+import struct
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from smartsquash.gitdir import get_common_dir
+
+# reads git's commit-graph file, see Documentation/gitformat-commit-graph.txt,
+# to walk commits by generation number and to query the changed-path Bloom
+# filters, without inflating commit or tree objects
+
+SIGNATURE = b"CGPH"
+GRAPH_PARENT_NONE = 0x70000000
+GRAPH_EXTRA_EDGES = 0x80000000
+GRAPH_LAST_EDGE = 0x80000000
+CORRECTED_DATE_OVERFLOW = 0x80000000
+BLOOM_SEED_0 = 0x293AE76F
+BLOOM_SEED_1 = 0x7E646E2C
+HASH_LENGTHS = {1: 20, 2: 32}
+
+BRANCH = 1
+TARGET = 2
+
+_graphs: Dict[Path, Tuple[Tuple, Optional["CommitGraph"]]] = {}
+
+
+class CommitGraphError(Exception):
+    """the commit-graph file is corrupt or in an unsupported format"""
+
+
+class GraphLayer:
+    """a single commit-graph file, of a chain of files or on its own"""
+
+    def __init__(self, path: Path, base_count: int):
+        self.path = path
+        self.base_count = base_count
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != SIGNATURE or self.data[4] != 1:
+            raise CommitGraphError(f"{path} is not a commit-graph file")
+        self.hash_length: int = HASH_LENGTHS.get(self.data[5], 0)
+        if not self.hash_length:
+            raise CommitGraphError(f"{path} uses an unknown hash")
+        self.chunks: Dict[bytes, Tuple[int, int]] = {}
+        for index in range(self.data[6]):
+            chunk_id, start = struct.unpack_from(">4sQ", self.data, 8 + 12 * index)
+            end: int = struct.unpack_from(">Q", self.data, 8 + 12 * index + 16)[0]
+            self.chunks[chunk_id] = (start, end)
+        for required in (b"OIDF", b"OIDL", b"CDAT"):
+            if required not in self.chunks:
+                raise CommitGraphError(f"{path} has no {required.decode()} chunk")
+        self.fanout: int = self.chunks[b"OIDF"][0]
+        self.count: int = struct.unpack_from(">I", self.data, self.fanout + 255 * 4)[0]
+        self.bloom: Optional[Tuple[int, int, int]] = None
+        if b"BIDX" in self.chunks and b"BDAT" in self.chunks:
+            start = self.chunks[b"BDAT"][0]
+            # hash version, number of hashes and bits per entry
+            self.bloom = struct.unpack_from(">III", self.data, start)
+
+    def find(self, oid: bytes) -> Optional[int]:
+        """local position of the commit, found with a binary search"""
+        first: int = oid[0]
+        low: int = (
+            struct.unpack_from(">I", self.data, self.fanout + (first - 1) * 4)[0]
+            if first
+            else 0
+        )
+        high: int = struct.unpack_from(">I", self.data, self.fanout + first * 4)[0]
+        start: int = self.chunks[b"OIDL"][0]
+        while low < high:
+            middle: int = (low + high) // 2
+            offset: int = start + middle * self.hash_length
+            current: bytes = self.data[offset : offset + self.hash_length]
+            if current == oid:
+                return middle
+            if current < oid:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def oid(self, local: int) -> bytes:
+        offset: int = self.chunks[b"OIDL"][0] + local * self.hash_length
+        return self.data[offset : offset + self.hash_length]
+
+    def commit_data(self, local: int) -> Tuple[bytes, int, int, int, int]:
+        """tree, both parent fields, topological level and commit time"""
+        offset: int = self.chunks[b"CDAT"][0] + local * (self.hash_length + 16)
+        tree: bytes = self.data[offset : offset + self.hash_length]
+        parent_1, parent_2, high, low = struct.unpack_from(
+            ">IIII", self.data, offset + self.hash_length
+        )
+        return tree, parent_1, parent_2, high >> 2, ((high & 3) << 32) | low
+
+    def extra_parents(self, index: int) -> List[int]:
+        offset: int = self.chunks[b"EDGE"][0] + index * 4
+        parents: List[int] = []
+        while True:
+            edge: int = struct.unpack_from(">I", self.data, offset)[0]
+            parents.append(edge & ~GRAPH_LAST_EDGE)
+            if edge & GRAPH_LAST_EDGE:
+                return parents
+            offset += 4
+
+    def corrected_date(self, local: int, commit_time: int) -> int:
+        offset: int = struct.unpack_from(
+            ">I", self.data, self.chunks[b"GDA2"][0] + local * 4
+        )[0]
+        if offset & CORRECTED_DATE_OVERFLOW:
+            offset = struct.unpack_from(
+                ">Q",
+                self.data,
+                self.chunks[b"GDO2"][0] + (offset & ~CORRECTED_DATE_OVERFLOW) * 8,
+            )[0]
+        return commit_time + offset
+
+    def bloom_filter(self, local: int) -> Optional[bytes]:
+        """the filter of the commit, None if it wasn't computed"""
+        index: int = self.chunks[b"BIDX"][0]
+        end: int = struct.unpack_from(">I", self.data, index + local * 4)[0]
+        start: int = (
+            struct.unpack_from(">I", self.data, index + (local - 1) * 4)[0]
+            if local
+            else 0
+        )
+        if end == start:
+            return None
+        data: int = self.chunks[b"BDAT"][0] + 12
+        return self.data[data + start : data + end]
+
+    def close(self):
+        self.data.close()
+
+
+class CommitGraph:
+    """
+    the commit-graph of a repository. Commits are addressed by their global
+    position, which counts through the layers of a chain from the base
+    """
+
+    def __init__(self, layers: List[GraphLayer]):
+        self.layers = layers
+        # generation numbers v2 are only valid, if every layer has them
+        self.corrected_dates: bool = all(b"GDA2" in layer.chunks for layer in layers)
+        self.keys: Dict[Tuple[str, int, int], List[int]] = {}
+
+    @property
+    def has_bloom_filters(self) -> bool:
+        return any(layer.bloom for layer in self.layers)
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    def _layer(self, position: int) -> Tuple[GraphLayer, int]:
+        for layer in self.layers:
+            if position < layer.base_count + layer.count:
+                return layer, position - layer.base_count
+        raise CommitGraphError(f"Commit position {position} is out of range")
+
+    def position(self, sha: str) -> Optional[int]:
+        oid: bytes = bytes.fromhex(sha)
+        for layer in self.layers:
+            local: Optional[int] = layer.find(oid)
+            if local is not None:
+                return layer.base_count + local
+        return None
+
+    def sha(self, position: int) -> str:
+        layer, local = self._layer(position)
+        return layer.oid(local).hex()
+
+    def tree(self, position: int) -> str:
+        layer, local = self._layer(position)
+        return layer.commit_data(local)[0].hex()
+
+    def parents(self, position: int) -> List[int]:
+        layer, local = self._layer(position)
+        _, parent_1, parent_2, _, _ = layer.commit_data(local)
+        parents: List[int] = []
+        if parent_1 != GRAPH_PARENT_NONE:
+            parents.append(parent_1)
+        if parent_2 & GRAPH_EXTRA_EDGES:
+            parents.extend(layer.extra_parents(parent_2 & ~GRAPH_EXTRA_EDGES))
+        elif parent_2 != GRAPH_PARENT_NONE:
+            parents.append(parent_2)
+        return parents
+
+    def generation(self, position: int) -> Tuple[int, int]:
+        """
+        generation number and commit time. Ancestors always have a lower
+        generation number than their descendants
+        """
+        layer, local = self._layer(position)
+        _, _, _, level, commit_time = layer.commit_data(local)
+        if self.corrected_dates:
+            return layer.corrected_date(local, commit_time), commit_time
+        if not level:
+            raise CommitGraphError("The commit-graph has no generation numbers")
+        return level, commit_time
+
+    def _bloom_keys(self, path: str, version: int, hashes: int) -> List[int]:
+        cache_key: Tuple[str, int, int] = (path, version, hashes)
+        if cache_key not in self.keys:
+            data: bytes = path.encode()
+            signed: bool = version == 1
+            hash_0: int = murmur3(data, BLOOM_SEED_0, signed)
+            hash_1: int = murmur3(data, BLOOM_SEED_1, signed)
+            self.keys[cache_key] = [
+                (hash_0 + index * hash_1) & 0xFFFFFFFF for index in range(hashes)
+            ]
+        return self.keys[cache_key]
+
+    def maybe_changed(self, position: int, path: str) -> bool:
+        """
+        False, if the Bloom filter of the commit rules out that it changed
+        the path. True for commits without filter
+        - the filters contain the leading directories of each changed path,
+          which are checked as well to rule out more false positives
+        """
+        layer, local = self._layer(position)
+        if not layer.bloom:
+            return True
+        data: Optional[bytes] = layer.bloom_filter(local)
+        if data is None:
+            return True
+        version, hashes, _ = layer.bloom
+        bits: int = len(data) * 8
+        for prefix in get_leading_paths(path):
+            for key in self._bloom_keys(prefix, version, hashes):
+                bit: int = key % bits
+                if not data[bit // 8] & (1 << (bit % 8)):
+                    return False
+        return True
+
+    def filter_changing_all(self, commits: List[str], files: Set[str]) -> List[str]:
+        """
+        the commits, which may have changed all of the files according to
+        their Bloom filters. Commits missing in the commit-graph are kept
+        """
+        candidates: List[str] = []
+        for sha in commits:
+            position: Optional[int] = self.position(sha)
+            if position is None or all(
+                self.maybe_changed(position, file) for file in files
+            ):
+                candidates.append(sha)
+        return candidates
+
+    def close(self):
+        for layer in self.layers:
+            layer.close()
+
+
+def murmur3(data: bytes, seed: int, signed: bool = False) -> int:
+    """
+    32 bit murmur3 hash as used by git's Bloom filters.
+    Version 1 filters were written with the bytes read as signed char
+    """
+    values: List[int] = [
+        byte - 256 if signed and byte >= 0x80 else byte for byte in data
+    ]
+    c1, c2 = 0xCC9E2D51, 0x1B873593
+    mask = 0xFFFFFFFF
+    h: int = seed
+    blocks: int = len(values) // 4
+    for block in range(blocks):
+        b = values[block * 4 : block * 4 + 4]
+        k: int = (b[0] | (b[1] << 8) | (b[2] << 16) | (b[3] << 24)) & mask
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        k = (k * c2) & mask
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & mask
+        h = (h * 5 + 0xE6546B64) & mask
+    tail: List[int] = values[blocks * 4 :]
+    k1: int = 0
+    if len(tail) == 3:
+        k1 ^= (tail[2] << 16) & mask
+    if len(tail) >= 2:
+        k1 ^= (tail[1] << 8) & mask
+    if tail:
+        k1 ^= tail[0] & mask
+        k1 = (k1 * c1) & mask
+        k1 = ((k1 << 15) | (k1 >> 17)) & mask
+        k1 = (k1 * c2) & mask
+        h ^= k1
+    h ^= len(values)
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & mask
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & mask
+    h ^= h >> 16
+    return h
+
+
+def get_leading_paths(path: str) -> List[str]:
+    """the path and its leading directories, e.g. 'a/b' and 'a'"""
+    parts: List[str] = path.split("/")
+    return ["/".join(parts[:count]) for count in range(len(parts), 0, -1)]
+
+
+def get_graph_files(objects_dir: Path) -> List[Path]:
+    """the commit-graph files of a chain from its base, or the single file"""
+    chain: Path = objects_dir / "info" / "commit-graphs" / "commit-graph-chain"
+    if chain.is_file():
+        return [
+            chain.parent / f"graph-{line.strip()}.graph"
+            for line in chain.read_text().splitlines()
+            if line.strip()
+        ]
+    single: Path = objects_dir / "info" / "commit-graph"
+    return [single] if single.is_file() else []
+
+
+def load_commit_graph(git_dir: Path) -> Optional[CommitGraph]:
+    """
+    the commit-graph of the repository, None if there is none or it can't
+    be read. Reloaded only if the files changed since the last call
+    """
+    objects_dir: Path = get_common_dir(Path(git_dir)) / "objects"
+    try:
+        files: List[Path] = get_graph_files(objects_dir)
+        stamp: Tuple = tuple((str(file), file.stat().st_mtime_ns) for file in files)
+    except OSError:
+        return None
+    cached = _graphs.get(objects_dir)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    if cached and cached[1]:
+        cached[1].close()
+    graph: Optional[CommitGraph] = None
+    layers: List[GraphLayer] = []
+    try:
+        for file in files:
+            layers.append(GraphLayer(file, sum(layer.count for layer in layers)))
+        graph = CommitGraph(layers) if layers else None
+    except (OSError, ValueError, struct.error, CommitGraphError):
+        for layer in layers:
+            layer.close()
+    _graphs[objects_dir] = (stamp, graph)
+    return graph
+
+
+def close_commit_graph(git_dir: Path):
+    """unmaps the commit-graph of the repository, it's reloaded on demand"""
+    cached = _graphs.pop(get_common_dir(Path(git_dir)) / "objects", None)
+    if cached and cached[1]:
+        cached[1].close()
+
+
+def get_range(
+    graph: CommitGraph,
+    target_sha: str,
+    branch_sha: str,
+    read_parents: Callable[[str], List[str]],
+) -> Optional[List[str]]:
+    """
+    the commits of 'target..branch', newest first, like 'git rev-list'.
+    Walks down from both tips in order of generation number and stops, once
+    only ancestors of the target are left.
+    - None, if the range contains a merge commit. 'git rev-list' orders the
+      commits of merged branches by commit date, not by generation number
+    - commits, which were made after the commit-graph was written, are read
+      with read_parents. They are never ancestors of commits in the graph
+    """
+    Node = Union[int, str]
+    levels: Dict[str, int] = {}
+    read: Dict[str, List[Node]] = {}
+
+    def resolve(sha: str) -> Node:
+        position: Optional[int] = graph.position(sha)
+        return sha if position is None else position
+
+    def parents_of(node: Node) -> List[Node]:
+        if isinstance(node, int):
+            return graph.parents(node)
+        if node not in read:
+            read[node] = [resolve(parent) for parent in read_parents(node)]
+        return read[node]
+
+    def level(sha: str) -> int:
+        # topological level among the commits missing in the graph
+        pending: List[str] = [sha]
+        while pending:
+            current: str = pending[-1]
+            missing: List[str] = [
+                parent
+                for parent in parents_of(current)
+                if isinstance(parent, str) and parent not in levels
+            ]
+            if missing:
+                pending.extend(missing)
+                continue
+            pending.pop()
+            levels[current] = 1 + max(
+                (
+                    levels[parent]
+                    for parent in parents_of(current)
+                    if isinstance(parent, str)
+                ),
+                default=0,
+            )
+        return levels[sha]
+
+    def key(node: Node) -> Tuple[int, int, int]:
+        if isinstance(node, int):
+            return (0, *graph.generation(node))
+        return 1, level(node), 0
+
+    flags: Dict[Node, int] = {}
+    queue: List[Tuple[Tuple[int, int, int], int, Node]] = []
+    nonstale: Set[Node] = set()
+    counter: int = 0
+
+    def push(node: Node, flag: int):
+        nonlocal counter
+        if node in flags:
+            flags[node] |= flag
+            if flags[node] & TARGET:
+                nonstale.discard(node)
+            return
+        flags[node] = flag
+        if flag == BRANCH:
+            nonstale.add(node)
+        counter += 1
+        negated: Tuple[int, int, int] = tuple(-value for value in key(node))
+        heapq.heappush(queue, (negated, counter, node))
+
+    push(resolve(target_sha), TARGET)
+    push(resolve(branch_sha), BRANCH)
+    commits: List[str] = []
+    while nonstale:
+        _, _, node = heapq.heappop(queue)
+        nonstale.discard(node)
+        flag: int = flags[node]
+        parents: List[Node] = parents_of(node)
+        if flag == BRANCH:
+            if len(parents) > 1:
+                return None
+            commits.append(graph.sha(node) if isinstance(node, int) else node)
+        for parent in parents:
+            push(parent, flag)
+    return commits
+
+
+def write_commit_graph(repo_path: str) -> subprocess.CompletedProcess:
+    """writes or refreshes the commit-graph with changed-path Bloom filters"""
+    return subprocess.run(
+        ["git", "commit-graph", "write", "--reachable", "--changed-paths"],
+        cwd=repo_path,
+    )
@@ -0,0 +1,166 @@
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from smartsquash.gitdir import find_git_dir, get_common_dir
+
+SOCKET_DIR = "smartsquash"
+SOCKET_FILE = "daemon.sock"
+DISABLE_ENV = "SMARTSQUASH_NO_DAEMON"
+CONNECT_TIMEOUT = 0.05
+
+# the client side of this module is imported by every 'sq' run,
+# so it only uses the standard library
+
+
+def get_socket_path(git_dir: Path) -> Path:
+    return git_dir / SOCKET_DIR / SOCKET_FILE
+
+
+def send(socket_path: Path, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """sends the request to the daemon, None if no daemon is listening"""
+    if not socket_path.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(str(socket_path))
+        # the daemon may run a rebase, which takes as long as it takes
+        client.settimeout(None)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as response:
+            return json.loads(response.read() or b"null")
+    except (OSError, ValueError):
+        return None
+    finally:
+        client.close()
+
+
+def forward(args: Dict[str, Any]) -> Optional[int]:
+    """
+    runs the command in the daemon of the repository, if one is running.
+    Returns the exit code of the command, None if it has to run locally
+    """
+    if os.environ.get(DISABLE_ENV):
+        return None
+    git_dir: Optional[Path] = find_git_dir(args["repo"])
+    if git_dir is None:
+        return None
+    response: Optional[Dict[str, Any]] = send(
+        get_socket_path(git_dir), {"command": "run", "args": args}
+    )
+    if response is None:
+        return None
+    print(response["stdout"], end="")
+    print(response["stderr"], end="", file=sys.stderr)
+    return response["exit_code"]
+
+
+def stop(repo_path: str) -> bool:
+    git_dir: Optional[Path] = find_git_dir(repo_path)
+    return bool(git_dir and send(get_socket_path(git_dir), {"command": "stop"}))
+
+
+def get_refs_snapshot(git_dir: Path) -> Tuple[int, ...]:
+    """
+    modification times of HEAD and the branches. Updating a ref renames a
+    lock file onto it, which changes the modification time of its directory
+    - HEAD belongs to the worktree, the branches are shared by all worktrees
+    """
+    common_dir: Path = get_common_dir(git_dir)
+    paths: List[str] = [str(git_dir / "HEAD"), str(common_dir / "packed-refs")]
+    for directory, _, _ in os.walk(common_dir / "refs" / "heads"):
+        paths.append(directory)
+    snapshot: List[int] = []
+    for path in paths:
+        try:
+            snapshot.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            snapshot.append(0)
+    return tuple(snapshot)
+
+
+class WarmRepos:
+    """
+    keeps the validated git.Repo of each target branch as long as
+    HEAD and the branches don't change
+    """
+
+    def __init__(self, git_dir: Path):
+        self.git_dir = git_dir
+        self.snapshot: Tuple[int, ...] = ()
+        self.repos: Dict[Tuple[str, str], Any] = {}
+
+    def get_repo(self, repo_path: str, target_branch: str):
+        from smartsquash import helpers
+
+        snapshot: Tuple[int, ...] = get_refs_snapshot(self.git_dir)
+        if snapshot != self.snapshot:
+            for repo in self.repos.values():
+                repo.close()
+            self.repos = {}
+            self.snapshot = snapshot
+        key: Tuple[str, str] = (repo_path, target_branch)
+        if key not in self.repos:
+            self.repos[key] = helpers.get_repo(repo_path, target_branch)
+        return self.repos[key]
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    - run: runs a command given the CLI arguments and a get_repo function,
+      returning its output and exit code
+    """
+
+    def __init__(self, git_dir: Path, run: Callable[..., Dict[str, Any]]):
+        self.run = run
+        self.warm_repos = WarmRepos(git_dir)
+        self.stopping = False
+        super().__init__(str(get_socket_path(git_dir)), DaemonHandler)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request: Dict[str, Any] = json.loads(self.rfile.readline())
+        if request["command"] == "run":
+            response: Dict[str, Any] = self.server.run(
+                request["args"], self.server.warm_repos.get_repo
+            )
+            self.wfile.write(json.dumps(response).encode())
+            return
+        if request["command"] == "stop":
+            self.server.stopping = True
+        self.wfile.write(b"true")
+
+
+def make_server(repo_path: str, run: Callable[..., Dict[str, Any]]) -> DaemonServer:
+    """
+    creates the server listening on the socket of the repository. A socket
+    left behind by a daemon, which didn't shut down cleanly, is replaced
+    """
+    git_dir: Optional[Path] = find_git_dir(repo_path)
+    if git_dir is None:
+        raise OSError(f"{repo_path} is not a git repository")
+    socket_path: Path = get_socket_path(git_dir)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if send(socket_path, {"command": "ping"}) is not None:
+        raise OSError(f"A daemon is already listening on {socket_path}")
+    with contextlib.suppress(FileNotFoundError):
+        socket_path.unlink()
+    return DaemonServer(git_dir, run)
+
+
+def serve(server: DaemonServer):
+    """handles one request after the other, until asked to stop"""
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(server.server_address)
@@ -1,16 +1,41 @@
 import functools
+import time
 from typing import Callable, Dict, List
+from smartsquash import cache, profiling
+from smartsquash.gitdir import find_git_dir
 
 
 def memorize_files_changed(func) -> Callable:
     @functools.wraps(func)
     def wrapper_memorize_paths(*args, **kwargs) -> Dict[str, List[str]]:
+        working_dir: str = args[0]
         commit_sha: str = args[1]
 
         if not hasattr(wrapper_memorize_paths, "paths"):
             wrapper_memorize_paths.paths = {}
         if not wrapper_memorize_paths.paths.get(commit_sha):
-            wrapper_memorize_paths.paths[commit_sha] = func(*args, **kwargs)
+            store = cache.open_cache(find_git_dir(working_dir))
+            paths = store.get(commit_sha) if store else None
+            if paths is None:
+                paths = func(*args, **kwargs)
+                if store:
+                    store.put(commit_sha, paths)
+            wrapper_memorize_paths.paths[commit_sha] = paths
         return wrapper_memorize_paths.paths[commit_sha]
 
     return wrapper_memorize_paths
+
+
+def profile_phase(func) -> Callable:
+    @functools.wraps(func)
+    def wrapper_profile_phase(*args, **kwargs):
+        profile = profiling.get_profile()
+        if profile is None:
+            return func(*args, **kwargs)
+        start: float = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_phase(func.__name__, time.perf_counter() - start)
+
+    return wrapper_profile_phase
@@ -0,0 +1,6 @@
+# base class of the errors, which modules raise instead of exiting. Kept
+# apart from helpers, so that modules helpers depends on can derive from it
+
+
+class SmartsquashError(Exception):
+    """base class of the errors raised instead of exiting"""
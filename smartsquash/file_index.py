@@ -0,0 +1,65 @@
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from smartsquash import cache
+from smartsquash.decorators import profile_phase
+
+CACHE_KIND = "file-index"
+
+
+class FileIndex:
+    """
+    inverted index from a file to the ordered positions of the commits,
+    which changed it. The position of a commit is its position in the
+    ordered commit_changed_files it was built from
+    """
+
+    def __init__(self, commits: List[str], postings: Dict[str, List[int]]):
+        self.commits = commits
+        self.postings = postings
+
+    @classmethod
+    def from_changed_files(
+        cls, commit_changed_files: Dict[str, Set[str]]
+    ) -> "FileIndex":
+        commits: List[str] = list(commit_changed_files)
+        postings: Dict[str, List[int]] = {}
+        for position, commit_sha in enumerate(commits):
+            for file in commit_changed_files[commit_sha]:
+                postings.setdefault(file, []).append(position)
+        return cls(commits, postings)
+
+    def first_changing(self, file: str) -> Optional[str]:
+        positions: List[int] = self.postings.get(file, [])
+        return self.commits[positions[0]] if positions else None
+
+    def to_bytes(self) -> bytes:
+        data: Dict = {"commits": self.commits, "postings": self.postings}
+        return zlib.compress(json.dumps(data).encode())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FileIndex":
+        loaded: Dict = json.loads(zlib.decompress(data))
+        return cls(loaded["commits"], loaded["postings"])
+
+
+@profile_phase
+def get_file_index(
+    git_dir: Optional[Path], commit_changed_files: Dict[str, Set[str]]
+) -> FileIndex:
+    """
+    returns the index for commit_changed_files, from the cache if it was
+    built for the same commits before
+    """
+    store: Optional[cache.Cache] = cache.open_cache(git_dir)
+    if store is None:
+        return FileIndex.from_changed_files(commit_changed_files)
+    key: str = hashlib.sha1("\n".join(commit_changed_files).encode()).hexdigest()
+    data: Optional[bytes] = store.get_blob(CACHE_KIND, key)
+    if data is not None:
+        return FileIndex.from_bytes(data)
+    index: FileIndex = FileIndex.from_changed_files(commit_changed_files)
+    store.put_blob(CACHE_KIND, key, index.to_bytes())
+    return index
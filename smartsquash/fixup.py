@@ -1,34 +1,222 @@
-import sys
+import collections
 import git.exc
-from smartsquash.helpers import run_rebase
-from typing import Dict, Set, Optional
+from smartsquash import backend, plumbing, rewrite
+from smartsquash.path_filter import ChangedPathFilters, PathFilters
+from smartsquash.decorators import profile_phase
+from smartsquash.file_index import FileIndex
+from smartsquash.paths import PathTable
+from smartsquash.records import CommitRecord, FileSetTable, retrieve_commit_records
+from smartsquash.helpers import (
+    SmartsquashError,
+    get_changed_files,
+    retrieve_commits,
+)
+from typing import Dict, FrozenSet, Set, Optional, List, Tuple
 from loguru import logger
 
+AUTOSQUASH_PREFIXES = ("fixup! ", "squash! ", "amend! ")
 
+
+class FixupError(SmartsquashError):
+    """the fixup commits couldn't be created"""
+
+
+@profile_phase
 def get_files_changed_in_staging(repo: git.Repo) -> Set[str]:
-    output: Set[str] = (repo.git.diff("--name-only", "--cached", "-r").splitlines())
-    return set(output)
+    return set(backend.get_backend(repo.working_dir).staged_files())
 
 
+@profile_phase
 def get_closest_change_commit(
     files_changed: Set[str], commit_changed_files: Dict[str, Set[str]]
 ) -> Optional[str]:
+    """
+    returns the first commit of commit_changed_files,
+    which changed all of the files
+    - the commits are scanned, comparing the bitsets
+      of their changed files with the bitset of the files
+    """
+    table = PathTable()
+    wanted: int = table.bits(files_changed)
     for commit_sha, files in commit_changed_files.items():
-        if files_changed.issubset(files):
+        if table.lookup_bits(files) & wanted == wanted:
+            return commit_sha
+    return None
+
+
+@profile_phase
+def get_closest_change_commit_from_filters(
+    repo: git.Repo,
+    target_branch: str,
+    files_changed: Set[str],
+    filters: ChangedPathFilters,
+) -> Optional[str]:
+    """
+    like get_closest_change_commit, but only looks up the files changed by
+    commits, which may have changed all of the files according to the
+    Bloom filters of the commit-graph or of smartsquash
+    - the files of commits, whose filters were just built, are known already.
+      The others are only looked up for the commits, which may match
+    """
+    commits: List[str] = [
+        commit.hexsha for commit in retrieve_commits(repo, target_branch, False)
+    ]
+    candidates: List[str] = filters.filter_changing_all(commits, files_changed)
+    known: Dict[str, List[str]] = (
+        filters.changed_files if isinstance(filters, PathFilters) else {}
+    )
+    for commit_sha in candidates:
+        files: Optional[List[str]] = known.get(commit_sha)
+        if files is None:
+            files = get_changed_files(repo, [commit_sha]).get(commit_sha, [])
+        if files and files_changed.issubset(files):
             return commit_sha
     return None
 
 
-def run_fixup(
-    repo: git.Repo, target_branch: str, fixup_commit_sha: str, add: bool, dry: bool
-):
+def get_fixup_command(fixup_commit_sha: str, add: bool) -> List[str]:
     command = ["--fixup", fixup_commit_sha]
+    if add:
+        command.insert(0, "-a")
+    return command
+
+
+def create_fixup_commit(repo: git.Repo, fixup_commit_sha: str, add: bool) -> str:
+    """commits the staged files as fixup of the commit, returns the new commit"""
+    try:
+        repo.git.commit(*get_fixup_command(fixup_commit_sha, add))
+    except git.CommandError as e:
+        raise FixupError(f"Error, while trying to fixup files: ({str(e)})")
+    return repo.head.commit.hexsha
+
+
+def amend_commit(repo: git.Repo, add: bool) -> str:
+    """
+    amends HEAD with the staged files, which is what fixing up HEAD and
+    autosquashing it would result in. Returns the new HEAD
+    """
+    command: List[str] = ["--amend", "--no-edit"]
     if add:
         command.insert(0, "-a")
     try:
-        if dry:
-            logger.log("DRY", f"Would run: {command}")
         repo.git.commit(*command)
-        run_rebase(repo, target_branch, "true", dry, autosquash=True)
     except git.CommandError as e:
-        sys.exit(f"Error, while trying to fixup files: ({str(e)})")
+        raise FixupError(f"Error, while trying to fixup files: ({str(e)})")
+    return repo.head.commit.hexsha
+
+
+def is_autosquash_commit(subject: str) -> bool:
+    """whether 'git rebase --autosquash' moves the commit"""
+    return subject.startswith(AUTOSQUASH_PREFIXES)
+
+
+@profile_phase
+def has_pending_autosquash(repo: git.Repo, target_branch: str) -> bool:
+    """whether commits of the branch are marked for autosquash already"""
+    return any(
+        is_autosquash_commit(message)
+        for _, _, _, message in backend.get_backend(repo.working_dir).iter_commits(
+            target_branch, str(repo.active_branch)
+        )
+    )
+
+
+@profile_phase
+def get_fixup_upstream(
+    repo: git.Repo, target_branch: str, target_sha: str, fixup_commit_sha: str
+) -> str:
+    """
+    returns the upstream for rebasing the fixup commit at HEAD into its target.
+    That's the parent of the target, if none of the commits in between change
+    the files of the fixup commit, so only the commits from the target on
+    are replayed. Otherwise, or if commits before the target are marked for
+    autosquash as well, it's the target branch
+    """
+    file_sets = FileSetTable()
+    records: List[CommitRecord] = retrieve_commit_records(
+        repo, target_branch, file_sets
+    )
+    positions: Dict[str, int] = {
+        record.hexsha: position for position, record in enumerate(records)
+    }
+    position: Optional[int] = positions.get(target_sha)
+    if position is None or positions.get(fixup_commit_sha) != len(records) - 1:
+        return target_branch
+    target: CommitRecord = records[position]
+    if target.parent_count != 1:
+        return target_branch
+    # merges aren't listed, so a gap in the chain of parents means one
+    for parent, record in zip(records[position:], records[position + 1 :]):
+        if record.parent != parent.hexsha:
+            return target_branch
+    if any(is_autosquash_commit(record.subject) for record in records[:position]):
+        return target_branch
+    fixup_files: FrozenSet[str] = file_sets.files(records[-1])
+    if any(
+        fixup_files.intersection(file_sets.files(record))
+        for record in records[position + 1 : -1]
+    ):
+        return target_branch
+    return target.parent
+
+
+def rewrite_fixup(repo: git.Repo, target_branch: str, fixups: Dict[str, str]) -> bool:
+    """rewrites the branch for fixup commits, given by the sha of their target"""
+    try:
+        plan: List[Tuple[str, git.Commit]] = rewrite.get_fixup_plan(
+            retrieve_commits(repo, target_branch),
+            {target: [repo.commit(fixup)] for target, fixup in fixups.items()},
+        )
+    except rewrite.RewriteError as e:
+        logger.warning(f"{e}. Falling back to interactive rebase")
+        return False
+    return rewrite.try_rewrite_branch(repo, target_branch, plan)
+
+
+@profile_phase
+def get_files_changed_in_worktree(repo: git.Repo) -> Set[str]:
+    return {
+        file
+        for file in plumbing.get_plumbing(repo.working_dir).stream(
+            "diff", "--name-only", "HEAD", "-r", "-z"
+        )
+        if file
+    }
+
+
+@profile_phase
+def get_fixup_groups(
+    files_changed: Set[str],
+    commit_changed_files: Dict[str, Set[str]],
+    index: Optional[FileIndex] = None,
+) -> Dict[str, Set[str]]:
+    """
+    groups the changed files by the commit, which changed them last
+    - commit_changed_files has to be ordered from newest to oldest commit
+    - files, which aren't changed by any commit, aren't part of any group
+    """
+    if index is None:
+        index = FileIndex.from_changed_files(commit_changed_files)
+    groups: Dict[str, Set[str]] = collections.defaultdict(set)
+    for file in files_changed:
+        if commit_sha := index.first_changing(file):
+            groups[commit_sha].add(file)
+    return groups
+
+
+def write_fixup_commits(
+    repo: git.Repo, groups: Dict[str, Set[str]], add: bool
+) -> Dict[str, str]:
+    """
+    creates one fixup commit per group, returns them by their target commit
+    - add: adds the files of the groups, which aren't staged yet
+    """
+    try:
+        if add:
+            repo.git.add("-u", "--", *sorted(set().union(*groups.values())))
+        return {
+            commit_sha: rewrite.write_fixup_commit(repo, commit_sha, files)
+            for commit_sha, files in groups.items()
+        }
+    except (git.CommandError, rewrite.RewriteError) as e:
+        raise FixupError(f"Error, while trying to fixup files: ({str(e)})")
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Optional
+
+# resolves the directories of a repository without spawning git.
+# Imported by every 'sq' run, so it only uses the standard library
+
+
+def find_git_dir(repo_path: str) -> Optional[Path]:
+    """
+    resolves the git directory of repo_path or one of its parents,
+    like git.Repo(search_parent_directories=True)
+    - worktrees and submodules use a '.git' file pointing to the real directory
+    """
+    path: Path = Path(repo_path).absolute()
+    for directory in (path, *path.parents):
+        dot_git: Path = directory / ".git"
+        if dot_git.is_dir():
+            return dot_git
+        if dot_git.is_file():
+            content: str = dot_git.read_text().strip()
+            if content.startswith("gitdir:"):
+                return (directory / content[len("gitdir:") :].strip()).resolve()
+    return None
+
+
+def get_common_dir(git_dir: Path) -> Path:
+    """
+    the directory holding the refs and objects, which differs for linked
+    worktrees
+    """
+    commondir: Path = git_dir / "commondir"
+    if commondir.is_file():
+        return (git_dir / commondir.read_text().strip()).resolve()
+    return git_dir
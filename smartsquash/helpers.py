@@ -1,13 +1,14 @@
 import git
 import git.exc
-import os
 from pathlib import Path
-import subprocess
 import sys
 import collections
 import enum
 from typing import List, Dict, Set, Optional
-from smartsquash.decorators import memorize_files_changed
+from git.util import hex_to_bin
+from smartsquash import backend, cache
+from smartsquash.decorators import memorize_files_changed, profile_phase
+from smartsquash.errors import SmartsquashError
 from loguru import logger
 
 
@@ -22,48 +23,64 @@ class ErrorMessage(enum.Enum):
         return self.value
 
 
+class InvalidRepositoryError(SmartsquashError):
+    def __init__(self, message: ErrorMessage):
+        super().__init__(str(message))
+        self.message = message
+
+
+class RebaseError(SmartsquashError):
+    """the rebase failed and was aborted"""
+
+
 def fatal_log(message: ErrorMessage):
     logger.error(message)
     sys.exit(1)
 
 
-def get_repo(repo_path: str, target_branch: str) -> git.Repo:
+@profile_phase
+def open_repo(repo_path: str, target_branch: str) -> git.Repo:
+    """like get_repo, but raises InvalidRepositoryError instead of exiting"""
     if not Path(repo_path).exists():
-        fatal_log(ErrorMessage.PATH_NOT_EXIST)
+        raise InvalidRepositoryError(ErrorMessage.PATH_NOT_EXIST)
     try:
         repo: git.Repo = git.Repo(repo_path, search_parent_directories=True)
     except git.exc.InvalidGitRepositoryError:
-        fatal_log(ErrorMessage.NOT_A_GIT_REPO)
+        raise InvalidRepositoryError(ErrorMessage.NOT_A_GIT_REPO)
     try:
         repo.heads[target_branch]
     except (git.exc.GitCommandError, git.GitCommandError, AttributeError, IndexError):
-        fatal_log(ErrorMessage.TARGET_NOT_EXIST)
+        raise InvalidRepositoryError(ErrorMessage.TARGET_NOT_EXIST)
     if repo.head.is_detached:
-        fatal_log(ErrorMessage.HEAD_DETACHED)
+        raise InvalidRepositoryError(ErrorMessage.HEAD_DETACHED)
     if repo.active_branch.name == target_branch:
-        fatal_log(ErrorMessage.TARGET_EQUALS_CURRENT)
+        raise InvalidRepositoryError(ErrorMessage.TARGET_EQUALS_CURRENT)
     return repo
 
 
+def get_repo(repo_path: str, target_branch: str) -> git.Repo:
+    try:
+        return open_repo(repo_path, target_branch)
+    except InvalidRepositoryError as e:
+        fatal_log(e.message)
+
+
+@profile_phase
 def retrieve_commits(
     repo: git.Repo, target_branch: str, reverse: bool = True
 ) -> List[git.Commit]:
     """
     retrieves commits that are only part of the currently active branch,
     and are not in the target branch
-    - git cherry could be used for this, but GitPython doesn't support it
-    - Just run raw git command, if this becomes bottleneck
+    - only walks 'target..HEAD', so the cost scales with the length of
+      the branch instead of the age of the repository
+    - merge commits are ignored, like 'git rebase -i' does
     """
-    target_commits_sha: List[git.Commit] = [
-        commit.hexsha
-        for commit in repo.iter_commits(rev=target_branch)
-        if len(commit.parents) < 2  # ignore merge commits
-    ]
     commits: List[git.Commit] = [
-        commit
-        for commit in repo.iter_commits(rev=repo.active_branch)
-        if commit.hexsha not in target_commits_sha
-        and len(commit.parents) < 2  # ignore merge commits
+        git.objects.Commit(repo, hex_to_bin(sha))
+        for sha in backend.get_backend(repo.working_dir).list_commits(
+            target_branch, str(repo.active_branch)
+        )
     ]
     if reverse:
         commits.reverse()
@@ -72,42 +89,116 @@ def retrieve_commits(
 
 @memorize_files_changed
 def files_changed_by_commit(working_dir: str, commit: str) -> List[str]:
-    output = (
-        subprocess.check_output(
-            ["git", "diff-tree", "--no-commit-id", "--name-only", "-r", commit],
-            cwd=working_dir,
-        )
-        .decode()
-        .splitlines()
+    return backend.get_backend(working_dir).changed_files([commit]).get(commit, [])
+
+
+def files_changed_by_commits(
+    working_dir: str, commits: List[str]
+) -> Dict[str, List[str]]:
+    """
+    asks the backend for all commits at once, e.g. through the long-lived
+    'git diff-tree --stdin' process, instead of one commit at a time like
+    files_changed_by_commit
+    """
+    if not commits:
+        return {}
+    return backend.get_backend(working_dir).changed_files(commits)
+
+
+def get_changed_files(repo: git.Repo, commits: List[str]) -> Dict[str, List[str]]:
+    """
+    returns the files changed by each commit from the persistent cache
+    and asks git only for the missing commits
+    """
+    store: Optional[cache.Cache] = cache.open_cache(repo.git_dir)
+    changed: Dict[str, List[str]] = store.get_many(commits) if store else {}
+    missing: Dict[str, List[str]] = files_changed_by_commits(
+        repo.working_dir, [commit for commit in commits if commit not in changed]
     )
-    return [output for output in output if output]
+    if store:
+        store.put_many(missing)
+    changed.update(missing)
+    return changed
 
 
-def get_commits_changed_files(commits: List[git.Commit]) -> Dict[str, Set[str]]:
+@profile_phase
+def get_commits_changed_files(
+    commits: List[git.Commit], batch: bool = True
+) -> Dict[str, Set[str]]:
     commit_changed: Dict[str, Set[str]] = collections.defaultdict(set)
+    if not commits:
+        return commit_changed
+    if batch:
+        shas: List[str] = list(dict.fromkeys(commit.hexsha for commit in commits))
+        changed: Dict[str, List[str]] = get_changed_files(commits[0].repo, shas)
+        for sha in shas:
+            for file in changed.get(sha, []):
+                commit_changed[sha].add(file)
+        return commit_changed
     for commit in commits:
         for file in files_changed_by_commit(commit.repo.working_dir, commit.hexsha):
             commit_changed[commit.hexsha].add(file)
     return commit_changed
 
 
+@profile_phase
+def get_commits_tree_ids(commits: List[git.Commit]) -> Dict[str, str]:
+    """
+    looks up the tree ids of all commits through the backend, e.g. the
+    long-lived 'git cat-file --batch-check' process
+    """
+    if not commits:
+        return {}
+    shas: List[str] = list(dict.fromkeys(commit.hexsha for commit in commits))
+    return backend.get_backend(commits[0].repo.working_dir).tree_ids(shas)
+
+
+def get_rebase_args(
+    target_branch: str, autosquash: bool = True, autostash: bool = False
+) -> List[str]:
+    args: List[str] = ["-i", target_branch]
+    if autosquash:
+        args.insert(0, "--autosquash")
+    if autostash:
+        args.insert(0, "--autostash")
+    return args
+
+
+def rebase(
+    repo: git.Repo,
+    target_branch: str,
+    sequence_editor: str,
+    autosquash: bool = True,
+    autostash: bool = False,
+):
+    """
+    runs 'git rebase -i' with the sequence editor,
+    raises RebaseError if it failed and was aborted
+    - the editor is only set for the rebase, not for the whole process
+    """
+    args: List[str] = get_rebase_args(target_branch, autosquash, autostash)
+    try:
+        repo.git.rebase(args, env={"GIT_SEQUENCE_EDITOR": sequence_editor})
+    except git.CommandError:
+        repo.git.rebase("--abort")
+        raise RebaseError("Rebase failed and aborted. You'll need to squash manually")
+
+
+@profile_phase
 def run_rebase(
     repo: git.Repo,
     target_branch: str,
     sequence_editor: str,
     dry: bool = False,
     autosquash: bool = True,
+    autostash: bool = False,
 ):
-    os.environ["GIT_SEQUENCE_EDITOR"] = sequence_editor
-    args: List[str] = ["-i", target_branch]
-    if autosquash:
-        args.insert(0, "--autosquash")
     if dry:
+        args: List[str] = get_rebase_args(target_branch, autosquash, autostash)
         logger.log("DRY", f"Would run: 'git rebase{' '.join(args)}'")
         sys.exit(0)
     try:
-        repo.git.rebase(args)
+        rebase(repo, target_branch, sequence_editor, autosquash, autostash)
         print("Rebase done")
-    except git.CommandError:
-        repo.git.rebase("--abort")
-        logger.error("Rebase failed and aborted. You'll need to squash manually")
+    except RebaseError as e:
+        logger.error(str(e))
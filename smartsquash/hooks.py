@@ -0,0 +1,122 @@
+import os
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+
+# git hooks, which record the files changed by new commits in the cache
+# while committing, so that 'sq' finds them there
+
+MARKER = "# installed by smartsquash"
+HOOKS = ["post-commit", "post-rewrite"]
+# the commits of a rebase, cherry-pick or revert are recorded by post-rewrite
+# at the end, or by the next run of 'sq'
+SKIP_WHILE_SEQUENCING = (
+    '[ -n "$GIT_REFLOG_ACTION" ] && exit 0\n'
+    "for state in rebase-merge rebase-apply; do\n"
+    '    [ -e "$(git rev-parse --git-path $state)" ] && exit 0\n'
+    "done\n"
+)
+
+
+def get_hook_script(hook: str, python: str = sys.executable) -> str:
+    """
+    the script of the hook. Recording runs in the background,
+    so that it doesn't delay the commit
+    - post-rewrite passes the rewritten commits on stdin, which a background
+      process wouldn't get otherwise
+    - post-commit resolves HEAD right away, as it may have moved by the time
+      the background process runs. It does nothing while a rebase or another
+      sequencer command commits
+    """
+    command: str = f"{shlex.quote(python)} -m smartsquash --record-hook {hook}"
+    if hook == "post-rewrite":
+        command = f"rewritten=$(cat)\nprintf '%s\\n' \"$rewritten\" | {command}"
+    else:
+        command = (
+            f"{SKIP_WHILE_SEQUENCING}commit=$(git rev-parse HEAD) || exit 0\n"
+            f'{command} --record-commit "$commit"'
+        )
+    return (
+        f"#!/bin/sh\n{MARKER}: records the files changed by commits\n"
+        f"{command} >/dev/null 2>&1 &\n"
+    )
+
+
+def get_hooks_dir(repo_path: str) -> Path:
+    """the hooks directory of the repo, which respects core.hooksPath"""
+    output: str = subprocess.check_output(
+        ["git", "rev-parse", "--git-path", "hooks"], cwd=repo_path
+    ).decode()
+    return Path(repo_path) / output.strip()
+
+
+def install_hooks(repo_path: str) -> Dict[str, bool]:
+    """
+    writes the hooks, whether each hook was installed.
+    Hooks, which weren't installed by smartsquash, are left untouched
+    """
+    hooks_dir: Path = get_hooks_dir(repo_path)
+    hooks_dir.mkdir(parents=True, exist_ok=True)
+    installed: Dict[str, bool] = {}
+    for hook in HOOKS:
+        path: Path = hooks_dir / hook
+        if path.exists() and MARKER not in path.read_text(errors="replace"):
+            installed[hook] = False
+            continue
+        path.write_text(get_hook_script(hook))
+        path.chmod(0o755)
+        installed[hook] = True
+    return installed
+
+
+def read_rewritten(stream: TextIO) -> List[str]:
+    """the new commits of the '<old-sha> <new-sha> [<extra>]' lines of post-rewrite"""
+    commits: List[str] = []
+    for line in stream:
+        fields: List[str] = line.split()
+        if len(fields) >= 2:
+            commits.append(fields[1])
+    return commits
+
+
+def record_commits(repo_path: str, revisions: List[str]):
+    """
+    stores the files changed by the commits and their path filters in the
+    cache, commits, which are cached already, are skipped
+    """
+    import git
+    from smartsquash import helpers
+    from smartsquash.path_filter import PathFilters
+
+    repo = git.Repo(repo_path)
+    commits: List[str] = list(
+        dict.fromkeys(repo.commit(revision).hexsha for revision in revisions)
+    )
+    helpers.get_changed_files(repo, commits)
+    PathFilters(repo).get_filters(commits)
+
+
+def record_hook(
+    repo_path: str, hook: str, stdin: TextIO = sys.stdin, commit: Optional[str] = None
+) -> int:
+    """
+    runs the recording of the hook. It never fails, as the commit is
+    done already and the cache is only an optimization
+    - commit is the commit post-commit was run for, hooks installed
+      by older versions don't pass it
+    """
+    from smartsquash import cache
+
+    try:
+        if os.environ.get(cache.DISABLE_ENV):
+            return 0
+        if hook == "post-rewrite":
+            commits: List[str] = read_rewritten(stdin)
+        else:
+            commits = [commit or "HEAD"]
+        record_commits(repo_path, commits)
+    except Exception:
+        pass
+    return 0
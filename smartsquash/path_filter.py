@@ -0,0 +1,111 @@
+import functools
+import hashlib
+import git
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from smartsquash import cache, helpers
+from smartsquash.commit_graph import CommitGraph, load_commit_graph
+from smartsquash.decorators import profile_phase
+
+BITS_PER_PATH = 10
+HASH_COUNT = 7
+
+
+@functools.lru_cache(maxsize=4096)
+def get_hashes(path: str) -> Tuple[int, int]:
+    """two independent 32 bit hashes of the path, stable across processes"""
+    digest: bytes = hashlib.blake2b(path.encode(), digest_size=8).digest()
+    return int.from_bytes(digest[:4], "little"), int.from_bytes(digest[4:], "little")
+
+
+class PathFilter:
+    """
+    Bloom filter of the files changed by a commit. A negative answer is exact,
+    a positive answer has to be confirmed with the files of the commit
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str]) -> "PathFilter":
+        paths = list(paths)
+        bits: int = max(len(paths) * BITS_PER_PATH, 8)
+        data = bytearray(-(-bits // 8))
+        for path in paths:
+            for bit in get_positions(path, len(data) * 8):
+                data[bit // 8] |= 1 << (bit % 8)
+        return cls(bytes(data))
+
+    def may_contain(self, path: str) -> bool:
+        return all(
+            self.data[bit // 8] & (1 << (bit % 8))
+            for bit in get_positions(path, len(self.data) * 8)
+        )
+
+    def may_contain_all(self, paths: Iterable[str]) -> bool:
+        return all(self.may_contain(path) for path in paths)
+
+
+def get_positions(path: str, bits: int) -> List[int]:
+    hash_0, hash_1 = get_hashes(path)
+    return [(hash_0 + index * hash_1) % bits for index in range(HASH_COUNT)]
+
+
+class PathFilters:
+    """
+    the path filters of the commits of a repository, which are kept in the
+    cache. Filters of new commits are built from their changed files and
+    added to the cache when they are first asked for
+    - changed_files keeps the files of the commits, whose filters were built,
+      so positive answers for them can be confirmed without asking git again
+    """
+
+    def __init__(self, repo: git.Repo):
+        self.repo = repo
+        self.store: Optional[cache.Cache] = cache.open_cache(Path(repo.git_dir))
+        self.changed_files: Dict[str, List[str]] = {}
+
+    @profile_phase
+    def get_filters(self, commits: List[str]) -> Dict[str, PathFilter]:
+        filters: Dict[str, PathFilter] = {}
+        if self.store:
+            for sha, data in self.store.get_filters(commits).items():
+                filters[sha] = PathFilter(data)
+        missing: List[str] = [commit for commit in commits if commit not in filters]
+        if missing:
+            changed: Dict[str, List[str]] = helpers.get_changed_files(
+                self.repo, missing
+            )
+            self.changed_files.update((sha, changed.get(sha, [])) for sha in missing)
+            built: Dict[str, PathFilter] = {
+                sha: PathFilter.from_paths(changed.get(sha, [])) for sha in missing
+            }
+            if self.store:
+                self.store.put_filters(
+                    {sha: path_filter.data for sha, path_filter in built.items()}
+                )
+            filters.update(built)
+        return filters
+
+    def filter_changing_all(
+        self, commits: List[str], files: Iterable[str]
+    ) -> List[str]:
+        """the commits, which may have changed all of the files"""
+        files = list(files)
+        filters: Dict[str, PathFilter] = self.get_filters(commits)
+        return [commit for commit in commits if filters[commit].may_contain_all(files)]
+
+
+ChangedPathFilters = Union[CommitGraph, PathFilters]
+
+
+def get_changed_path_filters(repo: git.Repo) -> ChangedPathFilters:
+    """
+    the Bloom filters of the commit-graph, if it has them,
+    otherwise the ones maintained by smartsquash
+    """
+    graph: Optional[CommitGraph] = load_commit_graph(Path(repo.git_dir))
+    if graph is not None and graph.has_bloom_filters:
+        return graph
+    return PathFilters(repo)
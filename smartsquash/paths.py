@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List, Set
+
+
+class PathTable:
+    """
+    interns paths as small integer ids, so that a set of files can be held
+    as an integer bitset, where bit 'id' is set for each file of the set.
+    Equality, subset and intersection tests of file sets then work on
+    machine words instead of hashing and comparing path strings:
+    - same files: bits_a == bits_b
+    - subset: bits_a & bits_b == bits_a
+    - any common file: bits_a & bits_b != 0
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.paths: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def intern(self, path: str) -> int:
+        path_id: int = self.ids.get(path, -1)
+        if path_id == -1:
+            path_id = len(self.paths)
+            self.ids[path] = path_id
+            self.paths.append(path)
+        return path_id
+
+    def bits(self, files: Iterable[str]) -> int:
+        bits: int = 0
+        for file in files:
+            bits |= 1 << self.intern(file)
+        return bits
+
+    def lookup_bits(self, files: Iterable[str]) -> int:
+        """like bits, but ignores files, which were never interned"""
+        bits: int = 0
+        for file in files:
+            path_id: int = self.ids.get(file, -1)
+            if path_id != -1:
+                bits |= 1 << path_id
+        return bits
+
+    def files(self, bits: int) -> Set[str]:
+        files: Set[str] = set()
+        while bits:
+            lowest: int = bits & -bits
+            files.add(self.paths[lowest.bit_length() - 1])
+            bits ^= lowest
+        return files
+
+
+def get_file_bits(
+    commit_changed_files: Dict[str, Iterable[str]], table: PathTable
+) -> Dict[str, int]:
+    """returns the bitset of the files changed by each commit"""
+    return {
+        commit_sha: table.bits(files)
+        for commit_sha, files in commit_changed_files.items()
+    }
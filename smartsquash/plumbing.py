@@ -0,0 +1,325 @@
+import atexit
+import concurrent.futures
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from smartsquash import profiling
+
+# 'git diff-tree --stdin' echoes lines it can't parse as commit and flushes,
+# which marks the end of the output for a chunk of commits
+SENTINEL: bytes = b"smartsquash-sync\n"
+# stay well below the pipe buffer size, so writing a chunk never blocks
+CHUNK_SIZE = 256
+READ_SIZE = 65536
+# number of processes of a kind, which work on one request in parallel
+CONCURRENCY_ENV = "SMARTSQUASH_CONCURRENCY"
+MAX_DEFAULT_CONCURRENCY = 8
+
+_plumbings: Dict[str, "Plumbing"] = {}
+_concurrency: Optional[int] = None
+
+
+class Plumbing:
+    """
+    keeps long-lived 'git cat-file --batch-check' and 'git diff-tree --stdin'
+    processes open for a repository and multiplexes requests over their pipes,
+    so read-only queries don't spawn a new git process each time.
+    Requests for more than one chunk of commits are split into shards,
+    which are handled by separate processes in parallel
+    """
+
+    def __init__(self, working_dir: str):
+        self.working_dir = working_dir
+        self.processes: Dict[str, subprocess.Popen] = {}
+        self.lock = threading.Lock()
+        self.locks: Dict[str, threading.Lock] = {}
+
+    def _lock(self, name: str) -> threading.Lock:
+        with self.lock:
+            return self.locks.setdefault(name, threading.Lock())
+
+    def _sharded(
+        self, func: Callable[[str, List[str]], Dict], name: str, commits: List[str]
+    ) -> Dict:
+        """
+        runs func for each shard of the commits with its own process name,
+        the results are merged in the order of the commits
+        """
+        shards: List[List[str]] = get_shards(commits, get_concurrency())
+        if len(shards) <= 1:
+            return func(name, commits)
+        names: List[str] = [
+            name if index == 0 else f"{name}-{index}" for index in range(len(shards))
+        ]
+        merged: Dict = {}
+        with concurrent.futures.ThreadPoolExecutor(len(shards)) as pool:
+            for result in pool.map(func, names, shards):
+                merged.update(result)
+        return merged
+
+    def _process(self, name: str, args: List[str]) -> subprocess.Popen:
+        process: Optional[subprocess.Popen] = self.processes.get(name)
+        if process is None or process.poll() is not None:
+            process = subprocess.Popen(
+                ["git", *args],
+                cwd=self.working_dir,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                bufsize=0,
+            )
+            self.processes[name] = process
+        return process
+
+    def tree_ids(self, commits: List[str]) -> Dict[str, str]:
+        return self._sharded(self._tree_ids, "cat-file", commits)
+
+    def _tree_ids(self, name: str, commits: List[str]) -> Dict[str, str]:
+        return self._object_ids(name, commits, "^{tree}")
+
+    def object_ids(self, revisions: List[str]) -> Dict[str, str]:
+        """resolves revisions, like branch names, leaving out unknown ones"""
+        return self._object_ids("cat-file", revisions, "")
+
+    def _object_ids(
+        self, name: str, revisions: List[str], suffix: str
+    ) -> Dict[str, str]:
+        object_ids: Dict[str, str] = {}
+        started: float = time.perf_counter()
+        with self._lock(name):
+            process = self._process(name, ["cat-file", "--batch-check=%(objectname)"])
+            for start in range(0, len(revisions), CHUNK_SIZE):
+                chunk: List[str] = revisions[start : start + CHUNK_SIZE]
+                process.stdin.write(
+                    "".join(f"{revision}{suffix}\n" for revision in chunk).encode()
+                )
+                for revision in chunk:
+                    line: str = _readline(process).decode().rstrip("\n")
+                    if not line.endswith(" missing"):
+                        object_ids[revision] = line
+        profiling.record_git_call(
+            "git cat-file --batch-check (plumbing)", time.perf_counter() - started
+        )
+        return object_ids
+
+    def read_commits(self, commits: List[str]) -> Dict[str, Tuple[str, List[str], str]]:
+        """
+        tree, parents and message of each commit, read through a long-lived
+        'git cat-file --batch' process. Unknown commits are left out
+        """
+        read: Dict[str, Tuple[str, List[str], str]] = {}
+        started: float = time.perf_counter()
+        with self._lock("cat-file-batch"):
+            process = self._process("cat-file-batch", ["cat-file", "--batch"])
+            for start in range(0, len(commits), CHUNK_SIZE):
+                chunk: List[str] = commits[start : start + CHUNK_SIZE]
+                process.stdin.write("".join(f"{commit}\n" for commit in chunk).encode())
+                for commit in chunk:
+                    header: List[str] = _readline(process).decode().split()
+                    if len(header) != 3:
+                        continue
+                    # the content is followed by a newline
+                    content: bytes = _read_exact(process, int(header[2]) + 1)[:-1]
+                    if header[1] == "commit":
+                        read[commit] = parse_commit(content)
+        profiling.record_git_call(
+            "git cat-file --batch (plumbing)", time.perf_counter() - started
+        )
+        return read
+
+    def changed_files(self, commits: List[str]) -> Dict[str, List[str]]:
+        """
+        returns the files changed by each commit, in the same format as
+        'git diff-tree --no-commit-id --name-only -r <commit>'
+        - '--always' makes git print the commit id even if the diff is empty,
+          so every commit starts a new section in the output
+        """
+        return self._sharded(self._changed_files, "diff-tree", commits)
+
+    def _changed_files(self, name: str, commits: List[str]) -> Dict[str, List[str]]:
+        changed: Dict[str, List[str]] = {}
+        started: float = time.perf_counter()
+        with self._lock(name):
+            process = self._process(
+                name, ["diff-tree", "--stdin", "--always", "--name-only", "-r", "-z"]
+            )
+            for start in range(0, len(commits), CHUNK_SIZE):
+                chunk: List[str] = commits[start : start + CHUNK_SIZE]
+                process.stdin.write(
+                    "".join(f"{commit}\n" for commit in chunk).encode() + SENTINEL
+                )
+                changed.update(
+                    parse_changed_entries(_read_entries_until(process, SENTINEL), chunk)
+                )
+        profiling.record_git_call(
+            "git diff-tree --stdin (plumbing)", time.perf_counter() - started
+        )
+        return changed
+
+    def run(self, *args: str) -> str:
+        """runs a one-off git command, which has no batch interface"""
+        return subprocess.check_output(["git", *args], cwd=self.working_dir).decode()
+
+    def stream(self, *args: str, delimiter: bytes = b"\0") -> Iterator[str]:
+        """
+        like run, but yields the delimited entries of the output while it is
+        read from the pipe, instead of holding the whole output in memory.
+        Raises CalledProcessError at the end, if git failed
+        """
+        started: float = time.perf_counter()
+        process = subprocess.Popen(
+            ["git", *args], cwd=self.working_dir, stdout=subprocess.PIPE, bufsize=0
+        )
+        try:
+            for entry in read_entries(process.stdout.fileno(), delimiter):
+                yield entry.decode()
+        finally:
+            process.stdout.close()
+            returncode: int = process.wait()
+            profiling.record_git_call(
+                profiling.git_command(process.args), time.perf_counter() - started
+            )
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, process.args)
+
+    def close(self):
+        with self.lock:
+            for process in self.processes.values():
+                if process.poll() is None:
+                    process.stdin.close()
+                    process.wait()
+                process.stdout.close()
+            self.processes.clear()
+
+
+def _readline(process: subprocess.Popen) -> bytes:
+    line: bytes = process.stdout.readline()
+    if not line:
+        raise subprocess.SubprocessError(f"git exited unexpectedly: {process.args}")
+    return line
+
+
+def _read_exact(process: subprocess.Popen, size: int) -> bytes:
+    parts: List[bytes] = []
+    while size:
+        data: bytes = os.read(process.stdout.fileno(), min(size, READ_SIZE))
+        if not data:
+            raise subprocess.SubprocessError(f"git exited unexpectedly: {process.args}")
+        parts.append(data)
+        size -= len(data)
+    return b"".join(parts)
+
+
+def parse_commit(content: bytes) -> Tuple[str, List[str], str]:
+    """tree, parents and message of a raw commit object"""
+    headers, _, message = content.partition(b"\n\n")
+    tree: str = ""
+    parents: List[str] = []
+    for line in headers.split(b"\n"):
+        if line.startswith(b"tree "):
+            tree = line[5:].decode()
+        elif line.startswith(b"parent "):
+            parents.append(line[7:].decode())
+    return tree, parents, message.decode(errors="replace")
+
+
+def read_entries(fd: int, delimiter: bytes = b"\0") -> Iterator[bytes]:
+    """
+    yields the delimited entries read from the file descriptor until EOF,
+    holding only the entries of the last read and an incomplete entry
+    """
+    pending: bytes = b""
+    while True:
+        data: bytes = os.read(fd, READ_SIZE)
+        if not data:
+            break
+        *entries, pending = (pending + data).split(delimiter)
+        yield from entries
+    if pending:
+        yield pending
+
+
+def _read_entries_until(process: subprocess.Popen, marker: bytes) -> Iterator[str]:
+    """
+    yields the NUL-delimited entries of a long-lived process,
+    until the output ends with the marker
+    """
+    pending: bytes = b""
+    while pending != marker:
+        data: bytes = os.read(process.stdout.fileno(), READ_SIZE)
+        if not data:
+            raise subprocess.SubprocessError(f"git exited unexpectedly: {process.args}")
+        *entries, pending = (pending + data).split(b"\0")
+        for entry in entries:
+            yield entry.decode()
+
+
+def parse_changed_entries(
+    entries: Iterable[str], commits: List[str]
+) -> Dict[str, List[str]]:
+    """
+    parses the entries of 'git diff-tree --stdin --always -z',
+    where each section starts with the commit id of the given commits
+    """
+    changed: Dict[str, List[str]] = {}
+    pending = iter(commits)
+    next_commit: Optional[str] = next(pending, None)
+    current: Optional[str] = None
+    for entry in entries:
+        if entry == next_commit:
+            current = entry
+            changed[current] = []
+            next_commit = next(pending, None)
+        elif entry and current:
+            changed[current].append(entry)
+    return changed
+
+
+def get_concurrency() -> int:
+    """
+    set_concurrency, or SMARTSQUASH_CONCURRENCY,
+    or the number of CPUs up to MAX_DEFAULT_CONCURRENCY
+    """
+    if _concurrency:
+        return _concurrency
+    if os.environ.get(CONCURRENCY_ENV, "").isdigit():
+        return max(int(os.environ[CONCURRENCY_ENV]), 1)
+    return min(os.cpu_count() or 1, MAX_DEFAULT_CONCURRENCY)
+
+
+def set_concurrency(concurrency: Optional[int]):
+    global _concurrency
+    _concurrency = max(concurrency, 1) if concurrency else None
+
+
+def get_shards(commits: List[str], concurrency: int) -> List[List[str]]:
+    """
+    splits the commits into at most 'concurrency' shards of similar size,
+    with at least a chunk of commits each, to make up for the extra process
+    """
+    count: int = min(concurrency, -(-len(commits) // CHUNK_SIZE))
+    if count <= 1:
+        return [commits]
+    size: int = -(-len(commits) // count)
+    return [commits[start : start + size] for start in range(0, len(commits), size)]
+
+
+def get_plumbing(working_dir: str) -> Plumbing:
+    if working_dir not in _plumbings:
+        _plumbings[working_dir] = Plumbing(working_dir)
+    return _plumbings[working_dir]
+
+
+def close(working_dir: str):
+    """closes the processes of the repository, they are restarted on demand"""
+    plumbing: Optional[Plumbing] = _plumbings.pop(working_dir, None)
+    if plumbing is not None:
+        plumbing.close()
+
+
+@atexit.register
+def close_all():
+    for plumbing in _plumbings.values():
+        plumbing.close()
+    _plumbings.clear()
@@ -0,0 +1,58 @@
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+from smartsquash.gitdir import find_git_dir, get_common_dir
+
+# imported by every 'sq' run, so it only uses the standard library
+
+
+def branch_exists(git_dir: Path, branch: str) -> bool:
+    common_dir: Path = get_common_dir(git_dir)
+    if (common_dir / "refs" / "heads" / branch).is_file():
+        return True
+    try:
+        packed_refs: str = (common_dir / "packed-refs").read_text()
+    except OSError:
+        return False
+    return f" refs/heads/{branch}\n" in packed_refs
+
+
+def has_nothing_to_fixup(repo_path: str, target_branch: str) -> bool:
+    """
+    True, if sq.fixup would return early, because the worktree isn't dirty,
+    checked with a single 'git status' call instead of importing GitPython.
+    - only True, if helpers.get_repo would accept the repository, so that
+      errors are still reported by the regular path
+    """
+    git_dir: Optional[Path] = find_git_dir(repo_path)
+    if git_dir is None or not branch_exists(git_dir, target_branch):
+        return False
+    try:
+        output: bytes = subprocess.run(
+            [
+                "git",
+                "--no-optional-locks",
+                "status",
+                "--porcelain=v2",
+                "--branch",
+                "--untracked-files=no",
+            ],
+            cwd=repo_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    lines: List[str] = output.decode(errors="replace").splitlines()
+    head: Optional[str] = next(
+        (
+            line[len("# branch.head ") :]
+            for line in lines
+            if line.startswith("# branch.head ")
+        ),
+        None,
+    )
+    if head in (None, "(detached)", target_branch):
+        return False
+    return all(line.startswith("#") for line in lines)
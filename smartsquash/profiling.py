@@ -0,0 +1,155 @@
+import functools
+import json
+import subprocess
+import time
+import git.cmd
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+_profile: Optional["Profile"] = None
+_originals: Dict[str, Any] = {}
+
+
+class Stats:
+    def __init__(self):
+        self.calls: int = 0
+        self.seconds: float = 0.0
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.seconds += seconds
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        return {"calls": self.calls, "seconds": round(self.seconds, 6)}
+
+
+class Profile:
+    """wall time per phase and count and time of git calls"""
+
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.phases: Dict[str, Stats] = {}
+        self.git_calls: Dict[str, Stats] = {}
+        self.spawns: Dict[str, int] = {}
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases.setdefault(name, Stats()).add(seconds)
+
+    def add_git_call(self, command: str, seconds: float):
+        self.git_calls.setdefault(command, Stats()).add(seconds)
+
+    def add_spawn(self, command: str):
+        self.spawns[command] = self.spawns.get(command, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+            "git_calls": {
+                command: stats.to_dict() for command, stats in self.git_calls.items()
+            },
+            "spawns": dict(self.spawns),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_table(self) -> str:
+        data: Dict[str, Any] = self.to_dict()
+        lines: List[str] = []
+        for title, rows in (("phase", data["phases"]), ("git", data["git_calls"])):
+            lines.append(f"{title:<40} {'calls':>8} {'seconds':>10}")
+            for name, stats in sorted(
+                rows.items(), key=lambda row: row[1]["seconds"], reverse=True
+            ):
+                lines.append(
+                    f"{name:<40} {stats['calls']:>8} {stats['seconds']:>10.4f}"
+                )
+            lines.append("")
+        lines.append(f"{'process':<40} {'spawns':>8}")
+        for command, count in sorted(self.spawns.items()):
+            lines.append(f"{command:<40} {count:>8}")
+        lines.append("")
+        lines.append(f"total: {data['total_seconds']:.4f}s")
+        return "\n".join(lines)
+
+
+def git_command(args: Union[str, Sequence[str]]) -> str:
+    """'git diff-tree' for ['git', 'diff-tree', '--stdin', ...]"""
+    if isinstance(args, (str, bytes)):
+        args = str(args).split()
+    args = [str(arg) for arg in args]
+    if len(args) > 1 and args[0].endswith("git"):
+        return f"git {args[1]}"
+    return args[0] if args else ""
+
+
+def get_profile() -> Optional[Profile]:
+    return _profile
+
+
+def record_git_call(command: str, seconds: float):
+    if _profile is not None:
+        _profile.add_git_call(command, seconds)
+
+
+def _timed(func: Callable, command: Callable[..., str]) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start: float = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_git_call(command(*args, **kwargs), time.perf_counter() - start)
+
+    return wrapper
+
+
+def _popen_init(self, args, *rest, **kwargs):
+    if _profile is not None:
+        _profile.add_spawn(git_command(args))
+    return _originals["Popen.__init__"](self, args, *rest, **kwargs)
+
+
+def enable() -> Profile:
+    """
+    starts recording. Git calls are only intercepted while enabled,
+    so there is no overhead when profiling is off
+    """
+    global _profile
+    _profile = Profile()
+    if not _originals:
+        _originals["Popen.__init__"] = subprocess.Popen.__init__
+        _originals["run"] = subprocess.run
+        _originals["Git.execute"] = git.cmd.Git.execute
+        _originals["Git.get_object_header"] = git.cmd.Git.get_object_header
+        _originals["Git.stream_object_data"] = git.cmd.Git.stream_object_data
+        subprocess.Popen.__init__ = _popen_init
+        subprocess.run = _timed(
+            subprocess.run, lambda args, *rest, **kwargs: git_command(args)
+        )
+        git.cmd.Git.execute = _timed(
+            git.cmd.Git.execute,
+            lambda self, command, *rest, **kwargs: git_command(command),
+        )
+        git.cmd.Git.get_object_header = _timed(
+            git.cmd.Git.get_object_header,
+            lambda *args, **kwargs: "git cat-file --batch-check (GitPython)",
+        )
+        git.cmd.Git.stream_object_data = _timed(
+            git.cmd.Git.stream_object_data,
+            lambda *args, **kwargs: "git cat-file --batch (GitPython)",
+        )
+    return _profile
+
+
+def disable() -> Optional[Profile]:
+    global _profile
+    profile: Optional[Profile] = _profile
+    _profile = None
+    if _originals:
+        subprocess.Popen.__init__ = _originals.pop("Popen.__init__")
+        subprocess.run = _originals.pop("run")
+        git.cmd.Git.execute = _originals.pop("Git.execute")
+        git.cmd.Git.get_object_header = _originals.pop("Git.get_object_header")
+        git.cmd.Git.stream_object_data = _originals.pop("Git.stream_object_data")
+    return profile
@@ -0,0 +1,129 @@
+import git
+from typing import Dict, FrozenSet, Iterable, List
+from smartsquash import backend, helpers
+from smartsquash.decorators import profile_phase
+
+
+class CommitRecord:
+    """
+    compact stand-in for git.Commit during the analysis, which never
+    triggers a lookup in the object database when its attributes are read
+    - parent is the first parent, empty for root commits
+    """
+
+    __slots__ = (
+        "hexsha",
+        "tree_sha",
+        "parent_count",
+        "subject",
+        "file_set_id",
+        "parent",
+    )
+
+    def __init__(
+        self,
+        hexsha: str,
+        tree_sha: str,
+        parent_count: int,
+        subject: str,
+        file_set_id: int = -1,
+        parent: str = "",
+    ):
+        self.hexsha = hexsha
+        self.tree_sha = tree_sha
+        self.parent_count = parent_count
+        self.subject = subject
+        self.file_set_id = file_set_id
+        self.parent = parent
+
+    def __repr__(self) -> str:
+        return f"<CommitRecord {self.hexsha[:7]} {self.subject!r}>"
+
+
+class FileSetTable:
+    """
+    interns the sets of files changed by commits, so that commits changing
+    the same files share one set, referenced by an integer id
+    """
+
+    def __init__(self):
+        self.ids: Dict[FrozenSet[str], int] = {}
+        self.file_sets: List[FrozenSet[str]] = []
+
+    def intern(self, files: Iterable[str]) -> int:
+        file_set: FrozenSet[str] = frozenset(files)
+        file_set_id: int = self.ids.get(file_set, -1)
+        if file_set_id == -1:
+            file_set_id = len(self.file_sets)
+            self.ids[file_set] = file_set_id
+            self.file_sets.append(file_set)
+        return file_set_id
+
+    def files(self, record: CommitRecord) -> FrozenSet[str]:
+        return self.file_sets[record.file_set_id]
+
+    def changed_files(
+        self, records: Iterable[CommitRecord]
+    ) -> Dict[str, FrozenSet[str]]:
+        """
+        same format as helpers.get_commits_changed_files: ordered like the
+        records, without commits that don't change any file
+        """
+        return {
+            record.hexsha: self.files(record)
+            for record in records
+            if self.files(record)
+        }
+
+
+def parse_log(output: str) -> List[CommitRecord]:
+    """parse_log_entries for the whole output"""
+    return parse_log_entries(output.split("\0"))
+
+
+def parse_log_entries(entries: Iterable[str]) -> List[CommitRecord]:
+    """
+    parses the entries of 'git log -z --format=%H %T %P%x00%B',
+    where each commit consists of a header and a message entry
+    """
+    return get_records(backend.parse_log_entries(entries))
+
+
+def get_records(entries: Iterable[backend.CommitEntry]) -> List[CommitRecord]:
+    records: List[CommitRecord] = []
+    for hexsha, tree_sha, parents, message in entries:
+        subject: str = message.split("\n", 1)[0] if message else ""
+        records.append(
+            CommitRecord(
+                hexsha,
+                tree_sha,
+                len(parents),
+                subject,
+                parent=parents[0] if parents else "",
+            )
+        )
+    return records
+
+
+@profile_phase
+def retrieve_commit_records(
+    repo: git.Repo, target_branch: str, file_sets: FileSetTable, reverse: bool = True
+) -> List[CommitRecord]:
+    """
+    like helpers.retrieve_commits, but reads sha, tree, parents and subject
+    of all commits from a single pass of the backend, e.g. a 'git log' stream,
+    and interns the files changed by each commit in file_sets
+    """
+    records: List[CommitRecord] = get_records(
+        backend.get_backend(repo.working_dir).iter_commits(
+            target_branch, str(repo.active_branch)
+        )
+    )
+    changed: Dict[str, List[str]] = helpers.get_changed_files(
+        repo, [record.hexsha for record in records]
+    )
+    for record in records:
+        record.file_set_id = file_sets.intern(changed.get(record.hexsha, ()))
+    if reverse:
+        records.reverse()
+    return records
@@ -0,0 +1,245 @@
+import os
+import subprocess
+import tempfile
+import git
+from git.objects.util import altz_to_utctz_str
+from gitdb.util import hex_to_bin
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from smartsquash import backend
+from smartsquash.decorators import profile_phase
+from loguru import logger
+
+
+class RewriteError(Exception):
+    """the history can't be rewritten in memory, e.g. because of a conflict"""
+
+
+class PendingCommit:
+    """a commit of the new history, which hasn't been written yet"""
+
+    def __init__(self, source: git.Commit, parent: str, tree: str, reused: bool):
+        self.source = source
+        self.parent = parent
+        self.tree = tree
+        self.reused = reused
+
+
+def _git(
+    repo: git.Repo,
+    *args: str,
+    input: Optional[bytes] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", *args],
+        cwd=repo.working_dir,
+        input=input,
+        env={**os.environ, **env} if env else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+
+def _git_output(repo: git.Repo, *args: str, **kwargs) -> str:
+    result: subprocess.CompletedProcess = _git(repo, *args, **kwargs)
+    if result.returncode:
+        raise RewriteError(
+            f"'git {' '.join(args)}' failed: {result.stderr.decode().strip()}"
+        )
+    return result.stdout.decode().strip()
+
+
+def apply_commit(repo: git.Repo, commit: git.Commit, tree: str) -> str:
+    """
+    applies the changes of 'commit' on top of 'tree' with a three-way merge
+    and returns the resulting tree, without touching index or worktree
+    """
+    if len(commit.parents) != 1:
+        raise RewriteError(f"Can't apply {commit.hexsha[:7]}: not a regular commit")
+    base: git.Commit = commit.parents[0]
+    if base.tree.hexsha == tree:
+        return commit.tree.hexsha
+    if base.tree.hexsha == commit.tree.hexsha:
+        return tree
+    # 'git merge-tree' computes the merge base itself, so a temporary commit
+    # with 'tree' on top of the parent of 'commit' makes the parent the base
+    ours: str = _git_output(
+        repo, "commit-tree", tree, "-p", base.hexsha, input=b"smartsquash"
+    )
+    result: subprocess.CompletedProcess = _git(
+        repo, "merge-tree", "--write-tree", ours, commit.hexsha
+    )
+    if result.returncode == 1:
+        raise RewriteError(f"Applying {commit.hexsha[:7]} conflicts")
+    if result.returncode:
+        raise RewriteError(
+            f"'git merge-tree --write-tree' failed: {result.stderr.decode().strip()}"
+        )
+    return result.stdout.decode().splitlines()[0]
+
+
+def create_commit(
+    repo: git.Repo,
+    tree: str,
+    parents: List[str],
+    message: str,
+    author: Optional[backend.Signature] = None,
+) -> str:
+    try:
+        return backend.get_backend(repo.working_dir).create_commit(
+            tree, parents, message, author
+        )
+    except backend.BackendError as e:
+        raise RewriteError(str(e))
+
+
+def update_ref(repo: git.Repo, ref: str, new: str, old: str, message: str):
+    try:
+        backend.get_backend(repo.working_dir).update_ref(ref, new, old, message)
+    except backend.BackendError as e:
+        raise RewriteError(str(e))
+
+
+def write_commit(repo: git.Repo, pending: PendingCommit) -> str:
+    if pending.reused:
+        return pending.source.hexsha
+    source: git.Commit = pending.source
+    author: backend.Signature = (
+        source.author.name,
+        source.author.email,
+        f"{source.authored_date} {altz_to_utctz_str(source.author_tz_offset)}",
+    )
+    return create_commit(repo, pending.tree, [pending.parent], source.message, author)
+
+
+def _resolve(repo: git.Repo, commit) -> git.Commit:
+    """returns the git.Commit for a commit record of the analysis"""
+    if isinstance(commit, git.Commit):
+        return commit
+    return git.objects.Commit(repo, hex_to_bin(commit.hexsha))
+
+
+def build_history(repo: git.Repo, onto: str, plan: List[Tuple[str, git.Commit]]) -> str:
+    """
+    writes the commits of the rebase plan on top of 'onto' and returns the
+    new tip. Picked commits, whose parent doesn't change, are kept as they are
+    """
+    parent: str = onto
+    parent_tree: str = repo.commit(onto).tree.hexsha
+    pending: Optional[PendingCommit] = None
+    for action, commit in plan:
+        commit = _resolve(repo, commit)
+        if action == "pick":
+            if pending:
+                parent, parent_tree = write_commit(repo, pending), pending.tree
+            if commit.parents and commit.parents[0].hexsha == parent:
+                pending = PendingCommit(commit, parent, commit.tree.hexsha, True)
+            else:
+                tree: str = apply_commit(repo, commit, parent_tree)
+                pending = PendingCommit(commit, parent, tree, False)
+        elif action == "fixup" and pending:
+            pending.tree = apply_commit(repo, commit, pending.tree)
+            pending.reused = False
+        else:
+            raise RewriteError(f"Unsupported rebase action: {action}")
+    if pending:
+        parent = write_commit(repo, pending)
+    return parent
+
+
+@profile_phase
+def rewrite_branch(
+    repo: git.Repo, target_branch: str, plan: List[Tuple[str, git.Commit]]
+) -> str:
+    """
+    rebases the active branch onto 'target_branch' following the plan,
+    without checking out any intermediate commit. Only the files that differ
+    between the old and the new tip are updated in the worktree at the end
+    """
+    branch: str = repo.active_branch.path
+    old_tip: str = repo.head.commit.hexsha
+    onto: str = repo.commit(target_branch).hexsha
+    new_tip: str = build_history(repo, onto, plan)
+    if new_tip == old_tip:
+        return new_tip
+    _git_output(repo, "read-tree", "-m", "-u", old_tip, new_tip)
+    try:
+        update_ref(repo, branch, new_tip, old_tip, "smartsquash: rewrite")
+    except RewriteError:
+        _git_output(repo, "read-tree", "-m", "-u", new_tip, old_tip)
+        raise
+    logger.info("Rewrite done")
+    return new_tip
+
+
+def get_fixup_plan(
+    commits: List[git.Commit], fixups: Dict[str, List[git.Commit]]
+) -> List[Tuple[str, git.Commit]]:
+    """
+    returns the plan 'git rebase -i --autosquash' would follow for the
+    fixup commits at the tip of the branch, given by the sha of their target
+    """
+    fixup_shas: Set[str] = {
+        commit.hexsha for fixup_commits in fixups.values() for commit in fixup_commits
+    }
+    plan: List[Tuple[str, git.Commit]] = []
+    for commit in commits:
+        if commit.hexsha in fixup_shas:
+            continue
+        if commit.summary.startswith(("fixup! ", "squash! ", "amend! ")):
+            raise RewriteError("Other commits are marked for autosquash")
+        plan.append(("pick", commit))
+        for fixup_commit in fixups.get(commit.hexsha, []):
+            plan.append(("fixup", fixup_commit))
+    for target_sha in fixups:
+        if target_sha not in {commit.hexsha for _, commit in plan}:
+            raise RewriteError(f"{target_sha[:7]} is not part of the branch")
+    return plan
+
+
+@profile_phase
+def write_fixup_commit(repo: git.Repo, target_sha: str, files: Set[str]) -> str:
+    """
+    commits the staged changes of 'files' as 'fixup!' commit for 'target_sha'
+    on top of HEAD, leaving the changes of all other files staged as they are
+    """
+    old_head: str = repo.head.commit.hexsha
+    literal: Dict[str, str] = {"GIT_LITERAL_PATHSPECS": "1"}
+    staged: str = _git_output(repo, "ls-files", "-s", "-z", "--", *files, env=literal)
+    entries: Dict[str, str] = {}
+    for entry in staged.split("\0"):
+        if entry:
+            entries[entry.split("\t", 1)[1]] = entry
+    # mode 0 removes the file from the index
+    removed: str = f"0 {'0' * len(old_head)} 0\t"
+    index_info: str = "".join(
+        entries.get(file, removed + file) + "\0" for file in sorted(files)
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        env: Dict[str, str] = {"GIT_INDEX_FILE": str(Path(tmp) / "index")}
+        _git_output(repo, "read-tree", old_head, env=env)
+        _git_output(
+            repo,
+            "update-index",
+            "-z",
+            "--index-info",
+            input=index_info.encode(),
+            env=env,
+        )
+        tree: str = _git_output(repo, "write-tree", env=env)
+    message: str = f"fixup! {repo.commit(target_sha).summary}"
+    fixup_commit: str = create_commit(repo, tree, [old_head], message)
+    update_ref(repo, "HEAD", fixup_commit, old_head, "smartsquash: fixup")
+    return fixup_commit
+
+
+def try_rewrite_branch(
+    repo: git.Repo, target_branch: str, plan: List[Tuple[str, git.Commit]]
+) -> bool:
+    try:
+        rewrite_branch(repo, target_branch, plan)
+        return True
+    except RewriteError as e:
+        logger.warning(f"{e}. Falling back to interactive rebase")
+        return False
@@ -1,47 +1,66 @@
 import git
 import sys
-from typing import List, Dict, Set, Optional
-from smartsquash.helpers import (
-    retrieve_commits,
-    get_commits_changed_files,
-    run_rebase,
-)
-from smartsquash.fixup import (
-    run_fixup,
-    get_closest_change_commit,
-    get_files_changed_in_staging,
-)
-from smartsquash.squash import get_rebase_data
+from smartsquash import api
+from smartsquash.helpers import run_rebase
 from loguru import logger
 
+# the CLI on top of the api, which reports the results and exits on dry runs
 
-def squash(target_branch: str, repo: git.Repo, dry: bool = False):
-    all_commits: List[git.Commit] = retrieve_commits(repo, target_branch)
-    has_rebase, rebase_data = get_rebase_data(all_commits)
-    rebase_data: str = rebase_data.replace("'", "", -1)
-    if has_rebase:
+
+def squash(
+    target_branch: str, repo: git.Repo, dry: bool = False, in_memory: bool = False
+):
+    try:
+        result: api.SquashResult = api.squash(repo, target_branch, dry, in_memory)
+    except api.BackendError as e:
+        sys.exit(str(e))
+    except api.RebaseError as e:
+        logger.error(str(e))
+        return
+    if dry and result.has_rebase:
         run_rebase(
-            repo, target_branch, f"echo '{rebase_data}' >", dry, autosquash=False
+            repo,
+            target_branch,
+            api.get_sequence_editor(result.todo),
+            dry,
+            autosquash=False,
         )
+    if result.executed == api.EXECUTED_REBASE:
+        print("Rebase done")
 
 
 def fixup(
-    target_branch: str, repo: git.Repo, add: bool = False, dry: bool = False
+    target_branch: str,
+    repo: git.Repo,
+    add: bool = False,
+    dry: bool = False,
+    in_memory: bool = False,
+    multi: bool = False,
 ) -> bool:
-    if not repo.is_dirty():
+    try:
+        result: api.FixupResult = api.fixup(
+            repo, target_branch, add, dry, in_memory, multi
+        )
+    except (api.BackendError, api.FixupError) as e:
+        sys.exit(str(e))
+    except api.RebaseError as e:
+        logger.error(str(e))
+        return True
+    if not result.dirty:
         logger.info("Repository is not dirty. No files to fixup.")
         return False
-    commits: List[git.Commit] = retrieve_commits(repo, target_branch, reverse=False)
-    logger.info("Fetching files changed by commits...")
-    commit_changed_files: Dict[str, Set[str]] = get_commits_changed_files(commits)
-    files_changed: Set[str] = get_files_changed_in_staging(repo)
-    closes_change_commit: Optional[str] = get_closest_change_commit(
-        files_changed, commit_changed_files
-    )
-    if closes_change_commit:
-        if dry:
-            sys.exit(0)
-        run_fixup(repo, target_branch, closes_change_commit, add, dry)
-        return True
-    logger.error("No commits found to fixup. You'll need to fixup manually")
-    return False
+    if not result.targets:
+        logger.error("No commits found to fixup. You'll need to fixup manually")
+        return False
+    if multi and result.unmatched:
+        logger.warning(f"No commits found to fixup {sorted(result.unmatched)}")
+    if dry:
+        if multi:
+            for commit_sha, files in result.targets.items():
+                logger.log("DRY", f"Would fixup {commit_sha[:7]} with {sorted(files)}")
+        sys.exit(0)
+    if result.executed == api.EXECUTED_REBASE:
+        print("Rebase done")
+    elif result.executed == api.EXECUTED_AMEND:
+        print("Amend done")
+    return True
@@ -1,10 +1,13 @@
 import git
 import git.exc
+import bisect
 import itertools
-import subprocess
 import collections
-from typing import List, Tuple, Dict, Set
-from smartsquash import helpers
+from typing import List, Tuple, Dict, Set, Optional
+from smartsquash import backend, helpers
+from smartsquash.decorators import profile_phase
+from smartsquash.paths import PathTable, get_file_bits
+from smartsquash.records import CommitRecord
 from loguru import logger
 
 
@@ -31,28 +34,99 @@ def has_relevant_files_changed_in_between(
     commit_b: git.Commit,
     commits: List[git.Commit],
     commit_changed_files: Dict[str, Set[str]],
+    file_bits: Optional[Dict[str, int]] = None,
 ) -> bool:
     """
     we should look for other files that changed in between commits AND
     in addition also change 'our files'(the files from 'commit_a,commit_b')
 
     We don't care about other files that may have changed in between
+    - file_bits can hold the files changed by the commits as bitsets
     """
     commits_in_between = get_commits_in_between(commit_a, commit_b, commits)
-    files = commit_changed_files[commit_a.hexsha]
+    if file_bits is None:
+        file_bits = get_file_bits(
+            {
+                commit.hexsha: commit_changed_files.get(commit.hexsha, ())
+                for commit in [commit_a, *commits_in_between]
+            },
+            PathTable(),
+        )
+    files: int = file_bits.get(commit_a.hexsha, 0)
     for commit in commits_in_between:
-        for file in commit_changed_files[commit.hexsha]:
-            if file in files and commit_changed_files[commit.hexsha] != files:
-                return True
+        other: int = file_bits.get(commit.hexsha, 0)
+        if other & files and other != files:
+            return True
     return False
 
 
-def commit_diff_empty(commit_a: git.Commit, commit_b: git.Commit) -> bool:
-    output = subprocess.check_output(
-        ["git", "diff", f"{commit_a.hexsha}...{commit_b.hexsha}"],
-        cwd=commit_a.repo.working_dir,
-    ).decode()
-    return not output
+def get_tree_sha(commit: git.Commit, tree_ids: Optional[Dict[str, str]] = None) -> str:
+    if tree_ids and commit.hexsha in tree_ids:
+        return tree_ids[commit.hexsha]
+    if isinstance(commit, CommitRecord):
+        return commit.tree_sha
+    return commit.tree.hexsha
+
+
+def get_first_parent(commit: git.Commit) -> str:
+    if isinstance(commit, CommitRecord):
+        return commit.parent
+    return commit.parents[0].hexsha if commit.parents else ""
+
+
+def get_chain_ids(commits: List[git.Commit]) -> List[int]:
+    """
+    numbers the chains of first parents of the commits, which are ordered
+    from oldest to newest. Each commit is an ancestor of the later commits
+    of its chain. A range with merges, e.g. of a merged side branch,
+    consists of several chains
+    """
+    chain_ids: List[int] = []
+    for position, commit in enumerate(commits):
+        if position and get_first_parent(commit) == commits[position - 1].hexsha:
+            chain_ids.append(chain_ids[-1])
+        else:
+            chain_ids.append(position)
+    return chain_ids
+
+
+@profile_phase
+def commit_diff_empty(
+    commit_a: git.Commit,
+    commit_b: git.Commit,
+    tree_ids: Optional[Dict[str, str]] = None,
+    chained: bool = False,
+    repo_path: Optional[str] = None,
+    merge_bases: Optional[Dict[backend.CommitPair, str]] = None,
+) -> bool:
+    """
+    equivalent to checking the output of 'git diff commit_a...commit_b',
+    which compares commit_b with the merge-base of both commits, for emptiness
+    - chained tells, that commit_a is an ancestor of commit_b. It is the
+      merge-base then, so the diff is empty if and only if both commits
+      point to the same tree, without asking git
+    - tree_ids and merge_bases can hold the tree ids and the merge-bases
+      looked up in bulk beforehand
+    - repo_path is required for commit records, which don't know their repo
+    """
+    if chained:
+        return get_tree_sha(commit_a, tree_ids) == get_tree_sha(commit_b, tree_ids)
+    git_backend: backend.Backend = backend.get_backend(
+        repo_path or commit_a.repo.working_dir
+    )
+    pair: backend.CommitPair = (commit_a.hexsha, commit_b.hexsha)
+    if merge_bases is None:
+        merge_bases = git_backend.merge_bases([pair])
+    merge_base: Optional[str] = merge_bases.get(pair)
+    if merge_base is None:
+        return False
+    if merge_base == commit_a.hexsha:
+        merge_base_tree: Optional[str] = get_tree_sha(commit_a, tree_ids)
+    elif tree_ids and merge_base in tree_ids:
+        merge_base_tree = tree_ids[merge_base]
+    else:
+        merge_base_tree = git_backend.tree_ids([merge_base]).get(merge_base)
+    return merge_base_tree == get_tree_sha(commit_b, tree_ids)
 
 
 def has_same_files(files_a: List[str], files_b: List[str]) -> bool:
@@ -62,6 +136,8 @@ def has_same_files(files_a: List[str], files_b: List[str]) -> bool:
 
 
 def get_commit_message(commit: git.Commit) -> str:
+    if isinstance(commit, CommitRecord):
+        return commit.subject
     if commit.message:
         return commit.message.split("\n")[0]
     return ""
@@ -72,15 +148,19 @@ def fulfils_conditions(
     commit_b: git.Commit,
     commits: List[git.Commit],
     commit_changed_files: Dict[str, Set[str]],
+    file_bits: Optional[Dict[str, int]] = None,
 ) -> bool:
-    if not has_same_files(
-        list(commit_changed_files[commit_a.hexsha]),
-        list(commit_changed_files[commit_b.hexsha]),
-    ):
+    if file_bits is None:
+        if not has_same_files(
+            list(commit_changed_files[commit_a.hexsha]),
+            list(commit_changed_files[commit_b.hexsha]),
+        ):
+            return False
+    elif file_bits.get(commit_a.hexsha, 0) != file_bits.get(commit_b.hexsha, 0):
         return False
 
     if has_relevant_files_changed_in_between(
-        commit_a, commit_b, commits, commit_changed_files
+        commit_a, commit_b, commits, commit_changed_files, file_bits
     ):
         return False
     if commit_diff_empty(commit_a, commit_b):
@@ -88,42 +168,170 @@ def fulfils_conditions(
     return True
 
 
-def get_squash_combinations(
+def get_squash_combinations_pairwise(
     commits: List[git.Commit], commit_changed_files: Dict[str, Set[str]]
-):
+) -> Dict[str, List[git.Commit]]:
+    """
+    compares every pair of commits with each other
+    - reference implementation of get_squash_combinations
+    """
     squash_combinations: Dict[str, List[git.Commit]] = collections.defaultdict(list)
+    file_bits: Dict[str, int] = get_file_bits(commit_changed_files, PathTable())
     for commit_a, commit_b in itertools.combinations(commits, 2):
-        if not fulfils_conditions(commit_a, commit_b, commits, commit_changed_files):
+        if not fulfils_conditions(
+            commit_a, commit_b, commits, commit_changed_files, file_bits
+        ):
             continue
         squash_combinations[commit_a.hexsha].append(commit_b)
     return squash_combinations
 
 
-def get_rebase_data(commits: List[git.Commit]) -> Tuple[bool, str]:
-    has_rebase = False
-    data = ""
-    logger.info("Fetching files changed by commits...")
-    commit_changed_files: Dict[str, Set[str]] = helpers.get_commits_changed_files(
-        commits
+def get_squash_candidates(
+    commits: List[git.Commit], commit_changed_files: Dict[str, Set[str]]
+) -> List[Tuple[int, int]]:
+    """
+    returns the positions of all commit pairs, which change the same files
+    without a relevant change in between. Commits are grouped by the bitset
+    of their changed files and only the distinct bitsets are compared with
+    each other to find the relevant changes in between, instead of
+    comparing every pair of commits
+    """
+    table = PathTable()
+    signatures: List[int] = [
+        table.bits(commit_changed_files.get(commit.hexsha, ())) for commit in commits
+    ]
+    groups: Dict[int, List[int]] = collections.defaultdict(list)
+    for position, signature in enumerate(signatures):
+        groups[signature].append(position)
+
+    candidates: List[Tuple[int, int]] = []
+    for signature, members in groups.items():
+        if len(members) < 2:
+            continue
+        # commits changing some of 'our files', but not exactly the same set
+        blocking: List[int] = sorted(
+            position
+            for other, other_members in groups.items()
+            if other & signature and other != signature
+            for position in other_members
+        )
+        for index, position_a in enumerate(members):
+            next_blocking: int = bisect.bisect_right(blocking, position_a)
+            limit: int = (
+                blocking[next_blocking]
+                if next_blocking < len(blocking)
+                else len(commits)
+            )
+            for position_b in members[index + 1 :]:
+                if position_b > limit:
+                    break
+                candidates.append((position_a, position_b))
+    return sorted(candidates)
+
+
+@profile_phase
+def get_squash_combinations(
+    commits: List[git.Commit],
+    commit_changed_files: Dict[str, Set[str]],
+    tree_ids: Optional[Dict[str, str]] = None,
+    repo_path: Optional[str] = None,
+) -> Dict[str, List[git.Commit]]:
+    """
+    - tree_ids can hold the tree ids of the commits, which are looked up
+      otherwise for the candidates only
+    - repo_path is required for commit records, see commit_diff_empty
+    - the merge-bases of the candidates, which aren't on the same chain of
+      first parents, and their trees are looked up in bulk
+    """
+    squash_combinations: Dict[str, List[git.Commit]] = collections.defaultdict(list)
+    candidates: List[Tuple[int, int]] = get_squash_candidates(
+        commits, commit_changed_files
     )
+    if not candidates:
+        return squash_combinations
+    if tree_ids is None:
+        tree_ids = helpers.get_commits_tree_ids(
+            [commits[position] for candidate in candidates for position in candidate]
+        )
+    chain_ids: List[int] = get_chain_ids(commits)
+    pairs: List[backend.CommitPair] = [
+        (commits[position_a].hexsha, commits[position_b].hexsha)
+        for position_a, position_b in candidates
+        if chain_ids[position_a] != chain_ids[position_b]
+    ]
+    merge_bases: Dict[backend.CommitPair, str] = {}
+    if pairs:
+        git_backend: backend.Backend = backend.get_backend(
+            repo_path or commits[0].repo.working_dir
+        )
+        merge_bases = git_backend.merge_bases(pairs)
+        tree_ids = {
+            **tree_ids,
+            **git_backend.tree_ids(sorted(set(merge_bases.values()) - set(tree_ids))),
+        }
+    for position_a, position_b in candidates:
+        commit_a: git.Commit = commits[position_a]
+        commit_b: git.Commit = commits[position_b]
+        if commit_diff_empty(
+            commit_a,
+            commit_b,
+            tree_ids,
+            chain_ids[position_a] == chain_ids[position_b],
+            repo_path,
+            merge_bases,
+        ):
+            continue
+        squash_combinations[commit_a.hexsha].append(commit_b)
+    return squash_combinations
+
+
+@profile_phase
+def get_rebase_plan(
+    commits: List[git.Commit],
+    commit_changed_files: Optional[Dict[str, Set[str]]] = None,
+    tree_ids: Optional[Dict[str, str]] = None,
+    repo_path: Optional[str] = None,
+) -> List[Tuple[str, git.Commit]]:
+    """
+    returns the todo list for the rebase as pairs of action and commit,
+    where commits to be squashed follow the commit they are squashed into
+    - commits can be commit records, passing the files they change and
+      their tree ids, which are known already, and the path of their repo
+    """
+    if commit_changed_files is None:
+        logger.info("Fetching files changed by commits...")
+        commit_changed_files = helpers.get_commits_changed_files(commits)
     logger.info(f"Comparing {len(commits)} commits with each other...")
     squash_combinations: Dict[str, List[git.Commit]] = get_squash_combinations(
-        commits, commit_changed_files
+        commits, commit_changed_files, tree_ids, repo_path
     )
+    return build_rebase_plan(commits, squash_combinations)
+
 
+def build_rebase_plan(
+    commits: List[git.Commit], squash_combinations: Dict[str, List[git.Commit]]
+) -> List[Tuple[str, git.Commit]]:
+    plan: List[Tuple[str, git.Commit]] = []
     squash_list: List[str] = []
     for commit in commits:
         if commit.hexsha in squash_list:
             continue
-        if to_squash_commits := squash_combinations.get(commit.hexsha):
-            # commit has commits to be squashed
-            data += f"pick {commit.hexsha[:7]} {get_commit_message(commit)}\n"
-            for to_squash in to_squash_commits:
-                has_rebase = True
-                data += (
-                    f"fixup {to_squash.hexsha[:7]} {get_commit_message(to_squash)}\n"
-                )
-                squash_list.append(to_squash.hexsha)
-        else:
-            data += f"pick {commit.hexsha[:7]} {get_commit_message(commit)}\n"
+        plan.append(("pick", commit))
+        # commit has commits to be squashed
+        for to_squash in squash_combinations.get(commit.hexsha, []):
+            plan.append(("fixup", to_squash))
+            squash_list.append(to_squash.hexsha)
+    return plan
+
+
+def format_rebase_plan(plan: List[Tuple[str, git.Commit]]) -> Tuple[bool, str]:
+    has_rebase: bool = any(action == "fixup" for action, _ in plan)
+    data: str = "".join(
+        f"{action} {commit.hexsha[:7]} {get_commit_message(commit)}\n"
+        for action, commit in plan
+    )
     return has_rebase, data
+
+
+def get_rebase_data(commits: List[git.Commit]) -> Tuple[bool, str]:
+    return format_rebase_plan(get_rebase_plan(commits))
@@ -3,6 +3,7 @@ import git
 import uuid
 from pathlib import Path
 from typing import List, Optional, Callable
+from smartsquash import plumbing
 
 
 def add_random_files(repo: git.Repo, files_added=5, added_per_commit=1):
@@ -20,6 +21,12 @@ def add_random_files(repo: git.Repo, files_added=5, added_per_commit=1):
         repo.index.commit(str(uuid.uuid4()))
 
 
+@pytest.fixture(autouse=True)
+def close_plumbing():
+    yield
+    plumbing.close_all()
+
+
 @pytest.fixture
 def make_files() -> Callable:
     def _make_files(repo: git.Repo, files: List[str], content: str):
@@ -45,6 +52,33 @@ def commit_files(make_files) -> Callable:
     return _commit_files
 
 
+@pytest.fixture
+def merge_side_branch(commit_files, monkeypatch) -> Callable:
+    def _merge_side_branch(repo: git.Repo) -> List[git.Commit]:
+        """
+        merges a side branch, which forks off after the first commit of the
+        active branch, and returns the commits newest first. The commits of
+        both branches alternate by date, so the side branch has the higher
+        generation numbers, but not the newest commit
+        """
+        branch: str = repo.active_branch.name
+        commits: List[git.Commit] = []
+        heads: List[str] = [branch, "side", "side", branch]
+        for date, (head, name) in enumerate(zip(heads, ["f1", "s1", "s2", "f2"])):
+            monkeypatch.setenv("GIT_COMMITTER_DATE", f"{1600000000 + date} +0000")
+            if head not in repo.heads:
+                repo.create_head(head)
+            repo.git.checkout(head)
+            commits.append(commit_files(repo, [f"{name}.txt"], name, name))
+        monkeypatch.setenv("GIT_COMMITTER_DATE", "1600000010 +0000")
+        repo.git.checkout(branch)
+        repo.git.merge("side", "--no-edit")
+        monkeypatch.delenv("GIT_COMMITTER_DATE")
+        return commits[::-1]
+
+    return _merge_side_branch
+
+
 @pytest.fixture
 def repository(tmp_path) -> git.Repo:
     repo = git.Repo.init(tmp_path)
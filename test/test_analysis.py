@@ -0,0 +1,115 @@
+import git
+import random
+from pathlib import Path
+from typing import Callable, List, Tuple
+from smartsquash import analysis, cache, squash
+from smartsquash.records import FileSetTable, retrieve_commit_records
+
+
+def full_plan(repo: git.Repo) -> List[Tuple[str, str]]:
+    file_sets = FileSetTable()
+    records = retrieve_commit_records(repo, "master", file_sets)
+    plan = squash.get_rebase_plan(
+        records,
+        file_sets.changed_files(records),
+        {record.hexsha: record.tree_sha for record in records},
+        repo.working_dir,
+    )
+    return [(action, commit.hexsha) for action, commit in plan]
+
+
+def cached_plan(repo: git.Repo) -> List[Tuple[str, str]]:
+    plan = analysis.get_rebase_plan(repo, "master")
+    return [(action, commit.hexsha) for action, commit in plan]
+
+
+def test_unchanged_branch_uses_cached_plan(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    plan = cached_plan(repository)
+    assert [action for action, _ in plan] == ["pick", "fixup"]
+    monkeypatch.setattr(analysis, "retrieve_commit_records", None)
+    assert cached_plan(repository) == plan
+
+
+def test_extended_branch_equals_full_analysis(
+    repository: git.Repo, commit_files: Callable
+):
+    rand = random.Random(0)
+    files: List[List[str]] = [["a.txt"], ["b.txt"], ["a.txt", "b.txt"], ["c.txt"]]
+    for i in range(30):
+        commit_files(repository, rand.choice(files), f"content {i}")
+        if i % 7 == 0:
+            assert cached_plan(repository) == full_plan(repository)
+    assert cached_plan(repository) == full_plan(repository)
+
+
+def test_extended_branch_only_analyses_new_commits(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    cached_plan(repository)
+    tip: str = repository.head.commit.hexsha
+    commit_files(repository, ["test.txt"], "even other content")
+    ranges: List[str] = []
+    original = analysis.retrieve_commit_records
+
+    def retrieve(repo, target_branch, file_sets):
+        ranges.append(target_branch)
+        return original(repo, target_branch, file_sets)
+
+    monkeypatch.setattr(analysis, "retrieve_commit_records", retrieve)
+    assert cached_plan(repository) == full_plan(repository)
+    assert ranges == [tip]
+
+
+def test_merged_side_branch_is_analysed_again(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    repository.create_head("side")
+    repository.git.checkout("side")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "1600000000 +0000")
+    side: git.Commit = commit_files(repository, ["test.txt"], "side", "side-b")
+    repository.git.checkout("feature-branch")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "1600000100 +0000")
+    commit: git.Commit = commit_files(repository, ["test.txt"], "b1", "b1")
+    cached_plan(repository)
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "1600000200 +0000")
+    repository.git.merge("side", "-X", "ours", "--no-edit")
+    # the side branch is older, so it comes first, as in the rebase
+    assert cached_plan(repository) == full_plan(repository)
+    assert full_plan(repository) == [("pick", side.hexsha), ("fixup", commit.hexsha)]
+
+
+def test_rewritten_branch_is_analysed_again(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["other.txt"], "other content")
+    cached_plan(repository)
+    repository.head.reset("HEAD~1", index=True, working_tree=True)
+    commit_files(repository, ["test.txt"], "even other content")
+    assert cached_plan(repository) == full_plan(repository)
+    assert [action for action, _ in cached_plan(repository)] == ["pick", "fixup"]
+
+
+def test_state_serialization(repository: git.Repo, commit_files: Callable):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    cached_plan(repository)
+    store = cache.open_cache(Path(repository.git_dir))
+    key: str = f"{repository.active_branch.path}\0master"
+    state = analysis.AnalysisState.from_bytes(store.get_blob(analysis.CACHE_KIND, key))
+    assert state.branch_tip == repository.head.commit.hexsha
+    assert state.pairs == [(0, 1)]
+    assert state.signatures == [["test.txt"]]
+    assert state.commits[1].parent == state.commits[0].hexsha
+
+
+def test_without_cache(repository: git.Repo, commit_files: Callable, monkeypatch):
+    monkeypatch.setenv(cache.DISABLE_ENV, "1")
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    assert cached_plan(repository) == full_plan(repository)
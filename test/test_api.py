@@ -0,0 +1,173 @@
+import git
+import os
+import pytest
+from pathlib import Path
+from typing import Callable, List, Set
+from smartsquash import api, backend, cache, commit_graph, plumbing
+
+
+def test_open_repo_invalid(tmp_path: Path):
+    with pytest.raises(api.InvalidRepositoryError) as e:
+        api.open_repo(f"{tmp_path}/invalid", "master")
+    assert e.value.message == api.ErrorMessage.PATH_NOT_EXIST
+    with pytest.raises(api.SmartsquashError):
+        api.open_repo(str(tmp_path), "master")
+
+
+def test_open_repo_target_equals_current(repository: git.Repo):
+    with pytest.raises(api.InvalidRepositoryError) as e:
+        api.open_repo(repository.working_dir, "feature-branch")
+    assert e.value.message == api.ErrorMessage.TARGET_EQUALS_CURRENT
+
+
+def test_squash(repository: git.Repo, commit_files: Callable):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["test.txt"], "even other content")
+    dry_result = api.squash(repository, "master", dry=True)
+    assert dry_result.has_rebase
+    assert dry_result.executed is None
+    assert dry_result.new_head == dry_result.old_head == commit_2.hexsha
+    assert [step[:2] for step in dry_result.plan] == [
+        ("pick", commit_1.hexsha),
+        ("fixup", commit_2.hexsha),
+    ]
+    assert dry_result.todo.startswith(f"pick {commit_1.hexsha[:7]}")
+    result = api.squash(repository, "master")
+    assert result.executed == api.EXECUTED_REBASE
+    assert result.new_head == repository.head.commit.hexsha != result.old_head
+    assert len(list(repository.iter_commits("master..feature-branch"))) == 1
+
+
+def test_squash_nothing_to_do(repository: git.Repo, commit_files: Callable):
+    commit_files(repository, ["test.txt"], "whatever")
+    result = api.squash(repository, "master", in_memory=True)
+    assert not result.has_rebase
+    assert result.executed is None
+
+
+def test_fixup_not_dirty(repository: git.Repo):
+    result = api.fixup(repository, "master")
+    assert not result.dirty
+    assert result.executed is None
+
+
+def test_fixup(repository: git.Repo, commit_files: Callable, make_files: Callable):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["other.txt"], "other content")
+    make_files(repository, ["test.txt"], "changed")
+    repository.index.add(["test.txt"])
+    dry_result = api.fixup(repository, "master", dry=True)
+    assert dry_result.targets == {commit.hexsha: {"test.txt"}}
+    assert dry_result.fixup_commits == {}
+    assert repository.is_dirty()
+    result = api.fixup(repository, "master", in_memory=True)
+    assert result.executed == api.EXECUTED_REWRITE
+    assert list(result.fixup_commits) == [commit.hexsha]
+    assert not repository.is_dirty()
+    assert len(list(repository.iter_commits("master..feature-branch"))) == 2
+
+
+def test_fixup_multi_unmatched(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    make_files(repository, ["test.txt"], "changed")
+    make_files(repository, ["not-on-branch.txt"], "changed")
+    repository.index.add(["not-on-branch.txt"])
+    result = api.fixup(repository, "master", add=True, dry=True, multi=True)
+    assert result.targets == {commit.hexsha: {"test.txt"}}
+    assert result.unmatched == {"not-on-branch.txt"}
+
+
+def test_fixup_head_amends(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit_files(repository, ["other.txt"], "other content")
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    make_files(repository, ["test.txt"], "changed")
+    repository.index.add(["test.txt"])
+    result = api.fixup(repository, "master")
+    assert result.executed == api.EXECUTED_AMEND
+    assert result.fixup_commits == {}
+    assert result.new_head == repository.head.commit.hexsha != commit.hexsha
+    assert repository.head.commit.summary == commit.summary
+    assert list(repository.head.commit.parents) == list(commit.parents)
+    assert not repository.is_dirty()
+
+
+def test_fixup_head_squashes_pending_fixups(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "changed", f"fixup! {commit.summary}")
+    head = commit_files(repository, ["other.txt"], "other content")
+    make_files(repository, ["other.txt"], "other content-changed")
+    repository.index.add(["other.txt"])
+    result = api.fixup(repository, "master")
+    assert result.executed == api.EXECUTED_REBASE
+    commits = list(repository.iter_commits("master..feature-branch"))
+    assert [commit.summary for commit in commits] == [head.summary, commit.summary]
+    assert not repository.is_dirty()
+
+
+def test_fixup_head_nothing_staged(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    make_files(repository, ["test.txt"], "changed")
+    with pytest.raises(api.FixupError):
+        api.fixup(repository, "master")
+    assert repository.head.commit == commit
+    assert repository.is_dirty()
+
+
+def test_fixup_rebases_from_target(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    other = commit_files(repository, ["other.txt"], "other content")
+    make_files(repository, ["test.txt"], "changed")
+    repository.index.add(["test.txt"])
+    result = api.fixup(repository, "master")
+    assert result.executed == api.EXECUTED_REBASE
+    commits = list(repository.iter_commits("master..feature-branch"))
+    assert [commit.summary for commit in commits] == [other.summary, commit.summary]
+    assert list(commits[1].parents) == list(commit.parents)
+    # only the commits from the target on were replayed
+    assert f"checkout {commit.parents[0].hexsha}" in repository.git.reflog("-5")
+    assert not repository.is_dirty()
+
+
+def get_child_processes() -> Set[int]:
+    children: Set[int] = set()
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # the parent pid follows the command name in parentheses
+            fields: List[str] = stat.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == os.getpid():
+            children.add(int(stat.parent.name))
+    return children
+
+
+@pytest.mark.skipif(not Path("/proc/self/stat").exists(), reason="needs /proc")
+def test_close(repository: git.Repo, commit_files: Callable, make_files: Callable):
+    # processes left by other tests
+    before: Set[int] = get_child_processes()
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    repository.git.commit_graph("write", "--reachable", "--changed-paths")
+    assert api.squash(repository, "master", in_memory=True).executed
+    make_files(repository, ["test.txt"], "more content")
+    repository.index.add(["test.txt"])
+    assert api.fixup(repository, "master", dry=True).targets
+    api.close(repository)
+    assert get_child_processes() - before == set()
+    assert repository.working_dir not in plumbing._plumbings
+    assert not [key for key in backend._backends if key[1] == repository.working_dir]
+    assert repository.git_dir not in cache._caches
+    assert Path(repository.git_dir) / "objects" not in commit_graph._graphs
+    # everything is reopened on demand
+    assert api.squash(repository, "master", dry=True).plan
+    api.close(repository)
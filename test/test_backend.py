@@ -0,0 +1,155 @@
+import git
+import sys
+import pytest
+from pathlib import Path
+from typing import Callable
+from smartsquash import api, backend
+
+
+@pytest.fixture(params=["cli", "pygit2"])
+def git_backend(request, repository: git.Repo) -> backend.Backend:
+    if request.param == "pygit2":
+        pytest.importorskip("pygit2")
+    return backend.BACKENDS[request.param](repository.working_dir)
+
+
+def test_list_commits(
+    repository: git.Repo, commit_files: Callable, git_backend: backend.Backend
+):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["test.txt"], "other", "Subject\n\nBody")
+    assert git_backend.list_commits("master", "feature-branch") == [
+        commit_2.hexsha,
+        commit_1.hexsha,
+    ]
+    entries = list(git_backend.iter_commits("master", "feature-branch"))
+    assert entries[0] == (
+        commit_2.hexsha,
+        commit_2.tree.hexsha,
+        [commit_1.hexsha],
+        "Subject\n\nBody",
+    )
+
+
+def test_list_commits_merged_side_branch(
+    repository: git.Repo, merge_side_branch: Callable
+):
+    pytest.importorskip("pygit2")
+    commits = [commit.hexsha for commit in merge_side_branch(repository)]
+    assert repository.git.rev_list("--no-merges", "master..HEAD").split() == commits
+    for name in backend.BACKENDS:
+        git_backend = backend.BACKENDS[name](repository.working_dir)
+        assert git_backend.list_commits("master", "feature-branch") == commits
+
+
+def test_changed_files_and_trees(
+    repository: git.Repo, commit_files: Callable, git_backend: backend.Backend
+):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["test.txt", "other.txt"], "other")
+    root = repository.commit(f"{commit_1.hexsha}~5")
+    assert git_backend.changed_files([commit_2.hexsha, root.hexsha, "0" * 40]) == {
+        commit_2.hexsha: ["other.txt", "test.txt"],
+        root.hexsha: [],
+    }
+    assert git_backend.tree_ids([commit_1.hexsha, "0" * 40]) == {
+        commit_1.hexsha: commit_1.tree.hexsha
+    }
+
+
+def test_resolve(
+    repository: git.Repo, commit_files: Callable, git_backend: backend.Backend
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    assert git_backend.resolve(["feature-branch", "master", "not-there"]) == {
+        "feature-branch": commit.hexsha,
+        "master": repository.heads.master.commit.hexsha,
+    }
+
+
+def test_merge_bases(
+    repository: git.Repo, merge_side_branch: Callable, git_backend: backend.Backend
+):
+    f2, s2, s1, f1 = [commit.hexsha for commit in merge_side_branch(repository)]
+    master: str = repository.heads.master.commit.hexsha
+    pairs = [(s1, f2), (f2, s2), (f1, s2), (s1, s2), (master, s2)]
+    expected = {pair: repository.git.merge_base(*pair) for pair in pairs}
+    assert expected[(s1, f2)] == f1
+    assert git_backend.merge_bases(pairs) == expected
+    assert git_backend.merge_base(s2, f2) == f1
+    assert git_backend.merge_base(s2, "0" * 40) is None
+
+
+def test_staged_files(
+    repository: git.Repo,
+    commit_files: Callable,
+    make_files: Callable,
+    git_backend: backend.Backend,
+):
+    commit_files(repository, ["test.txt", "other.txt"], "whatever")
+    make_files(repository, ["test.txt", "other.txt", "new.txt"], "changed")
+    repository.index.add(["test.txt", "new.txt"])
+    assert sorted(git_backend.staged_files()) == ["new.txt", "test.txt"]
+
+
+def test_create_commit_and_update_ref(
+    repository: git.Repo, commit_files: Callable, git_backend: backend.Backend
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    author = ("Author", "author@example.com", "1600000000 +0200")
+    new_commit = git_backend.create_commit(
+        commit.tree.hexsha, [commit.hexsha], "Rewritten\n", author
+    )
+    assert repository.head.commit.hexsha == commit.hexsha
+    written = repository.commit(new_commit)
+    assert written.parents == (commit,)
+    assert written.message == "Rewritten\n"
+    assert written.author.email == "author@example.com"
+    assert written.authored_date == 1600000000
+    assert written.author_tz_offset == -7200
+    with pytest.raises(backend.BackendError):
+        git_backend.update_ref("HEAD", new_commit, new_commit, "test")
+    git_backend.update_ref("HEAD", new_commit, commit.hexsha, "test")
+    assert repository.heads["feature-branch"].commit.hexsha == new_commit
+
+
+def test_update_ref_locked(
+    repository: git.Repo, commit_files: Callable, git_backend: backend.Backend
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    old: str = commit.parents[0].hexsha
+    lock = Path(repository.git_dir) / "refs" / "heads" / "feature-branch.lock"
+    lock.write_text(f"{old}\n")
+    with pytest.raises(backend.BackendError):
+        git_backend.update_ref("HEAD", old, commit.hexsha, "test")
+    lock.unlink()
+    assert repository.heads["feature-branch"].commit.hexsha == commit.hexsha
+
+
+def test_get_backend(repository: git.Repo, monkeypatch):
+    assert issubclass(backend.BackendError, api.SmartsquashError)
+    monkeypatch.setattr(backend, "_backend_name", None)
+    monkeypatch.delenv(backend.BACKEND_ENV, raising=False)
+    assert isinstance(backend.get_backend(repository.working_dir), backend.CliBackend)
+    assert backend.get_backend(repository.working_dir) is backend.get_backend(
+        repository.working_dir
+    )
+    monkeypatch.setenv(backend.BACKEND_ENV, "unknown")
+    assert backend.get_backend_name() == "unknown"
+    with pytest.raises(backend.BackendError):
+        backend.get_backend(repository.working_dir)
+    backend.set_backend("cli")
+    assert backend.get_backend_name() == "cli"
+
+
+def test_set_backend_without_pygit2(monkeypatch):
+    monkeypatch.setattr(backend, "_backend_name", None)
+    monkeypatch.setitem(sys.modules, "pygit2", None)
+    with pytest.raises(backend.BackendError) as e:
+        backend.set_backend("pygit2")
+    assert "pip install pygit2" in str(e.value)
+
+
+def test_parse_date():
+    assert backend.parse_date("1600000000 +0200") == (1600000000, 120)
+    assert backend.parse_date("1600000000 -0530") == (1600000000, -330)
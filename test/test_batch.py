@@ -0,0 +1,55 @@
+import git
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict
+from smartsquash import batch
+
+
+def get_args(**kwargs) -> Dict[str, Any]:
+    return {
+        "target_branch": "master",
+        "dry": False,
+        "squash": True,
+        "multi_fixup": False,
+        "in_memory": False,
+        "profile": None,
+        "no_add": False,
+        **kwargs,
+    }
+
+
+def test_read_repos(tmp_path: Path):
+    repos_file = tmp_path / "repos.txt"
+    repos_file.write_text(f"# services\n{tmp_path / 'a'}\n\n  {tmp_path / 'b'}  \n")
+    assert batch.read_repos(str(repos_file)) == [
+        str(tmp_path / "a"),
+        str(tmp_path / "b"),
+    ]
+
+
+def test_run_batch(
+    repository: git.Repo, commit_files: Callable, tmp_path: Path, capsys
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    repos = [repository.working_dir, str(tmp_path / "missing")]
+    summary = batch.run_batch(get_args(), repos, 2)
+    assert summary["succeeded"] == 1
+    assert summary["failed"] == 1
+    assert [result["repo"] for result in summary["repos"]] == repos
+    assert summary["repos"][0]["exit_code"] == 0
+    assert "Rebase done" in summary["repos"][0]["stdout"]
+    assert summary["repos"][0]["seconds"] > 0
+    assert summary["repos"][1]["exit_code"] == 1
+    assert "path doesn't exist" in summary["repos"][1]["stdout"]
+    assert len(list(repository.iter_commits("master..feature-branch"))) == 1
+    json.dumps(summary)
+
+
+def test_main(repository: git.Repo, tmp_path: Path, capsys):
+    repos_file = tmp_path / "repos.txt"
+    repos_file.write_text(repository.working_dir + "\n")
+    args = get_args(squash=False, repos_from=str(repos_file), jobs=1)
+    assert batch.main(args) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["repos"][0]["stdout"].startswith("Repository is not dirty")
@@ -0,0 +1,109 @@
+import git
+import sqlite3
+import unittest.mock
+from pathlib import Path
+from typing import Callable
+from smartsquash import cache, helpers
+
+
+def test_cache_put_get(tmp_path: Path):
+    store = cache.Cache(tmp_path / "cache.sqlite3")
+    store.put("123", ["test.txt", "other.txt"])
+    store.put("456", [])
+    assert store.get("123") == ["test.txt", "other.txt"]
+    assert store.get("456") == []
+    assert store.get("789") is None
+    assert store.get_many(["123", "789"]) == {"123": ["test.txt", "other.txt"]}
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path):
+    store = cache.Cache(tmp_path / "cache.sqlite3", max_entries=2)
+    store.put("000", ["a.txt"])
+    store.put("123", ["b.txt"])
+    store.get("000")
+    store.put("456", ["c.txt"])
+    assert store.get("123") is None
+    assert store.get("000") == ["a.txt"]
+    assert store.get("456") == ["c.txt"]
+
+
+def test_cache_filters(tmp_path: Path):
+    store = cache.Cache(tmp_path / "cache.sqlite3", max_entries=2)
+    store.put_filters({"000": b"\x01", "123": b"\x02"})
+    assert store.get_filters(["000", "789"]) == {"000": b"\x01"}
+    store.put_filters({"456": b"\x03"})
+    assert store.get_filters(["000", "123", "456"]) == {
+        "000": b"\x01",
+        "456": b"\x03",
+    }
+    assert store.get("000") is None
+
+
+def test_cache_schema_version_mismatch(tmp_path: Path):
+    path: Path = tmp_path / "cache.sqlite3"
+    store = cache.Cache(path)
+    store.put("123", ["test.txt"])
+    store.close()
+    connection = sqlite3.connect(str(path))
+    connection.execute(f"PRAGMA user_version = {cache.SCHEMA_VERSION + 1}")
+    connection.close()
+    assert cache.Cache(path).get("123") is None
+
+
+def test_open_cache_disabled(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv(cache.DISABLE_ENV, "1")
+    assert cache.open_cache(tmp_path) is None
+
+
+def test_get_commits_changed_files_uses_cache(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt", "whatever.img"], "whatever2")
+    commits = helpers.retrieve_commits(repository, "master")
+    changed = helpers.get_commits_changed_files(commits)
+    assert (Path(repository.git_dir) / cache.CACHE_DIR / cache.CACHE_FILE).exists()
+    with unittest.mock.patch.object(helpers, "files_changed_by_commits") as mock:
+        mock.return_value = {}
+        assert helpers.get_commits_changed_files(commits) == changed
+        mock.assert_called_once_with(repository.working_dir, [])
+
+
+def test_cache_blobs_bounded(tmp_path: Path):
+    store = cache.Cache(tmp_path / "cache.sqlite3")
+    store.put_blob("kind", "a", b"1", max_blobs=2)
+    store.put_blob("kind", "b", b"2", max_blobs=2)
+    store.put_blob("other-kind", "a", b"3", max_blobs=2)
+    store.get_blob("kind", "a")
+    store.put_blob("kind", "c", b"4", max_blobs=2)
+    assert store.get_blob("kind", "a") == b"1"
+    assert store.get_blob("kind", "b") is None
+    assert store.get_blob("kind", "c") == b"4"
+    assert store.get_blob("other-kind", "a") == b"3"
+
+
+def test_cache_locked_falls_back(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    monkeypatch.setattr(cache, "BUSY_TIMEOUT", 0.01)
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "whatever2")
+    path: Path = Path(repository.git_dir) / cache.CACHE_DIR / cache.CACHE_FILE
+    store = cache.Cache(path)
+    store.put("123", ["test.txt"])
+    lock = sqlite3.connect(str(path))
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        assert store.get("123") is None
+        store.put("456", ["other.txt"])
+        store.put_blob("kind", "a", b"1")
+        assert store.get_blob("kind", "a") is None
+        cache._caches.pop(repository.git_dir, None)
+        commits = helpers.retrieve_commits(repository, "master")
+        assert helpers.get_commits_changed_files(commits) == {
+            commit.hexsha: {"test.txt"} for commit in commits
+        }
+    finally:
+        lock.rollback()
+        lock.close()
+        cache._caches.pop(repository.git_dir, None)
@@ -0,0 +1,121 @@
+import git
+import subprocess
+from pathlib import Path
+from typing import Callable
+from smartsquash import api, backend, commit_graph
+
+
+def write_graph(repo: git.Repo) -> commit_graph.CommitGraph:
+    assert commit_graph.write_commit_graph(repo.working_dir).returncode == 0
+    return commit_graph.load_commit_graph(Path(repo.git_dir))
+
+
+def rev_list(repo: git.Repo, *args: str):
+    return repo.git.rev_list("--no-merges", *args).split()
+
+
+def test_murmur3():
+    assert commit_graph.murmur3(b"", 0) == 0
+    assert commit_graph.murmur3(b"Hello world!", 0) == 0x627B0C2C
+    assert (
+        commit_graph.murmur3(b"The quick brown fox jumps over the lazy dog", 0)
+        == 0x2E4FF723
+    )
+    # version 1 filters read bytes above 0x7f as negative
+    assert commit_graph.murmur3("ü".encode(), 0, signed=True) != commit_graph.murmur3(
+        "ü".encode(), 0
+    )
+
+
+def test_get_leading_paths():
+    assert commit_graph.get_leading_paths("a/b/c") == ["a/b/c", "a/b", "a"]
+    assert commit_graph.get_leading_paths("a") == ["a"]
+
+
+def test_load_commit_graph(repository: git.Repo, commit_files: Callable):
+    assert commit_graph.load_commit_graph(Path(repository.git_dir)) is None
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    graph = write_graph(repository)
+    assert commit_graph.load_commit_graph(Path(repository.git_dir)) is graph
+    assert graph.has_bloom_filters
+    position = graph.position(commit.hexsha)
+    assert graph.sha(position) == commit.hexsha
+    assert graph.tree(position) == commit.tree.hexsha
+    assert graph.parents(position) == [graph.position(commit.parents[0].hexsha)]
+    assert graph.position("0" * 40) is None
+    commit_files(repository, ["other.txt"], "other")
+    assert write_graph(repository) is not graph
+
+
+def test_get_range(repository: git.Repo, commit_files: Callable):
+    commit_files(repository, ["test.txt"], "whatever")
+    repository.git.checkout("master")
+    commit_files(repository, ["master.txt"], "on master")
+    repository.git.checkout("feature-branch")
+    repository.git.merge("master", "--no-edit")
+    commit_files(repository, ["test.txt"], "after the merge")
+    graph = write_graph(repository)
+    # commits made after the commit-graph was written are read from git
+    commit_files(repository, ["new.txt"], "not in the graph")
+    git_backend = backend.CliBackend(repository.working_dir)
+    expected = rev_list(repository, "master..feature-branch")
+    assert len(expected) == 3
+    assert git_backend.list_commits("master", "feature-branch") == expected
+    assert git_backend.list_commits("feature-branch", "master") == []
+    assert git_backend.list_commits("master", "master") == []
+    entries = list(git_backend.iter_commits("master", "feature-branch"))
+    assert [entry[0] for entry in entries] == expected
+    assert entries[0][3] == "Added new.txt"
+    tip = repository.head.commit.hexsha
+    target = repository.commit("master").hexsha
+    # ranges with merges are left to 'git rev-list'
+    assert commit_graph.get_range(graph, target, tip, git_backend._read_parents) is None
+    merge = repository.commit("HEAD~2").hexsha
+    assert commit_graph.get_range(
+        graph, merge, tip, git_backend._read_parents
+    ) == rev_list(repository, f"{merge}..HEAD")
+
+
+def test_get_range_merged_side_branch(
+    repository: git.Repo, merge_side_branch: Callable
+):
+    commits = [commit.hexsha for commit in merge_side_branch(repository)]
+    write_graph(repository)
+    assert rev_list(repository, "master..feature-branch") == commits
+    git_backend = backend.CliBackend(repository.working_dir)
+    assert git_backend.list_commits("master", "feature-branch") == commits
+    assert [
+        entry[0] for entry in git_backend.iter_commits("master", "feature-branch")
+    ] == commits
+
+
+def test_maybe_changed(repository: git.Repo, commit_files: Callable):
+    (Path(repository.working_dir) / "dir" / "ü").mkdir(parents=True)
+    commit = commit_files(repository, ["dir/ü/test.txt", "other.txt"], "whatever")
+    graph = write_graph(repository)
+    position = graph.position(commit.hexsha)
+    assert graph.maybe_changed(position, "dir/ü/test.txt")
+    assert graph.maybe_changed(position, "other.txt")
+    assert not graph.maybe_changed(position, "dir/ü/unchanged.txt")
+    assert not graph.maybe_changed(position, "unchanged.txt")
+    assert graph.filter_changing_all(
+        [commit.hexsha, commit.parents[0].hexsha, "0" * 40], {"other.txt"}
+    ) == [commit.hexsha, "0" * 40]
+
+
+def test_fixup_with_commit_graph(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["other.txt"], "other content")
+    write_graph(repository)
+    make_files(repository, ["test.txt"], "changed")
+    repository.index.add(["test.txt"])
+    result = api.fixup(repository, "master", dry=True)
+    assert result.targets == {commit.hexsha: {"test.txt"}}
+
+
+def test_write_commit_graph(repository: git.Repo):
+    write_graph(repository)
+    subprocess.check_call(["git", "commit-graph", "verify"], cwd=repository.working_dir)
+    assert (Path(repository.git_dir) / "objects" / "info" / "commit-graph").is_file()
@@ -0,0 +1,91 @@
+import git
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict
+import pytest
+from smartsquash import daemon
+from smartsquash import __main__ as cli
+
+
+def get_args(repo: git.Repo, **kwargs) -> Dict[str, Any]:
+    return {
+        "repo": repo.working_dir,
+        "target_branch": "master",
+        "dry": False,
+        "squash": False,
+        "multi_fixup": False,
+        "in_memory": False,
+        "profile": None,
+        "no_add": False,
+        **kwargs,
+    }
+
+
+@pytest.fixture
+def running_daemon(repository: git.Repo):
+    server = daemon.make_server(repository.working_dir, cli.run_captured)
+    thread = threading.Thread(target=daemon.serve, args=(server,))
+    thread.start()
+    yield server
+    daemon.stop(repository.working_dir)
+    thread.join(timeout=10)
+    cli.setup_logger()
+
+
+def test_forward_without_daemon(repository: git.Repo):
+    assert daemon.forward(get_args(repository)) is None
+
+
+def test_forward_squash(
+    repository: git.Repo, commit_files: Callable, running_daemon, capsys
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    assert daemon.forward(get_args(repository, squash=True)) == 0
+    assert "Rebase done" in capsys.readouterr().out
+    assert len(list(repository.iter_commits("master..feature-branch"))) == 1
+
+
+def test_forward_exit_code(repository: git.Repo, running_daemon, capsys):
+    assert daemon.forward(get_args(repository, target_branch="not-there")) == 1
+    assert "target branch doesn't exist" in capsys.readouterr().out
+    # the daemon keeps running after a command exited
+    assert daemon.forward(get_args(repository)) == 0
+
+
+def test_warm_repo_invalidated_on_ref_change(
+    repository: git.Repo, commit_files: Callable
+):
+    warm_repos = daemon.WarmRepos(Path(repository.git_dir))
+    repo = warm_repos.get_repo(repository.working_dir, "master")
+    assert warm_repos.get_repo(repository.working_dir, "master") is repo
+    repository.git.checkout("-b", "other-branch")
+    assert warm_repos.get_repo(repository.working_dir, "master") is not repo
+
+
+def test_warm_repo_invalidated_on_ref_change_in_worktree(
+    repository: git.Repo, commit_files: Callable, tmp_path_factory
+):
+    worktree: Path = tmp_path_factory.mktemp("worktree")
+    repository.git.worktree("add", "-b", "other-branch", str(worktree), "master")
+    worktree_repo = git.Repo(worktree)
+    warm_repos = daemon.WarmRepos(Path(worktree_repo.git_dir))
+    repo = warm_repos.get_repo(str(worktree), "master")
+    assert warm_repos.get_repo(str(worktree), "master") is repo
+    commit_files(repository, ["test.txt"], "whatever")
+    repository.git.branch("-f", "master", "feature-branch")
+    assert warm_repos.get_repo(str(worktree), "master") is not repo
+
+
+def test_make_server_running(repository: git.Repo, running_daemon):
+    with pytest.raises(OSError):
+        daemon.make_server(repository.working_dir, cli.run_captured)
+
+
+def test_make_server_replaces_stale_socket(repository: git.Repo):
+    socket_path = daemon.get_socket_path(Path(repository.git_dir))
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    socket_path.write_text("")
+    server = daemon.make_server(repository.working_dir, cli.run_captured)
+    server.server_close()
+    assert socket_path.exists()
@@ -0,0 +1,37 @@
+import git
+from pathlib import Path
+from typing import Dict, Set
+from smartsquash import cache, file_index
+from smartsquash.file_index import FileIndex
+
+COMMIT_CHANGED_FILES: Dict[str, Set[str]] = {
+    "000": {"something.txt"},
+    "123": {"test.txt", "other.txt"},
+    "456": {"test.txt"},
+    "678": {"something-else.txt", "other.txt"},
+}
+
+
+def test_first_changing():
+    index = FileIndex.from_changed_files(COMMIT_CHANGED_FILES)
+    assert index.first_changing("other.txt") == "123"
+    assert index.first_changing("not-found.txt") is None
+
+
+def test_serialization():
+    index = FileIndex.from_changed_files(COMMIT_CHANGED_FILES)
+    loaded = FileIndex.from_bytes(index.to_bytes())
+    assert loaded.commits == index.commits
+    assert loaded.postings == index.postings
+
+
+def test_get_file_index_cached(repository: git.Repo, monkeypatch):
+    git_dir = Path(repository.git_dir)
+    index = file_index.get_file_index(git_dir, COMMIT_CHANGED_FILES)
+    monkeypatch.setattr(
+        FileIndex, "from_changed_files", classmethod(lambda *args: None)
+    )
+    cached = file_index.get_file_index(git_dir, COMMIT_CHANGED_FILES)
+    assert cached is not index
+    assert cached.postings == index.postings
+    assert cache.open_cache(git_dir).get_blob(file_index.CACHE_KIND, "other") is None
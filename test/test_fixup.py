@@ -1,31 +1,32 @@
 import git
 import pytest
-from smartsquash import helpers, fixup
-from typing import Callable, Dict, Set
+import unittest.mock
+from smartsquash import api, helpers, fixup, path_filter, sq
+from typing import Callable, Dict, List, Set
 from pathlib import Path
 
 
-def test_run_fixup_one_commit_add_files(
+def test_fixup_one_commit_add_files(
     repository: git.Repo, make_files: Callable, commit_files: Callable
 ):
-    commit1: git.Commit = commit_files(repository, ["test.txt"], "content")
+    commit_files(repository, ["test.txt"], "content")
     make_files(repository, ["test.txt"], "content-changed")
     target_branch: str = "master"
-    fixup.run_fixup(repository, target_branch, commit1.hexsha, True, False)
+    api.fixup(repository, target_branch, add=True)
     assert len(helpers.retrieve_commits(repository, target_branch)) == 1
     assert (
         open(Path(repository.working_dir) / "test.txt", "r").read() == "content-changed"
     )
 
 
-def test_run_fixup_tracked_files(
+def test_fixup_tracked_files(
     repository: git.Repo, make_files: Callable, commit_files: Callable
 ):
-    commit1: git.Commit = commit_files(repository, ["test.txt"], "content")
+    commit_files(repository, ["test.txt"], "content")
     make_files(repository, ["test.txt"], "content-changed")
     repository.index.add(["test.txt"])
     target_branch: str = "master"
-    fixup.run_fixup(repository, target_branch, commit1.hexsha, False, False)
+    api.fixup(repository, target_branch)
     assert len(helpers.retrieve_commits(repository, target_branch)) == 1
     assert repository.is_dirty() is False
 
@@ -52,6 +53,30 @@ def test_get_closest_change_commit_not_found():
     assert fixup.get_closest_change_commit(files_changed, commit_changed_files) is None
 
 
+@pytest.mark.parametrize("cached", [True, False])
+def test_get_closest_change_commit_from_filters(
+    repository: git.Repo, commit_files: Callable, monkeypatch, cached: bool
+):
+    if not cached:
+        monkeypatch.setenv("SMARTSQUASH_NO_CACHE", "1")
+    commit = commit_files(repository, ["test.txt", "other.txt"], "whatever")
+    commit_files(repository, ["other.txt"], "other content")
+    if cached:
+        path_filter.PathFilters(repository).get_filters([commit.hexsha])
+    filters = path_filter.PathFilters(repository)
+    with unittest.mock.patch.object(
+        fixup, "get_changed_files", wraps=helpers.get_changed_files
+    ) as get_changed_files:
+        assert (
+            fixup.get_closest_change_commit_from_filters(
+                repository, "master", {"test.txt"}, filters
+            )
+            == commit.hexsha
+        )
+    # the files loaded to build the filters are reused
+    assert get_changed_files.call_count == (1 if cached else 0)
+
+
 @pytest.mark.parametrize(
     "changed_files", [(["README.md"]), (["README.md", "LICENSE.md"]), ([])]
 )
@@ -63,3 +88,77 @@ def test_get_files_changed_in_staging(
     result_changed_files: Set[str] = fixup.get_files_changed_in_staging(repository)
     assert len(result_changed_files) == len(changed_files)
     assert sorted(list(result_changed_files)) == sorted(changed_files)
+
+
+def test_get_fixup_groups():
+    commit_changed_files: Dict[str, Set[str]] = {
+        "000": {"something.txt"},
+        "123": {"test.txt", "other.txt"},
+        "456": {"test.txt"},
+    }
+    files_changed: Set[str] = {"test.txt", "other.txt", "something.txt", "new.txt"}
+    assert fixup.get_fixup_groups(files_changed, commit_changed_files) == {
+        "000": {"something.txt"},
+        "123": {"test.txt", "other.txt"},
+    }
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_fixup_multi(
+    repository: git.Repo, make_files: Callable, commit_files: Callable, in_memory
+):
+    target_branch: str = "master"
+    commit_files(repository, ["test.txt"], "original", message="first")
+    commit_files(repository, ["other.txt"], "original", message="second")
+    make_files(repository, ["test.txt", "other.txt"], "changed")
+    make_files(repository, ["untouched.txt"], "new")
+    repository.index.add(["untouched.txt"])
+    assert sq.fixup(target_branch, repository, True, False, in_memory, True) is True
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, target_branch)
+    assert [commit.summary for commit in commits] == ["first", "second"]
+    assert (commits[0].tree / "test.txt").data_stream.read() == b"changed"
+    assert (commits[1].tree / "other.txt").data_stream.read() == b"changed"
+    assert fixup.get_files_changed_in_staging(repository) == {"untouched.txt"}
+
+
+def test_get_fixup_upstream(
+    repository: git.Repo, make_files: Callable, commit_files: Callable
+):
+    commit_1 = commit_files(repository, ["test.txt"], "content")
+    commit_2 = commit_files(repository, ["other.txt"], "other content")
+    assert not fixup.has_pending_autosquash(repository, "master")
+    make_files(repository, ["test.txt"], "content-changed")
+    repository.index.add(["test.txt"])
+    fixup_sha = fixup.create_fixup_commit(repository, commit_1.hexsha, False)
+    assert fixup.has_pending_autosquash(repository, "master")
+    assert (
+        fixup.get_fixup_upstream(repository, "master", commit_1.hexsha, fixup_sha)
+        == commit_1.parents[0].hexsha
+    )
+    assert (
+        fixup.get_fixup_upstream(repository, "master", commit_2.hexsha, fixup_sha)
+        == commit_2.parents[0].hexsha
+    )
+    make_files(repository, ["other.txt"], "other content-changed")
+    repository.index.add(["other.txt"])
+    other_fixup_sha = fixup.create_fixup_commit(repository, commit_2.hexsha, False)
+    # commit_2 in between changes the same file
+    assert (
+        fixup.get_fixup_upstream(repository, "master", commit_1.hexsha, other_fixup_sha)
+        == "master"
+    )
+
+
+def test_get_fixup_upstream_autosquash_before_target(
+    repository: git.Repo, make_files: Callable, commit_files: Callable
+):
+    commit_1 = commit_files(repository, ["test.txt"], "content")
+    commit_files(repository, ["test.txt"], "changed", f"fixup! {commit_1.summary}")
+    commit_3 = commit_files(repository, ["other.txt"], "other content")
+    make_files(repository, ["other.txt"], "other content-changed")
+    repository.index.add(["other.txt"])
+    fixup_sha = fixup.create_fixup_commit(repository, commit_3.hexsha, False)
+    assert (
+        fixup.get_fixup_upstream(repository, "master", commit_3.hexsha, fixup_sha)
+        == "master"
+    )
@@ -0,0 +1,22 @@
+import git
+from pathlib import Path
+from smartsquash import gitdir
+
+
+def test_find_git_dir(repository: git.Repo):
+    subdirectory = Path(repository.working_dir) / "sub"
+    subdirectory.mkdir()
+    assert gitdir.find_git_dir(str(subdirectory)) == Path(repository.git_dir)
+    assert gitdir.get_common_dir(Path(repository.git_dir)) == Path(repository.git_dir)
+
+
+def test_find_git_dir_worktree(repository: git.Repo, tmp_path_factory):
+    worktree: Path = tmp_path_factory.mktemp("worktree")
+    repository.git.worktree("add", str(worktree), "master")
+    git_dir = gitdir.find_git_dir(str(worktree))
+    assert git_dir == Path(git.Repo(worktree).git_dir).resolve()
+    assert gitdir.get_common_dir(git_dir) == Path(repository.git_dir).resolve()
+
+
+def test_find_git_dir_not_a_repo(tmp_path: Path):
+    assert gitdir.find_git_dir(str(tmp_path)) is None
@@ -64,3 +64,45 @@ def test_files_changed_by_commit_1(repository: git.Repo, commit_files: Callable)
         helpers.files_changed_by_commit(repository.working_dir, commit_3.hexsha)
         == changed_3
     )
+
+
+def test_files_changed_by_commits(repository: git.Repo, commit_files: Callable):
+    commit_1: git.Commit = commit_files(repository, ["test.txt"], "whatever")
+    commit_2: git.Commit = commit_files(
+        repository, ["test.txt", "whatever.img"], "whatever2"
+    )
+    repository.git.commit("--allow-empty", "-m", "empty")
+    commit_3: git.Commit = repository.head.commit
+    changed = helpers.files_changed_by_commits(
+        repository.working_dir, [commit_1.hexsha, commit_2.hexsha, commit_3.hexsha]
+    )
+    assert changed == {
+        commit_1.hexsha: ["test.txt"],
+        commit_2.hexsha: ["test.txt", "whatever.img"],
+        commit_3.hexsha: [],
+    }
+
+
+def test_get_commits_changed_files_batch_equals_fallback(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt", "whatever.img"], "whatever2")
+    commit_files(repository, ["test3.txt"], "whatever3")
+    commits = helpers.retrieve_commits(repository, "master")
+    assert helpers.get_commits_changed_files(
+        commits, batch=True
+    ) == helpers.get_commits_changed_files(commits, batch=False)
+
+
+def test_retrieve_commits_target_advanced(repository: git.Repo, commit_files: Callable):
+    target_branch = "master"
+    commit_1: git.Commit = commit_files(repository, ["test.txt"], "test.txt")
+    repository.head.reference = repository.heads[target_branch]
+    commit_files(repository, ["master.txt"], "master")
+    repository.head.reference = repository.heads["feature-branch"]
+    repository.head.reset(index=True, working_tree=True)
+    commit_2: git.Commit = commit_files(repository, ["test.sh"], "echo whatever")
+    repository.git.merge(target_branch, "--no-edit")
+    commits = helpers.retrieve_commits(repository, target_branch)
+    assert [commit.hexsha for commit in commits] == [commit_1.hexsha, commit_2.hexsha]
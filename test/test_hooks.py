@@ -0,0 +1,130 @@
+import git
+import io
+import os
+import pytest
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable
+from smartsquash import cache, hooks
+
+
+def get_cached(repo: git.Repo, commit: str):
+    return cache.open_cache(Path(repo.git_dir)).get(commit)
+
+
+def test_get_hook_script():
+    script = hooks.get_hook_script("post-commit", "/path with space/python")
+    assert hooks.MARKER in script
+    assert "'/path with space/python' -m smartsquash --record-hook post-commit" in (
+        script
+    )
+    assert "$(cat)" in hooks.get_hook_script("post-rewrite")
+
+
+@pytest.mark.parametrize(
+    "sequencing", [None, "rebase-merge", "rebase-apply", "GIT_REFLOG_ACTION"]
+)
+def test_post_commit_hook_script(
+    repository: git.Repo,
+    commit_files: Callable,
+    tmp_path: Path,
+    monkeypatch,
+    sequencing: str,
+):
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    # stands in for python and records the arguments it's called with
+    recorded: Path = tmp_path / "recorded"
+    python: Path = tmp_path / "python"
+    python.write_text(f'#!/bin/sh\necho "$@" > {recorded}\n')
+    python.chmod(0o755)
+    monkeypatch.delenv("GIT_REFLOG_ACTION", raising=False)
+    if sequencing == "GIT_REFLOG_ACTION":
+        monkeypatch.setenv("GIT_REFLOG_ACTION", "rebase (pick)")
+    elif sequencing:
+        (Path(repository.git_dir) / sequencing).mkdir()
+    subprocess.run(
+        ["sh", "-c", hooks.get_hook_script("post-commit", str(python))],
+        cwd=repository.working_dir,
+        env=os.environ,
+        check=True,
+    )
+    deadline = time.monotonic() + (0.5 if sequencing else 30)
+    while not recorded.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if sequencing:
+        assert not recorded.exists()
+    else:
+        assert recorded.read_text().split() == [
+            "-m",
+            "smartsquash",
+            "--record-hook",
+            "post-commit",
+            "--record-commit",
+            commit.hexsha,
+        ]
+
+
+def test_install_hooks(repository: git.Repo):
+    hooks_dir = Path(repository.git_dir) / "hooks"
+    (hooks_dir / "post-rewrite").write_text("#!/bin/sh\necho own hook\n")
+    assert hooks.install_hooks(repository.working_dir) == {
+        "post-commit": True,
+        "post-rewrite": False,
+    }
+    assert hooks.MARKER in (hooks_dir / "post-commit").read_text()
+    assert (hooks_dir / "post-rewrite").read_text() == "#!/bin/sh\necho own hook\n"
+    # installing again updates the hooks of smartsquash
+    assert hooks.install_hooks(repository.working_dir)["post-commit"]
+
+
+def test_read_rewritten():
+    stdin = io.StringIO("aaa bbb\nccc ddd extra\n\n")
+    assert hooks.read_rewritten(stdin) == ["bbb", "ddd"]
+
+
+def test_record_hook(repository: git.Repo, commit_files: Callable):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["other.txt"], "other")
+    assert hooks.record_hook(repository.working_dir, "post-commit") == 0
+    assert get_cached(repository, commit_2.hexsha) == ["other.txt"]
+    assert get_cached(repository, commit_1.hexsha) is None
+    stdin = io.StringIO(f"{'0' * 40} {commit_1.hexsha} amend\n")
+    assert hooks.record_hook(repository.working_dir, "post-rewrite", stdin) == 0
+    assert get_cached(repository, commit_1.hexsha) == ["test.txt"]
+    store = cache.open_cache(Path(repository.git_dir))
+    assert set(store.get_filters([commit_1.hexsha, commit_2.hexsha])) == {
+        commit_1.hexsha,
+        commit_2.hexsha,
+    }
+
+
+def test_record_hook_commit(repository: git.Repo, commit_files: Callable):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["other.txt"], "other")
+    assert (
+        hooks.record_hook(repository.working_dir, "post-commit", commit=commit_1.hexsha)
+        == 0
+    )
+    assert get_cached(repository, commit_1.hexsha) == ["test.txt"]
+    assert get_cached(repository, commit_2.hexsha) is None
+
+
+def test_record_hook_never_fails(tmp_path: Path):
+    assert hooks.record_hook(str(tmp_path), "post-commit") == 0
+
+
+def test_installed_hook_records_commit(
+    repository: git.Repo, make_files: Callable, monkeypatch
+):
+    # the hook runs 'python -m smartsquash' from the repository
+    monkeypatch.setenv("PYTHONPATH", str(Path(__file__).parent.parent))
+    hooks.install_hooks(repository.working_dir)
+    make_files(repository, ["test.txt"], "whatever")
+    repository.git.add("test.txt")
+    repository.git.commit("-m", "Added test.txt")
+    commit = repository.head.commit.hexsha
+    deadline = time.monotonic() + 30
+    while get_cached(repository, commit) is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert get_cached(repository, commit) == ["test.txt"]
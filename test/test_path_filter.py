@@ -0,0 +1,56 @@
+import git
+import subprocess
+import unittest.mock
+from typing import Callable
+from smartsquash import commit_graph, helpers, path_filter
+
+
+def test_path_filter():
+    paths = [f"dir-{i}/file-{i}.txt" for i in range(100)]
+    changed = path_filter.PathFilter.from_paths(paths)
+    assert all(changed.may_contain(path) for path in paths)
+    assert changed.may_contain_all(paths[:10])
+    false_positives = sum(changed.may_contain(f"other-{i}.txt") for i in range(1000))
+    assert false_positives < 50
+    assert not path_filter.PathFilter.from_paths([]).may_contain("test.txt")
+
+
+def test_path_filters_cached(repository: git.Repo, commit_files: Callable):
+    commit_1 = commit_files(repository, ["test.txt"], "whatever")
+    commit_2 = commit_files(repository, ["other.txt"], "other content")
+    filters = path_filter.PathFilters(repository)
+    assert filters.filter_changing_all(
+        [commit_2.hexsha, commit_1.hexsha], {"test.txt"}
+    ) == [commit_1.hexsha]
+    commit_3 = commit_files(repository, ["test.txt"], "changed")
+    with unittest.mock.patch.object(
+        helpers, "get_changed_files", wraps=helpers.get_changed_files
+    ) as get_changed_files:
+        assert path_filter.PathFilters(repository).filter_changing_all(
+            [commit_3.hexsha, commit_2.hexsha, commit_1.hexsha], {"test.txt"}
+        ) == [commit_3.hexsha, commit_1.hexsha]
+    # only the filter of the new commit is built
+    get_changed_files.assert_called_once_with(repository, [commit_3.hexsha])
+
+
+def test_path_filters_without_cache(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    monkeypatch.setenv("SMARTSQUASH_NO_CACHE", "1")
+    commit = commit_files(repository, ["test.txt"], "whatever")
+    filters = path_filter.PathFilters(repository)
+    assert filters.store is None
+    assert filters.filter_changing_all([commit.hexsha], {"other.txt"}) == []
+
+
+def test_get_changed_path_filters(repository: git.Repo):
+    assert isinstance(
+        path_filter.get_changed_path_filters(repository), path_filter.PathFilters
+    )
+    subprocess.check_call(
+        ["git", "commit-graph", "write", "--reachable", "--changed-paths"],
+        cwd=repository.working_dir,
+    )
+    assert isinstance(
+        path_filter.get_changed_path_filters(repository), commit_graph.CommitGraph
+    )
@@ -0,0 +1,29 @@
+from smartsquash.paths import PathTable, get_file_bits
+
+
+def test_path_table_bits():
+    table = PathTable()
+    bits_a: int = table.bits(["a.txt", "b.txt"])
+    bits_b: int = table.bits(["b.txt", "a.txt"])
+    bits_c: int = table.bits(["b.txt", "c.txt"])
+    assert bits_a == bits_b
+    assert bits_a & bits_c
+    assert not table.bits(["a.txt"]) & table.bits(["c.txt"])
+    assert table.bits(["a.txt"]) & bits_a == table.bits(["a.txt"])
+    assert table.files(bits_c) == {"b.txt", "c.txt"}
+    assert table.bits([]) == 0
+    assert len(table) == 3
+
+
+def test_path_table_lookup_bits():
+    table = PathTable()
+    table.bits(["a.txt"])
+    assert table.lookup_bits(["a.txt", "not-interned.txt"]) == table.bits(["a.txt"])
+    assert len(table) == 1
+
+
+def test_get_file_bits():
+    table = PathTable()
+    file_bits = get_file_bits({"123": {"a.txt", "b.txt"}, "456": {"a.txt"}}, table)
+    assert table.files(file_bits["123"]) == {"a.txt", "b.txt"}
+    assert file_bits["456"] & file_bits["123"] == file_bits["456"]
@@ -0,0 +1,140 @@
+import git
+import os
+import pytest
+import subprocess
+from typing import Callable
+from smartsquash import plumbing
+
+
+def test_changed_files_reuses_process(repository: git.Repo, commit_files: Callable):
+    commit_1: git.Commit = commit_files(repository, ["test.txt"], "whatever")
+    commit_2: git.Commit = commit_files(
+        repository, ["test.txt", "whatever.img"], "whatever2"
+    )
+    git_plumbing = plumbing.get_plumbing(repository.working_dir)
+    assert git_plumbing.changed_files([commit_1.hexsha]) == {
+        commit_1.hexsha: ["test.txt"]
+    }
+    process = git_plumbing.processes["diff-tree"]
+    assert git_plumbing.changed_files([commit_2.hexsha, commit_1.hexsha]) == {
+        commit_2.hexsha: ["test.txt", "whatever.img"],
+        commit_1.hexsha: ["test.txt"],
+    }
+    assert git_plumbing.processes["diff-tree"] is process
+
+
+def test_changed_files_multiple_chunks(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    monkeypatch.setattr(plumbing, "CHUNK_SIZE", 2)
+    commits = [
+        commit_files(repository, [f"test-{i}.txt"], "whatever").hexsha for i in range(5)
+    ]
+    changed = plumbing.get_plumbing(repository.working_dir).changed_files(commits)
+    assert list(changed) == commits
+    assert changed[commits[-1]] == ["test-4.txt"]
+
+
+def test_tree_ids(repository: git.Repo, commit_files: Callable):
+    commit: git.Commit = commit_files(repository, ["test.txt"], "whatever")
+    git_plumbing = plumbing.get_plumbing(repository.working_dir)
+    assert git_plumbing.tree_ids([commit.hexsha, "0" * 40]) == {
+        commit.hexsha: commit.tree.hexsha
+    }
+
+
+def test_close_all(repository: git.Repo, commit_files: Callable):
+    commit: git.Commit = commit_files(repository, ["test.txt"], "whatever")
+    git_plumbing = plumbing.get_plumbing(repository.working_dir)
+    git_plumbing.tree_ids([commit.hexsha])
+    process = git_plumbing.processes["cat-file"]
+    plumbing.close_all()
+    assert process.poll() == 0
+    assert plumbing.get_plumbing(repository.working_dir) is not git_plumbing
+
+
+def test_get_shards(monkeypatch):
+    monkeypatch.setattr(plumbing, "CHUNK_SIZE", 2)
+    commits = [str(i) for i in range(7)]
+    assert plumbing.get_shards(commits, 1) == [commits]
+    assert plumbing.get_shards(commits[:2], 4) == [commits[:2]]
+    assert plumbing.get_shards(commits, 2) == [commits[:4], commits[4:]]
+    assert plumbing.get_shards(commits, 8) == [
+        commits[:2],
+        commits[2:4],
+        commits[4:6],
+        commits[6:],
+    ]
+
+
+def test_concurrency(monkeypatch):
+    monkeypatch.setenv(plumbing.CONCURRENCY_ENV, "3")
+    assert plumbing.get_concurrency() == 3
+    plumbing.set_concurrency(5)
+    assert plumbing.get_concurrency() == 5
+    plumbing.set_concurrency(None)
+    monkeypatch.delenv(plumbing.CONCURRENCY_ENV)
+    assert 1 <= plumbing.get_concurrency() <= plumbing.MAX_DEFAULT_CONCURRENCY
+
+
+def test_sharded_requests(repository: git.Repo, commit_files: Callable, monkeypatch):
+    commits = [
+        commit_files(repository, [f"test-{i}.txt"], "whatever") for i in range(5)
+    ]
+    shas = [commit.hexsha for commit in commits]
+    monkeypatch.setattr(plumbing, "CHUNK_SIZE", 2)
+    plumbing.set_concurrency(3)
+    try:
+        git_plumbing = plumbing.get_plumbing(repository.working_dir)
+        changed = git_plumbing.changed_files(shas)
+        tree_ids = git_plumbing.tree_ids(shas)
+    finally:
+        plumbing.set_concurrency(None)
+    assert list(changed) == shas
+    assert changed == {sha: [f"test-{i}.txt"] for i, sha in enumerate(shas)}
+    assert tree_ids == {commit.hexsha: commit.tree.hexsha for commit in commits}
+    assert {"diff-tree", "diff-tree-1", "diff-tree-2"} <= set(git_plumbing.processes)
+
+
+def test_read_entries(monkeypatch):
+    monkeypatch.setattr(plumbing, "READ_SIZE", 3)
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"first\0second entry\0\0last")
+    os.close(write_fd)
+    try:
+        assert list(plumbing.read_entries(read_fd)) == [
+            b"first",
+            b"second entry",
+            b"",
+            b"last",
+        ]
+    finally:
+        os.close(read_fd)
+
+
+def test_stream(repository: git.Repo, commit_files: Callable, monkeypatch):
+    monkeypatch.setattr(plumbing, "READ_SIZE", 5)
+    commit: git.Commit = commit_files(
+        repository, ["test.txt", "other file.txt"], "whatever"
+    )
+    git_plumbing = plumbing.get_plumbing(repository.working_dir)
+    assert list(
+        git_plumbing.stream("diff-tree", "--name-only", "-r", "-z", commit.hexsha)
+    ) == [commit.hexsha, "other file.txt", "test.txt"]
+    assert list(
+        git_plumbing.stream("rev-list", "-n", "1", "HEAD", delimiter=b"\n")
+    ) == [commit.hexsha]
+    with pytest.raises(subprocess.CalledProcessError):
+        list(git_plumbing.stream("rev-list", "not-a-revision"))
+
+
+def test_changed_files_small_reads(
+    repository: git.Repo, commit_files: Callable, monkeypatch
+):
+    monkeypatch.setattr(plumbing, "READ_SIZE", 7)
+    files = [f"file-{i}.txt" for i in range(50)]
+    commit: git.Commit = commit_files(repository, files, "whatever")
+    changed = plumbing.get_plumbing(repository.working_dir).changed_files(
+        [commit.hexsha]
+    )
+    assert changed == {commit.hexsha: sorted(files)}
@@ -0,0 +1,43 @@
+import git
+from pathlib import Path
+from typing import Callable
+from smartsquash import precheck
+
+
+def test_has_nothing_to_fixup(repository: git.Repo, make_files: Callable):
+    assert precheck.has_nothing_to_fixup(repository.working_dir, "master")
+    make_files(repository, ["untracked.txt"], "content")
+    assert precheck.has_nothing_to_fixup(repository.working_dir, "master")
+    assert precheck.has_nothing_to_fixup(repository.working_dir, "master") == (
+        not repository.is_dirty()
+    )
+
+
+def test_has_nothing_to_fixup_dirty(
+    repository: git.Repo, commit_files: Callable, make_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    make_files(repository, ["test.txt"], "changed")
+    assert not precheck.has_nothing_to_fixup(repository.working_dir, "master")
+    repository.index.add(["test.txt"])
+    assert not precheck.has_nothing_to_fixup(repository.working_dir, "master")
+
+
+def test_has_nothing_to_fixup_invalid_repo(repository: git.Repo, tmp_path: Path):
+    assert not precheck.has_nothing_to_fixup(repository.working_dir, "not-there")
+    assert not precheck.has_nothing_to_fixup(repository.working_dir, "feature-branch")
+    repository.head.reference = repository.head.commit
+    assert not precheck.has_nothing_to_fixup(repository.working_dir, "master")
+
+
+def test_has_nothing_to_fixup_not_a_repo(tmp_path: Path):
+    assert not precheck.has_nothing_to_fixup(str(tmp_path / "missing"), "master")
+
+
+def test_branch_exists_packed(repository: git.Repo):
+    git_dir = Path(repository.git_dir)
+    assert precheck.branch_exists(git_dir, "master")
+    repository.git.pack_refs("--all")
+    assert not (git_dir / "refs" / "heads" / "master").exists()
+    assert precheck.branch_exists(git_dir, "master")
+    assert not precheck.branch_exists(git_dir, "not-there")
@@ -0,0 +1,41 @@
+import git
+import json
+import subprocess
+from typing import Callable
+from smartsquash import helpers, profiling, sq
+
+
+def test_profile_records_phases_and_git_calls(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt"], "even other content")
+    profiling.enable()
+    try:
+        sq.squash("master", repository, False)
+    finally:
+        profile = profiling.disable()
+    data = profile.to_dict()
+    assert data["phases"]["squash"]["calls"] == 1
+    assert data["phases"]["retrieve_commit_records"]["calls"] == 1
+    assert data["git_calls"]["git rebase"]["calls"] == 1
+    assert data["spawns"]["git log"] == 1
+    assert json.loads(profile.to_json())["phases"] == data["phases"]
+    assert "retrieve_commit_records" in profile.to_table()
+
+
+def test_profile_disabled(repository: git.Repo):
+    original = subprocess.Popen.__init__
+    profiling.enable()
+    assert subprocess.Popen.__init__ is not original
+    profiling.disable()
+    assert subprocess.Popen.__init__ is original
+    assert profiling.get_profile() is None
+    helpers.retrieve_commits(repository, "master")
+    assert profiling.get_profile() is None
+
+
+def test_git_command():
+    assert profiling.git_command(["git", "diff-tree", "--stdin"]) == "git diff-tree"
+    assert profiling.git_command("git rev-list HEAD") == "git rev-list"
+    assert profiling.git_command(["ls"]) == "ls"
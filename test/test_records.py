@@ -0,0 +1,52 @@
+import git
+from typing import Callable, List
+from smartsquash import helpers
+from smartsquash.records import (
+    CommitRecord,
+    FileSetTable,
+    parse_log,
+    retrieve_commit_records,
+)
+
+
+def test_parse_log():
+    output: str = (
+        "aaa 111 ppp\0first subject\n\nbody\n\0"
+        "bbb 222 ppp qqq\0merge\n\0"
+        "ccc 333 \0\0"
+    )
+    records: List[CommitRecord] = parse_log(output)
+    assert [record.hexsha for record in records] == ["aaa", "bbb", "ccc"]
+    assert [record.tree_sha for record in records] == ["111", "222", "333"]
+    assert [record.parent_count for record in records] == [1, 2, 0]
+    assert [record.subject for record in records] == ["first subject", "merge", ""]
+    assert parse_log("") == []
+
+
+def test_file_set_table():
+    file_sets = FileSetTable()
+    assert file_sets.intern(["a.txt", "b.txt"]) == file_sets.intern(["b.txt", "a.txt"])
+    assert file_sets.intern(["a.txt"]) == 1
+    records = [
+        CommitRecord("aaa", "111", 1, "first", 0),
+        CommitRecord("bbb", "222", 1, "empty", file_sets.intern([])),
+    ]
+    assert file_sets.changed_files(records) == {"aaa": {"a.txt", "b.txt"}}
+
+
+def test_retrieve_commit_records(repository: git.Repo, commit_files: Callable):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["test.txt", "other.txt"], "other content")
+    commit_files(repository, ["test.txt"], "even other content")
+    file_sets = FileSetTable()
+    records: List[CommitRecord] = retrieve_commit_records(
+        repository, "master", file_sets
+    )
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, "master")
+    assert [record.hexsha for record in records] == [c.hexsha for c in commits]
+    assert [record.tree_sha for record in records] == [c.tree.hexsha for c in commits]
+    assert [record.subject for record in records] == [c.summary for c in commits]
+    assert file_sets.changed_files(records) == helpers.get_commits_changed_files(
+        commits
+    )
+    assert records[0].file_set_id == records[2].file_set_id
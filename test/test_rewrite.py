@@ -0,0 +1,76 @@
+import git
+import pytest
+from pathlib import Path
+from typing import Callable, List
+from smartsquash import helpers, rewrite, sq
+
+
+def test_build_history_keeps_unchanged_commits(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_files(repository, ["test.txt"], "whatever")
+    commit_files(repository, ["other.txt"], "other")
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, "master")
+    plan = [("pick", commit) for commit in commits]
+    new_tip: str = rewrite.build_history(
+        repository, repository.heads["master"].commit.hexsha, plan
+    )
+    assert new_tip == repository.head.commit.hexsha
+
+
+def test_squash_in_memory(repository: git.Repo, commit_files: Callable):
+    target_branch = "master"
+    commit_files(repository, ["test.txt"], "whatever", message="first")
+    commit_files(repository, ["other.txt"], "other", message="second")
+    commit_files(repository, ["test.txt"], "even other content", message="third")
+    tree: str = repository.head.commit.tree.hexsha
+    sq.squash(target_branch, repository, False, in_memory=True)
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, target_branch)
+    assert [commit.summary for commit in commits] == ["first", "second"]
+    assert commits[-1].tree.hexsha == tree
+    assert repository.head.log()[-1].message == "smartsquash: rewrite"
+    assert commits[0].author.email == commits[1].author.email
+    assert repository.is_dirty() is False
+    assert (
+        open(Path(repository.working_dir) / "test.txt", "r").read()
+        == "even other content"
+    )
+
+
+def test_fixup_in_memory(
+    repository: git.Repo, make_files: Callable, commit_files: Callable
+):
+    target_branch = "master"
+    commit_files(repository, ["test.txt"], "original", message="first")
+    commit_files(repository, ["test2.txt"], "modified", message="second")
+    make_files(repository, ["test.txt"], "also changed")
+    repository.index.add(["test.txt"])
+    assert sq.fixup(target_branch, repository, True, False, in_memory=True) is True
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, target_branch)
+    assert [commit.summary for commit in commits] == ["first", "second"]
+    assert (commits[0].tree / "test.txt").data_stream.read() == b"also changed"
+    assert repository.head.log()[-1].message == "smartsquash: rewrite"
+    assert repository.is_dirty() is False
+
+
+def test_apply_commit_conflict(repository: git.Repo, commit_files: Callable):
+    commit_1: git.Commit = commit_files(repository, ["test.txt"], "first")
+    commit_2: git.Commit = commit_files(repository, ["test.txt"], "second")
+    with pytest.raises(rewrite.RewriteError):
+        rewrite.apply_commit(
+            repository, commit_2, repository.heads["master"].commit.tree.hexsha
+        )
+    plan = [("pick", commit_2), ("pick", commit_1)]
+    assert rewrite.try_rewrite_branch(repository, "master", plan) is False
+    assert repository.head.commit == commit_2
+
+
+def test_get_fixup_plan_other_autosquash_commits(
+    repository: git.Repo, commit_files: Callable
+):
+    commit_1: git.Commit = commit_files(repository, ["test.txt"], "first")
+    commit_files(repository, ["test.txt"], "second", message="fixup! other")
+    fixup_commit: git.Commit = commit_files(repository, ["test.txt"], "third")
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, "master")
+    with pytest.raises(rewrite.RewriteError):
+        rewrite.get_fixup_plan(commits, {commit_1.hexsha: [fixup_commit]})
@@ -10,7 +10,7 @@ def test_squash(repository: git.Repo, commit_files: Callable):
     target_branch = "master"
     commit_files(repository, ["test.txt"], "whatever")
     commit_files(repository, ["test.txt"], "even other content")
-    commits_before = sq.retrieve_commits(repository, target_branch)
+    commits_before = helpers.retrieve_commits(repository, target_branch)
     assert len(commits_before) == 2
     sq.squash(target_branch, repository, False)
     commits_after = helpers.retrieve_commits(repository, target_branch)
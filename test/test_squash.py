@@ -1,6 +1,7 @@
 import git
 import re
-from smartsquash import helpers, sq, squash
+from smartsquash import helpers, squash
+from smartsquash.records import FileSetTable, retrieve_commit_records
 from typing import List, Dict, Set, Callable
 
 
@@ -15,7 +16,7 @@ def test_get_commits_in_between(repository: git.Repo, commit_files: Callable):
     commit_4: git.Commit = commit_files(
         repository, ["another-one.txt"], "even other content"
     )
-    commits: List[git.Commit] = sq.retrieve_commits(repository, "master")
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, "master")
     in_between: List[git.Commit] = squash.get_commits_in_between(
         commit_4, commit_1, commits
     )
@@ -90,6 +91,47 @@ def test_commit_diff_empty(repository: git.Repo, commit_files: Callable):
     assert not squash.commit_diff_empty(commit_b, commit_c)
 
 
+def test_commit_diff_empty_tree_ids(repository: git.Repo, commit_files: Callable):
+    commit_a = commit_files(repository, ["test.txt"], "old content")
+    commit_b = commit_files(repository, ["test.txt"], "new content")
+    commit_c = commit_files(repository, ["test.txt"], "old content")
+    tree_ids = helpers.get_commits_tree_ids([commit_a, commit_b, commit_c])
+    assert tree_ids[commit_a.hexsha] == commit_a.tree.hexsha
+    assert squash.commit_diff_empty(commit_a, commit_c, tree_ids)
+    assert not squash.commit_diff_empty(commit_a, commit_b, tree_ids)
+
+
+def test_commit_diff_empty_records(repository: git.Repo, commit_files: Callable):
+    commit_files(repository, ["test.txt"], "old content")
+    commit_files(repository, ["test.txt"], "new content")
+    commit_files(repository, ["test.txt"], "old content")
+    record_a, record_b, record_c = retrieve_commit_records(
+        repository, "master", FileSetTable()
+    )
+    assert squash.commit_diff_empty(record_a, record_c, chained=True)
+    assert not squash.commit_diff_empty(record_a, record_b, chained=True)
+    assert squash.commit_diff_empty(
+        record_a, record_c, repo_path=repository.working_dir
+    )
+
+
+def test_commit_diff_empty_side_branch(repository: git.Repo, commit_files: Callable):
+    repository.create_head("side")
+    repository.git.checkout("side")
+    side: git.Commit = commit_files(repository, ["test.txt"], "same", "On side")
+    repository.git.checkout("feature-branch")
+    commit: git.Commit = commit_files(repository, ["test.txt"], "same", "On feature")
+    repository.git.merge("side", "--no-edit")
+    assert side.tree.hexsha == commit.tree.hexsha
+    # 'git diff side...commit' compares with their merge-base
+    assert not squash.commit_diff_empty(side, commit)
+    commits: List[git.Commit] = helpers.retrieve_commits(repository, "master")
+    assert squash.get_chain_ids(commits) == [0, 1]
+    assert squash.get_squash_combinations(
+        commits, helpers.get_commits_changed_files(commits)
+    ) == {commits[0].hexsha: [commits[1]]}
+
+
 def test_has_same_files():
     files_a: List[str] = ["test.txt", "README.md"]
     files_b: List[str] = ["README.md", "test.txt"]
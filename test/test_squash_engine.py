@@ -0,0 +1,62 @@
+import collections
+import random
+import unittest.mock
+import pytest
+from smartsquash import helpers, squash
+from typing import Dict, List, Set, Tuple, Optional
+
+FakeCommit = collections.namedtuple("FakeCommit", ["hexsha", "parents"], defaults=((),))
+
+
+def fake_diff_empty(
+    commit_a: FakeCommit,
+    commit_b: FakeCommit,
+    tree_ids: Optional[Dict] = None,
+    chained: bool = False,
+    repo_path: Optional[str] = None,
+    merge_bases: Optional[Dict] = None,
+) -> bool:
+    return (int(commit_a.hexsha) * 7 + int(commit_b.hexsha)) % 5 == 0
+
+
+def generate_branch(
+    seed: int, length: int, file_count: int
+) -> Tuple[List[FakeCommit], Dict[str, Set[str]]]:
+    rand = random.Random(seed)
+    files: List[str] = [f"file-{i}.txt" for i in range(file_count)]
+    commits: List[FakeCommit] = []
+    for i in range(length):
+        commits.append(FakeCommit(str(i), tuple(commits[-1:])))
+    commit_changed_files: Dict[str, Set[str]] = collections.defaultdict(set)
+    for commit in commits:
+        for file in rand.sample(files, rand.randint(0, min(3, file_count))):
+            commit_changed_files[commit.hexsha].add(file)
+    return commits, commit_changed_files
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("length,file_count", [(5, 2), (20, 3), (40, 6)])
+def test_get_squash_combinations_equals_pairwise(
+    seed: int, length: int, file_count: int
+):
+    commits, commit_changed_files = generate_branch(seed, length, file_count)
+    with unittest.mock.patch.object(
+        squash, "commit_diff_empty", fake_diff_empty
+    ), unittest.mock.patch.object(helpers, "get_commits_tree_ids", return_value={}):
+        expected = squash.get_squash_combinations_pairwise(
+            commits, commit_changed_files
+        )
+        actual = squash.get_squash_combinations(commits, commit_changed_files)
+    assert list(actual.items()) == list(expected.items())
+
+
+def test_get_squash_candidates_blocked_in_between():
+    commits: List[FakeCommit] = [FakeCommit(str(i)) for i in range(5)]
+    commit_changed_files: Dict[str, Set[str]] = {
+        "0": {"test.txt"},
+        "1": {"test.txt"},
+        "2": {"test.txt", "other.txt"},
+        "3": {"test.txt"},
+        "4": {"whatever.txt"},
+    }
+    assert squash.get_squash_candidates(commits, commit_changed_files) == [(0, 1)]